@@ -0,0 +1,122 @@
+"""
+Quality tiers for image analysis, so overload costs accuracy rather than timeouts.
+
+- ``full``: the image as uploaded, landmarks with an annotated image, and for
+  phenotype runs YOLO plus Face Mesh with iris refinement.
+- ``fast``: the image is downscaled to ANALYZER_FAST_MAX_DIMENSION first (JPEG
+  draft decoding, so a large photo is never fully decoded). No annotated image
+  is drawn. Phenotype runs skip YOLO and use Face Mesh without
+  ``refine_landmarks``. Landmark points are scaled back to the original
+  image's coordinates.
+
+Callers ask for ``full`` (the default, so existing clients keep the annotated
+image and full-resolution points), ``fast`` or ``auto``. In the API,
+``analysis_gate`` runs analyses in the threadpool, ANALYZER_CONCURRENCY at a
+time per worker process. ``auto`` picks ``fast`` when ANALYZER_FAST_QUEUE_DEPTH
+analyses are already running or waiting for a slot. worker.py applies the same
+rule to the number of queued jobs (ANALYSIS_JOB_FAST_QUEUE_DEPTH). Responses
+report the tier they were produced with.
+"""
+import asyncio
+import io
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image
+
+from analyzer.tui import analyze_face_landmarks
+from config import settings
+from profiling import profile_in_thread
+
+QUALITY_TIERS = ("full", "fast")
+QUALITY_HEADER = "X-Analysis-Quality"
+
+
+def choose_quality(requested: str, queue_depth: int, fast_threshold: int) -> str:
+    """The tier to run: an explicit request wins; ``auto`` degrades once ``queue_depth`` reaches the threshold (0 = never)."""
+    if requested in QUALITY_TIERS:
+        return requested
+    return "fast" if 0 < fast_threshold <= queue_depth else "full"
+
+
+def downscale_image(image_bytes: bytes, max_dimension: int) -> tuple[bytes, float, float]:
+    """
+    Shrink an image to fit ``max_dimension``; returns (image bytes, x scale, y scale) where the scales map
+    coordinates in the result back to the original. Images that already fit, or do not decode, pass through.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            width, height = img.size
+            if max(width, height) <= max_dimension:
+                return image_bytes, 1.0, 1.0
+            img.draft("RGB", (max_dimension, max_dimension))
+            small = img.convert("RGB")
+    except Exception:
+        # Let the analyzer report the invalid image the same way in both tiers
+        return image_bytes, 1.0, 1.0
+    small.thumbnail((max_dimension, max_dimension))
+    out = io.BytesIO()
+    # Uncompressed: the analyzer decodes it again immediately
+    small.save(out, format="BMP")
+    return out.getvalue(), width / small.width, height / small.height
+
+
+def analyze_landmarks(image_bytes: bytes, quality: str, annotate: bool = True) -> dict[str, Any]:
+    """``analyze_face_landmarks`` at the given tier (the fast tier never annotates)."""
+    if quality == "fast":
+        image_bytes, scale_x, scale_y = downscale_image(image_bytes, settings.ANALYZER_FAST_MAX_DIMENSION)
+        annotate = False
+    result = analyze_face_landmarks(
+        image_bytes=image_bytes,
+        weights_path=settings.LANDMARK_WEIGHTS_PATH,
+        draw_points=annotate,
+        return_image_base64=annotate,
+    )
+    if quality == "fast" and (scale_x, scale_y) != (1.0, 1.0):
+        result["points"] = [[x * scale_x, y * scale_y] for x, y in result["points"]]
+    return result
+
+
+class AnalysisGate:
+    """Per-process admission for analyses: a concurrency limit whose backlog drives ``auto`` quality."""
+
+    def __init__(self, concurrency: int, fast_queue_depth: int):
+        self.concurrency = concurrency
+        self.fast_queue_depth = fast_queue_depth
+        self.in_flight = 0  # running plus waiting for a slot
+        self.tiers: Counter = Counter()
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def choose(self, requested: str) -> str:
+        quality = choose_quality(requested, self.in_flight, self.fast_queue_depth)
+        self.tiers[quality] += 1
+        return quality
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.in_flight += 1
+        try:
+            async with self._semaphore:
+                yield
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run a blocking analysis in the threadpool once a slot is free."""
+        async with self.slot():
+            return await run_in_threadpool(profile_in_thread(fn), *args)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "fast_queue_depth": self.fast_queue_depth,
+            "in_flight": self.in_flight,
+            "tiers": {tier: self.tiers[tier] for tier in QUALITY_TIERS},
+        }
+
+
+analysis_gate = AnalysisGate(settings.ANALYZER_CONCURRENCY, settings.ANALYZER_FAST_QUEUE_DEPTH)
@@ -36,9 +36,10 @@ CONNECTIONS_BASE = [
     (172, 397, "Ширина челюсти"),
 ]
 MAX_IMAGE_DIMENSION = 1024
+FAST_MAX_IMAGE_DIMENSION = 512
 
 _yolo_model_cache: YOLO | None = None
-_face_mesh: mp.solutions.face_mesh.FaceMesh | None = None
+_face_mesh: dict[bool, mp.solutions.face_mesh.FaceMesh] = {}  # by refine_landmarks
 
 
 def _get_yolo_model(weights_path: str) -> YOLO:
@@ -51,16 +52,15 @@ def _get_yolo_model(weights_path: str) -> YOLO:
     return _yolo_model_cache
 
 
-def _get_face_mesh() -> mp.solutions.face_mesh.FaceMesh:
-    global _face_mesh
-    if _face_mesh is None:
-        _face_mesh = mp.solutions.face_mesh.FaceMesh(
+def _get_face_mesh(refine_landmarks: bool = True) -> mp.solutions.face_mesh.FaceMesh:
+    if refine_landmarks not in _face_mesh:
+        _face_mesh[refine_landmarks] = mp.solutions.face_mesh.FaceMesh(
             static_image_mode=True,
             max_num_faces=1,
-            refine_landmarks=True,
+            refine_landmarks=refine_landmarks,
             min_detection_confidence=0.5,
         )
-    return _face_mesh
+    return _face_mesh[refine_landmarks]
 
 
 def _normalize_image(img: np.ndarray, max_dimension: int = MAX_IMAGE_DIMENSION) -> np.ndarray:
@@ -84,31 +84,38 @@ def _normalize_by_face_length(distance_px: float, reference_px: float) -> float:
     return distance_px / reference_px if reference_px > 0 else 0.0
 
 
-def _image_to_array(image: bytes | str | Path) -> np.ndarray:
+def _image_to_array(image: bytes | str | Path, max_dimension: int = MAX_IMAGE_DIMENSION) -> np.ndarray:
     """Convert image input to RGB numpy array."""
-    if isinstance(image, bytes):
-        pil_img = Image.open(io.BytesIO(image)).convert("RGB")
-        return np.array(pil_img)
-    img = Image.open(str(image)).convert("RGB")
-    return np.array(img)
+    source = io.BytesIO(image) if isinstance(image, bytes) else str(image)
+    with Image.open(source) as pil_img:
+        # JPEG: decode at 1/2..1/8 scale when that still covers max_dimension; a 12 MP photo
+        # otherwise costs ~36 MB of pixels here only to be resized by _normalize_image
+        pil_img.draft("RGB", (max_dimension, max_dimension))
+        return np.array(pil_img.convert("RGB"))
 
 
-def analyze_face_mesh(image: bytes | str | Path) -> dict[str, Any]:
+def analyze_face_mesh(
+    image: bytes | str | Path,
+    max_dimension: int = MAX_IMAGE_DIMENSION,
+    refine_landmarks: bool = True,
+) -> dict[str, Any]:
     """
     Analyze face using MediaPipe Face Mesh (logic from test.py).
     Returns JSON with measurements, face/nose/jaw/lip types.
 
     Args:
         image: Image as bytes, file path, or Path
+        max_dimension: Longer image side is scaled down to this before detection
+        refine_landmarks: Iris refinement; the measured landmarks do not need it, it only costs time
 
     Returns:
         dict with measurements, face_type, nose_type, jaw_type, lip_type, error
     """
-    img = _image_to_array(image)
-    img = _normalize_image(img)
+    img = _image_to_array(image, max_dimension)
+    img = _normalize_image(img, max_dimension)
     img_height, img_width, _ = img.shape
 
-    face_mesh = _get_face_mesh()
+    face_mesh = _get_face_mesh(refine_landmarks)
     results = face_mesh.process(img)
 
     out: dict[str, Any] = {
@@ -277,6 +284,8 @@ def predict_phenotype(
 def analyze_phenotype_full(
     image: bytes | str | Path,
     weights_path: str,
+    quality: str = "full",
+    fast_max_dimension: int = FAST_MAX_IMAGE_DIMENSION,
 ) -> dict[str, Any]:
     """
     Full phenotype analysis: YOLO classification + Face Mesh measurements.
@@ -285,10 +294,17 @@ def analyze_phenotype_full(
     Args:
         image: Image as bytes, file path, or Path
         weights_path: Path to YOLO best.pt weights
+        quality: "full", or "fast" to skip YOLO (``yolo`` is None) and run Face Mesh
+            without iris refinement on an image capped at ``fast_max_dimension``
 
     Returns:
         JSON dict with yolo (classification) and face_mesh (measurements, types)
     """
+    if quality == "fast":
+        return {
+            "yolo": None,
+            "face_mesh": analyze_face_mesh(image, fast_max_dimension, refine_landmarks=False),
+        }
     yolo_result = predict_phenotype(image, weights_path)
     mesh_result = analyze_face_mesh(image)
     return {
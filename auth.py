@@ -1,27 +1,23 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from config import settings
-from database import get_db
+from database import AsyncSessionLocal, get_async_db
 from models.user import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer(auto_error=False)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
-
-
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -37,40 +33,164 @@ def decode_token(token: str) -> dict | None:
         return None
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials | None = Depends(security),
-    db: Session = Depends(get_db),
-) -> User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    if not credentials:
-        raise credentials_exception
-    payload = decode_token(credentials.credentials)
+@dataclass(frozen=True, slots=True)
+class AuthenticatedUser:
+    """Detached snapshot of the requesting user; safe to keep across sessions and requests."""
+
+    id: int
+    email: str
+    username: str
+    name: str | None
+    role: str
+    is_active: bool
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "AuthenticatedUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            name=user.name,
+            role=user.role,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified bearer token -> user snapshot.
+
+    An entry lives for ``ttl`` seconds or until the token expires, whichever is sooner, so
+    a hit skips both the JWT decode and the users lookup. Committing a change to a user
+    drops that user's entries in this worker; other workers catch up within ``ttl``.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, AuthenticatedUser]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a lookup that raced with one must not be cached
+        self.generation = 0
+
+    def get(self, token: str) -> AuthenticatedUser | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user
+
+    def put(self, token: str, user: AuthenticatedUser, token_exp: float | None, generation: int) -> None:
+        if self.ttl <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[token] = (expires_at, user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_users(self, user_ids) -> None:
+        user_ids = set(user_ids)
+        with self._lock:
+            self.generation += 1
+            for token in [t for t, (_, user) in self._entries.items() if user.id in user_ids]:
+                del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+token_cache = TokenCache(settings.AUTH_CACHE_TTL, settings.AUTH_CACHE_MAX_ENTRIES)
+
+_CHANGED_USERS_KEY = "auth_changed_user_ids"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context) -> None:
+    changed = {obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault(_CHANGED_USERS_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session) -> None:
+    changed = session.info.pop(_CHANGED_USERS_KEY, None)
+    if changed:
+        token_cache.invalidate_users(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_users(session: Session) -> None:
+    session.info.pop(_CHANGED_USERS_KEY, None)
+
+
+async def _authenticate(token: str, db: AsyncSession) -> AuthenticatedUser | None:
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    generation = token_cache.generation
+    payload = decode_token(token)
     if payload is None:
-        raise credentials_exception
+        return None
     username: str | None = payload.get("sub")
     if username is None:
-        raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
+        return None
+    db_user = await db.scalar(select(User).where(User.username == username))
+    if db_user is None or not db_user.is_active:
+        return None
+    user = AuthenticatedUser.from_user(db_user)
+    token_cache.put(token, user, payload.get("exp"), generation)
+    return user
+
+
+async def authenticate_token(token: str) -> AuthenticatedUser | None:
+    """For code outside the dependency system (middleware); opens its own session on a cache miss."""
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+    async with AsyncSessionLocal() as db:
+        return await _authenticate(token, db)
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials | None = Depends(security),
+    db: AsyncSession = Depends(get_async_db),
+) -> AuthenticatedUser:
+    user = await _authenticate(credentials.credentials, db) if credentials else None
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
 async def get_current_user_optional(
     credentials: HTTPAuthorizationCredentials | None = Depends(security),
-    db: Session = Depends(get_db),
-) -> User | None:
+    db: AsyncSession = Depends(get_async_db),
+) -> AuthenticatedUser | None:
     """Returns current user or None if not authenticated."""
     if not credentials:
         return None
-    payload = decode_token(credentials.credentials)
-    if payload is None:
-        return None
-    username: str | None = payload.get("sub")
-    if username is None:
-        return None
-    return db.query(User).filter(User.username == username).first()
+    return await _authenticate(credentials.credentials, db)
+
+
+async def get_current_admin(user: AuthenticatedUser = Depends(get_current_user)) -> AuthenticatedUser:
+    if user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin role required")
+    return user
@@ -0,0 +1,100 @@
+"""
+Loading a catalog: one POST per row vs a single bulk request.
+
+    python -m benchmarks.bulk [--rows 5000] [--url sqlite:///...]
+
+Mounts the real regions router on a scratch database (temporary SQLite file
+by default) and loads the same rows through ``POST /regions/`` (a commit and
+refresh per row) and through ``POST /regions/bulk`` as a JSON array and as
+NDJSON, then re-sends the batch with ``upsert=true``.
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import httpx
+import orjson
+from fastapi import FastAPI
+from sqlalchemy import AsyncAdaptedQueuePool, create_engine, delete
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import Base, _async_database_url, get_async_db
+from models.region import Region
+from routers import regions
+
+
+def build_app(url: str):
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(sync_engine)
+    async_engine = create_async_engine(_async_database_url(url), poolclass=AsyncAdaptedQueuePool)
+    SessionBench = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    async def get_bench_db():
+        async with SessionBench() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(regions.router)
+    app.dependency_overrides[get_async_db] = get_bench_db
+
+    def reset():
+        with sync_engine.begin() as conn:
+            conn.execute(delete(Region))
+
+    async def dispose():
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+    return app, reset, dispose
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default=None, help="scratch database URL (its tables are created and emptied)")
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    app, reset, dispose = build_app(args.url or f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    rows = [{"name": f"region-{i}", "view_name": f"Region {i}"} for i in range(args.rows)]
+    ndjson = b"".join(orjson.dumps(row) + b"\n" for row in rows)
+    transport = httpx.ASGITransport(app=app)
+
+    async def timed(label: str, send) -> None:
+        start = time.perf_counter()
+        await send()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<22} {elapsed * 1000:9.1f} ms   {args.rows / elapsed:9.0f} rows/s")
+
+    print(f"{args.rows} rows")
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def per_row():
+                for row in rows:
+                    (await client.post("/regions/", json=row)).raise_for_status()
+
+            async def bulk_json():
+                (await client.post("/regions/bulk", json=rows)).raise_for_status()
+
+            async def bulk_ndjson():
+                response = await client.post(
+                    "/regions/bulk", content=ndjson, headers={"content-type": "application/x-ndjson"}
+                )
+                response.raise_for_status()
+
+            async def bulk_upsert():
+                (await client.post("/regions/bulk?upsert=true", json=rows)).raise_for_status()
+
+            reset()
+            await timed("per-row POST", per_row)
+            reset()
+            await timed("bulk (JSON array)", bulk_json)
+            reset()
+            await timed("bulk (NDJSON)", bulk_ndjson)
+            await timed("bulk upsert (updates)", bulk_upsert)
+    finally:
+        await dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,356 @@
+"""
+End-to-end load test of the API flows, with a baseline to compare against.
+
+    python -m benchmarks.loadtest serve [--port 8765] [--model-ms 20]
+    python -m benchmarks.loadtest run [--url http://127.0.0.1:8765] [--users 20] [--duration 30]
+                                      [--save-baseline FILE] [--baseline FILE] [--tolerance 0.15]
+    python -m benchmarks.loadtest run --spawn-server ...   # serve + run in one go
+
+``serve`` starts the app under uvicorn on a scratch SQLite database (or
+``--database-url``) with ``analyze_face_landmarks`` replaced by a stub that
+burns ``--model-ms`` of CPU and returns 468 synthetic points, so runs do not
+need model weights and measure the service around the model.
+
+``run`` registers and logs in ``--users`` virtual users, then each loops
+through the full flow until ``--duration`` is over:
+
+    GET /api/auth/me, POST /api/analyze (synthetic face JPEG), POST /api/analyze/answers,
+    GET /api/analyze/sessions/{id}, POST /api/analyze/landmarks,
+    POST/GET/PATCH/DELETE /api/user-profiles/...
+
+and prints throughput, p50/p95/p99 latency and error rate per route.
+``--save-baseline`` stores the numbers as JSON; ``--baseline`` compares against
+a stored run and exits with status 1 when a route's p95 or throughput
+regressed by more than ``--tolerance`` or its error rate rose by more than
+one percentage point.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+LANDMARK_COUNT = 468
+# Run once per virtual user, so their req/s depends on --users rather than on the server
+SETUP_ROUTES = {"POST /api/auth/register", "POST /api/auth/login"}
+MEASUREMENT_KEYS = ("Длина лица", "Ширина лица", "Ширина носа", "Длина носа", "Длина губ", "Ширина челюсти")
+
+
+# --- stub server ---------------------------------------------------------------------------
+
+def _stub_analyze_face_landmarks(model_seconds: float):
+    def analyze_face_landmarks(image_bytes, weights_path=None, draw_points=False, return_image_base64=False, **kwargs):
+        deadline = time.perf_counter() + model_seconds
+        while time.perf_counter() < deadline:  # CPU-bound, like the real model
+            hashlib.sha256(image_bytes[:4096]).digest()
+        rng = random.Random(image_bytes[:64])
+        points = [[rng.uniform(0, 1), rng.uniform(0, 1)] for _ in range(LANDMARK_COUNT)]
+        return {
+            "error": None,
+            "points": points,
+            "annotated_image_base64": base64.b64encode(image_bytes).decode() if return_image_base64 else None,
+        }
+
+    return analyze_face_landmarks
+
+
+def serve(args) -> None:
+    import types
+
+    directory = tempfile.mkdtemp(prefix="loadtest-")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{directory}/loadtest.db"
+    os.environ["BLOB_STORE_PATH"] = os.path.join(directory, "blobs")
+    # Installed before the app imports the analyzer, so the real models are never loaded
+    stub = types.ModuleType("analyzer.tui")
+    stub.analyze_face_landmarks = _stub_analyze_face_landmarks(args.model_ms / 1000)
+    sys.modules["analyzer.tui"] = stub
+
+    import uvicorn
+
+    from main import app
+
+    print(f"stub server on http://{args.host}:{args.port} ({os.environ['DATABASE_URL']})", flush=True)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+# --- synthetic input -----------------------------------------------------------------------
+
+def synthetic_faces(count: int, seed: int = 0) -> list[bytes]:
+    """JPEGs of a rough face (skin-tone oval, eyes, nose, mouth) on a noisy background."""
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    faces = []
+    for _ in range(count):
+        width, height = 480, 640
+        image = Image.effect_noise((width, height), 40).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        skin = (rng.randint(150, 235), rng.randint(110, 190), rng.randint(90, 160))
+        cx, cy = width // 2 + rng.randint(-30, 30), height // 2 + rng.randint(-30, 30)
+        fw, fh = rng.randint(150, 190), rng.randint(200, 250)
+        draw.ellipse((cx - fw, cy - fh, cx + fw, cy + fh), fill=skin)
+        for dx in (-1, 1):
+            ex = cx + dx * fw // 2
+            draw.ellipse((ex - 25, cy - 70, ex + 25, cy - 45), fill=(250, 250, 250))
+            draw.ellipse((ex - 10, cy - 68, ex + 10, cy - 48), fill=(60, 40, 30))
+        draw.polygon([(cx, cy - 30), (cx - 22, cy + 40), (cx + 22, cy + 40)], fill=tuple(c - 25 for c in skin))
+        draw.chord((cx - 60, cy + 70, cx + 60, cy + 120), 0, 180, fill=(170, 70, 70))
+        buffer = io.BytesIO()
+        image.filter(ImageFilter.GaussianBlur(1)).save(buffer, "JPEG", quality=85)
+        faces.append(buffer.getvalue())
+    return faces
+
+
+def synthetic_analysis(rng: random.Random) -> dict:
+    return {
+        "mesh": {"measurements": [{"comment": key, "value": round(rng.uniform(0.2, 1.0), 4)} for key in MEASUREMENT_KEYS]},
+        "phenotype": {"top1": rng.choice(["nordic", "alpine", "mediterranean", "dinaric"])},
+    }
+
+
+# --- load generator ------------------------------------------------------------------------
+
+@dataclass
+class RouteStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Counter = field(default_factory=Counter)
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    def summary(self, elapsed: float) -> dict:
+        q = statistics.quantiles(self.latencies, n=100) if self.count >= 2 else [self.latencies[0] if self.latencies else 0.0] * 99
+        return {
+            "count": self.count,
+            "rps": round(self.count / elapsed, 2),
+            "p50_ms": round(q[49] * 1000, 2),
+            "p95_ms": round(q[94] * 1000, 2),
+            "p99_ms": round(q[98] * 1000, 2),
+            "error_rate": round(self.errors / self.count, 4) if self.count else 0.0,
+            "statuses": {str(status): n for status, n in self.statuses.most_common()},
+        }
+
+
+class LoadTest:
+    def __init__(self, client, faces: list[bytes], deadline: float):
+        self.client = client
+        self.faces = faces
+        self.deadline = deadline
+        self.stats: dict[str, RouteStats] = defaultdict(RouteStats)
+
+    async def call(self, route: str, method: str, url: str, expect=(200,), **kwargs):
+        start = time.perf_counter()
+        stats = self.stats[route]
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception as e:  # connection errors, timeouts
+            stats.latencies.append(time.perf_counter() - start)
+            stats.errors += 1
+            stats.statuses[type(e).__name__] += 1
+            return None
+        stats.latencies.append(time.perf_counter() - start)
+        stats.statuses[response.status_code] += 1
+        if response.status_code not in expect:
+            stats.errors += 1
+            return None
+        return response
+
+    async def user(self, n: int, run_id: str, region_id: int) -> None:
+        rng = random.Random(n)
+        username = f"lt-{run_id}-{n}"
+        await self.call("POST /api/auth/register", "POST", "/api/auth/register", json={
+            "email": f"{username}@loadtest.example.com", "username": username, "password": "loadtest-password",
+        })
+        login = await self.call("POST /api/auth/login", "POST", "/api/auth/login", json={
+            "username": username, "password": "loadtest-password",
+        })
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"} if login else {}
+
+        while time.perf_counter() < self.deadline:
+            face = rng.choice(self.faces)
+            await self.call("GET /api/auth/me", "GET", "/api/auth/me", headers=headers)
+
+            data_url = "data:image/jpeg;base64," + base64.b64encode(face).decode()
+            analyzed = await self.call("POST /api/analyze", "POST", "/api/analyze", json={"image": data_url})
+            if analyzed:
+                session_id = analyzed.json()["sessionId"]
+                await self.call("POST /api/analyze/answers", "POST", "/api/analyze/answers", json={
+                    "sessionId": session_id,
+                    "answers": {"skin_type": rng.choice(["сухая", "жирная"]), "reaction": "загораю постепенно"},
+                })
+                await self.call(
+                    "GET /api/analyze/sessions/{id}", "GET", f"/api/analyze/sessions/{session_id}"
+                )
+
+            await self.call(
+                "POST /api/analyze/landmarks", "POST", "/api/analyze/landmarks",
+                files={"file": ("face.jpg", face, "image/jpeg")},
+            )
+
+            created = await self.call("POST /api/user-profiles/", "POST", "/api/user-profiles/", json={
+                "region_id": region_id, "phenotype_analyze": synthetic_analysis(rng),
+            })
+            if created:
+                profile_id = created.json()["id"]
+                url = f"/api/user-profiles/{profile_id}"
+                await self.call("GET /api/user-profiles/{id}", "GET", url)
+                await self.call("PATCH /api/user-profiles/{id}", "PATCH", url, json={
+                    "phenotype_analyze": synthetic_analysis(rng),
+                })
+                await self.call("DELETE /api/user-profiles/{id}", "DELETE", url, expect=(204,))
+
+
+async def run_load(args) -> tuple[dict, float]:
+    import httpx
+
+    faces = synthetic_faces(args.images)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        region = (await client.post("/api/regions/", json={
+            "name": f"loadtest-{int(time.time())}", "view_name": "Load test",
+        })).raise_for_status().json()
+        run_id = f"{int(time.time())}-{os.getpid()}"
+        started = time.perf_counter()
+        test = LoadTest(client, faces, started + args.duration)
+        await asyncio.gather(*(test.user(n, run_id, region["id"]) for n in range(args.users)))
+        elapsed = time.perf_counter() - started
+        await client.delete(f"/api/regions/{region['id']}")
+    return {route: stats.summary(elapsed) for route, stats in sorted(test.stats.items())}, elapsed
+
+
+def _print_report(routes: dict, baseline: dict | None) -> None:
+    header = f"{'route':<34} {'count':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err %':>6}"
+    if baseline:
+        header += f" {'Δp95':>8} {'Δrps':>8}"
+    print(header)
+    for route, s in routes.items():
+        line = (
+            f"{route:<34} {s['count']:>6} {s['rps']:>8.1f} {s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f}"
+            f" {s['p99_ms']:>8.1f} {s['error_rate'] * 100:>6.1f}"
+        )
+        base = (baseline or {}).get(route)
+        if base:
+            line += f" {_delta(s['p95_ms'], base['p95_ms']):>8} {_delta(s['rps'], base['rps']):>8}"
+        print(line)
+    for route, s in routes.items():
+        if s["error_rate"]:
+            print(f"  {route}: responses {', '.join(f'{status}x{n}' for status, n in s['statuses'].items())}")
+
+
+def _delta(current: float, base: float) -> str:
+    return f"{(current - base) / base * 100:+.0f}%" if base else "n/a"
+
+
+def regressions(routes: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for route, base in baseline.items():
+        current = routes.get(route)
+        if current is None:
+            found.append(f"{route}: not exercised in this run")
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            found.append(f"{route}: p95 {base['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+        if route not in SETUP_ROUTES and base["rps"] and current["rps"] < base["rps"] * (1 - tolerance):
+            found.append(f"{route}: throughput {base['rps']:.1f} -> {current['rps']:.1f} req/s")
+        if current["error_rate"] > base["error_rate"] + 0.01:
+            found.append(f"{route}: error rate {base['error_rate']:.1%} -> {current['error_rate']:.1%}")
+    return found
+
+
+def _wait_for_server(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"stub server exited with status {process.returncode}")
+        try:
+            httpx.get(url + "/", timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit("stub server did not start in time")
+
+
+def run(args) -> int:
+    server = None
+    if args.spawn_server:
+        port = args.url.rsplit(":", 1)[-1].strip("/")
+        server = subprocess.Popen([
+            sys.executable, "-m", "benchmarks.loadtest", "serve", "--port", port, "--model-ms", str(args.model_ms),
+        ])
+        _wait_for_server(args.url, server)
+    try:
+        routes, elapsed = asyncio.run(run_load(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    total = sum(s["count"] for s in routes.values())
+    print(f"{args.users} users, {elapsed:.1f} s, {total} requests ({total / elapsed:.1f} req/s) against {args.url}")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["routes"]
+    _print_report(routes, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "users": args.users, "duration": args.duration, "model_ms": args.model_ms,
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "routes": routes,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"baseline written to {args.save_baseline}")
+
+    if baseline is not None:
+        found = regressions(routes, baseline, args.tolerance)
+        for message in found:
+            print("REGRESSION", message)
+        return 1 if found else 0
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the app with stub models")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--model-ms", type=float, default=20.0, help="CPU time the stub model burns per image")
+    serve_parser.add_argument("--database-url", help="default: a scratch SQLite file")
+
+    run_parser = commands.add_parser("run", help="drive the flows and report")
+    run_parser.add_argument("--url", default="http://127.0.0.1:8765")
+    run_parser.add_argument("--users", type=int, default=20)
+    run_parser.add_argument("--duration", type=float, default=30.0)
+    run_parser.add_argument("--images", type=int, default=8, help="distinct synthetic face images")
+    run_parser.add_argument("--timeout", type=float, default=30.0)
+    run_parser.add_argument("--baseline", help="JSON from an earlier --save-baseline to compare against")
+    run_parser.add_argument("--save-baseline", help="write this run's numbers as JSON")
+    run_parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative p95 / throughput change")
+    run_parser.add_argument("--spawn-server", action="store_true", help="start `serve` for the duration of the run")
+    run_parser.add_argument("--model-ms", type=float, default=20.0, help="with --spawn-server")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args)
+        return 0
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Latency of ordinary requests while a burst of logins is being verified.
+
+    python -m benchmarks.login_burst [--logins 200] [--requests 400] [--rounds 12]
+
+Drives the auth router in-process over ASGI against a throwaway SQLite database:
+one task fires ``--logins`` concurrent POST /api/auth/login calls while
+another issues ``--requests`` sequential GET /api/auth/me calls (a sync
+endpoint, so it needs a threadpool slot) and records their latency.
+
+- idle:        /me with no logins running
+- threadpool:  logins verify bcrypt via run_in_threadpool (the previous behaviour)
+- processpool: logins verify bcrypt via passwords.verify_password (dedicated processes)
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def _configure(rounds: int) -> None:
+    # Settings are read at import time, so point them at a scratch DB before importing the app
+    directory = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{directory}/bench.db"
+    os.environ["BLOB_STORE_PATH"] = f"{directory}/blobs"
+    os.environ["BCRYPT_ROUNDS"] = str(rounds)
+    os.environ["AUTH_CACHE_TTL"] = "0"
+    os.environ["PASSWORD_HASH_QUEUE_LIMIT"] = str(1 << 20)
+
+
+async def _me_latencies(client, headers: dict, count: int, stop: asyncio.Event | None) -> list[float]:
+    latencies = []
+    for _ in range(count):
+        if stop is not None and stop.is_set():
+            break
+        start = time.perf_counter()
+        response = await client.get("/api/auth/me", headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def _burst(client, logins: int, stop: asyncio.Event) -> float:
+    start = time.perf_counter()
+    body = {"username": "bench", "password": "bench-password"}
+    responses = await asyncio.gather(*(client.post("/api/auth/login", json=body) for _ in range(logins)))
+    stop.set()
+    assert all(r.status_code == 200 for r in responses), {r.status_code for r in responses}
+    return time.perf_counter() - start
+
+
+def _report(label: str, latencies: list[float], burst: float | None) -> None:
+    q = statistics.quantiles(latencies, n=100)
+    tail = f"   burst {burst:6.2f} s" if burst is not None else ""
+    print(f"{label:<12} /me p50 {q[49] * 1000:7.1f} ms   p99 {q[98] * 1000:7.1f} ms   n={len(latencies)}{tail}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+    _configure(args.rounds)
+
+    import httpx
+    from fastapi import FastAPI
+    from fastapi.concurrency import run_in_threadpool
+
+    import passwords
+    from database import Base, async_engine, engine
+    from models.user import User  # noqa: F401 - register model
+    from routers import auth as auth_router
+
+    Base.metadata.create_all(bind=engine)
+    app = FastAPI()
+    app.include_router(auth_router.router, prefix="/api")
+
+    async def threadpool_verify(password: str, hashed: str):
+        return await run_in_threadpool(passwords.pwd_context.verify_and_update, password, hashed)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post(
+            "/api/auth/register",
+            json={"email": "bench@example.com", "username": "bench", "password": "bench-password"},
+        )
+        token = (await client.post(
+            "/api/auth/login", json={"username": "bench", "password": "bench-password"}
+        )).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        print(f"bcrypt rounds {args.rounds}, {args.logins} concurrent logins, {os.cpu_count()} CPUs")
+        _report("idle", await _me_latencies(client, headers, args.requests, None), None)
+        for label, verify in (("threadpool", threadpool_verify), ("processpool", passwords.verify_password)):
+            auth_router.verify_password = verify
+            stop = asyncio.Event()
+            burst, latencies = await asyncio.gather(
+                _burst(client, args.logins, stop),
+                _me_latencies(client, headers, args.requests, stop),
+            )
+            _report(label, latencies, burst)
+    passwords.shutdown_password_pool()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
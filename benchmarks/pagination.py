@@ -0,0 +1,71 @@
+"""
+Latency of deep pages: OFFSET vs keyset (cursor) pagination.
+
+    python -m benchmarks.pagination [--rows 1000000] [--limit 100] [--url sqlite:///...]
+
+Seeds the regions table of a scratch database (temporary SQLite file by
+default) and times the statements built by pagination.paginate for pages
+1, 100, 1000 and 10000. OFFSET latency grows with the page number; keyset
+latency stays flat.
+"""
+import argparse
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, insert, select
+
+from models.region import Region
+from pagination import encode_cursor, paginate
+
+PAGES = (1, 100, 1000, 10000)
+
+
+def _time(conn, stmt, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(stmt).all()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default=None, help="scratch database URL (its regions table is recreated)")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url or f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    table = Region.__table__
+    table.drop(engine, checkfirst=True)
+    table.create(engine)
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        batch = 50_000
+        for start in range(0, args.rows, batch):
+            conn.execute(insert(table), [
+                {"view_name": f"Region {i}", "name": f"region-{i}", "created_at": now, "updated_at": now}
+                for i in range(start, min(start + batch, args.rows))
+            ])
+
+    with engine.connect() as conn:
+        print(f"{conn.scalar(select(func.count()).select_from(table))} rows, limit {args.limit}")
+        print(f"{'page':>6} {'offset ms':>10} {'keyset ms':>10}")
+        for page in PAGES:
+            skip = (page - 1) * args.limit
+            if skip >= args.rows:
+                break
+            offset_stmt = paginate(select(table), table.c.id, skip=skip, limit=args.limit, cursor=None)
+            # id of the last row on the previous page, as a client would have received it
+            last_id = conn.scalar(select(table.c.id).order_by(table.c.id).offset(skip - 1).limit(1)) if skip else 0
+            keyset_stmt = paginate(
+                select(table), table.c.id, skip=0, limit=args.limit, cursor=encode_cursor(last_id)
+            )
+            assert conn.execute(offset_stmt).all() == conn.execute(keyset_stmt).all()
+            print(f"{page:>6} {_time(conn, offset_stmt, args.repeat):>10.2f} {_time(conn, keyset_stmt, args.repeat):>10.2f}")
+    table.drop(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Compare response serialization and compression for an analyzer-sized payload.
+
+    python -m benchmarks.serialization [--points 478] [--image-kb 300] [--repeat 200]
+
+Prints time per response for FastAPI's default path (jsonable_encoder + json)
+vs orjson, and body size raw / gzip / brotli at the levels used by
+CompressionMiddleware.
+"""
+import argparse
+import base64
+import os
+import time
+
+import numpy as np
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from compression import _compress
+from config import settings
+
+
+def _timeit(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=478)
+    parser.add_argument("--image-kb", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    points = (np.random.rand(args.points, 2) * 1024).astype(np.float32)
+    image_b64 = base64.b64encode(os.urandom(args.image_kb * 1024)).decode()
+
+    def stdlib():
+        payload = {"points": points.tolist(), "annotated_image_base64": image_b64}
+        return JSONResponse(jsonable_encoder(payload)).body
+
+    def fast():
+        return ORJSONResponse({"points": points, "annotated_image_base64": image_b64}).body
+
+    print(f"payload: {args.points} points + {args.image_kb} KiB image")
+    print(f"  jsonable_encoder + json: {_timeit(stdlib, args.repeat):8.2f} ms")
+    print(f"  orjson (numpy native):   {_timeit(fast, args.repeat):8.2f} ms")
+
+    for label, body in (
+        ("points only", orjson.dumps({"points": points}, option=orjson.OPT_SERIALIZE_NUMPY)),
+        ("full response", fast()),
+    ):
+        gz = _compress(body, "gzip", settings.COMPRESSION_BROTLI_QUALITY, settings.COMPRESSION_GZIP_LEVEL)
+        br = _compress(body, "br", settings.COMPRESSION_BROTLI_QUALITY, settings.COMPRESSION_GZIP_LEVEL)
+        print(f"{label}: raw {len(body):>9} B, gzip {len(gz):>9} B, br {len(br):>9} B")
+
+
+if __name__ == "__main__":
+    main()
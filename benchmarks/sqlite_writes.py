@@ -0,0 +1,132 @@
+"""
+Concurrent small writes on SQLite: default settings vs production pragmas vs the write queue.
+
+    python -m benchmarks.sqlite_writes [--writes 3000] [--concurrency 50]
+
+Every write is a small read-then-write transaction (look a row up, insert
+another), like the analyzer's session updates, issued concurrently from
+asyncio tasks over aiosqlite:
+
+- default:   a transaction per write, SQLite defaults (rollback journal, synchronous=FULL)
+- pragmas:   a transaction per write with database.sqlite_pragmas() (WAL, synchronous=NORMAL, ...)
+- coalesced: pragmas + write_queue.WriteQueue (one writer connection, batched commits)
+
+Failed writes ("database is locked") are counted, not retried.
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import AsyncAdaptedQueuePool, Column, Integer, MetaData, String, Table, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from database import apply_sqlite_pragmas
+from write_queue import WriteQueue, create_writer_engine
+
+metadata = MetaData()
+rows = Table(
+    "bench_writes",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("payload", String(64)),
+)
+
+
+def write_job(db: Session, n: int) -> int:
+    db.execute(select(func.max(rows.c.id))).scalar()
+    return db.execute(insert(rows).values(payload=f"write-{n}").returning(rows.c.id)).scalar()
+
+
+async def _prepare(url: str) -> None:
+    engine = create_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.drop_all)
+        await conn.run_sync(metadata.create_all)
+    await engine.dispose()
+
+
+async def run(submit, total: int, concurrency: int) -> tuple[float, list[float], int]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(n: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await submit(n)
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(total)))
+    elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, latencies, errors
+
+
+async def per_transaction(url: str, pragmas: bool, total: int, concurrency: int):
+    engine = create_async_engine(url, poolclass=AsyncAdaptedQueuePool, pool_size=concurrency, max_overflow=0)
+    if pragmas:
+        apply_sqlite_pragmas(engine.sync_engine)
+    else:
+        # Same lock wait as the pragmas variant, so only the journal / sync settings differ
+        apply_sqlite_pragmas(engine.sync_engine, ["PRAGMA journal_mode=DELETE", "PRAGMA busy_timeout=5000"])
+    sessions = async_sessionmaker(engine)
+
+    async def submit(n: int):
+        async with sessions() as db:
+            await db.run_sync(write_job, n)
+            await db.commit()
+
+    try:
+        return await run(submit, total, concurrency)
+    finally:
+        await engine.dispose()
+
+
+async def coalesced(url: str, batch_size: int, total: int, concurrency: int):
+    writer_engine = create_writer_engine(url.replace("sqlite+aiosqlite", "sqlite"))
+    queue = WriteQueue(async_sessionmaker(writer_engine, expire_on_commit=False), batch_size=batch_size)
+    try:
+        return await run(lambda n: queue.submit(write_job, n), total, concurrency)
+    finally:
+        await queue.stop()
+        await writer_engine.dispose()
+
+
+def _report(label: str, rps: float, latencies: list[float], errors: int) -> None:
+    if len(latencies) < 2:
+        print(f"{label:<10} {rps:8.0f} writes/s   errors {errors}")
+        return
+    q = statistics.quantiles(latencies, n=100)
+    print(
+        f"{label:<10} {rps:8.0f} writes/s   p50 {q[49] * 1000:7.1f} ms   p99 {q[98] * 1000:7.1f} ms   errors {errors}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--writes", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{args.writes} writes, concurrency {args.concurrency}")
+    for label, variant in (
+        ("default", lambda url: per_transaction(url, False, args.writes, args.concurrency)),
+        ("pragmas", lambda url: per_transaction(url, True, args.writes, args.concurrency)),
+        ("coalesced", lambda url: coalesced(url, args.batch_size, args.writes, args.concurrency)),
+    ):
+        url = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+        await _prepare(url)
+        _report(label, *await variant(url))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+"""
+Per-worker memory of serve.py with the weights loaded before vs after forking.
+
+    python -m benchmarks.worker_memory [--workers 4] [--modes worker,master] [--settle 10]
+
+For each mode, starts ``serve.py --workers N --preload <mode>`` on a scratch SQLite
+database. It waits until the server answers and the workers have settled, then
+reads every worker's /proc/<pid>/smaps_rollup:
+
+- worker: every worker loads its own copy after the fork. This is what
+  ``uvicorn --workers N`` costs once each worker has served an analysis request.
+- master: the master loads the weights once and the workers share them.
+- off:    nothing loaded yet (the app alone).
+
+Compare the PSS totals. PSS splits shared pages between the processes that map
+them, so the total is the real combined footprint. Needs the real weights
+(LANDMARK_WEIGHTS_PATH, PHENOTYPE_WEIGHTS_PATH); without them every mode shows
+the bare app. Linux only.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from memory import MB, memory_breakdown
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _children(pid: int) -> list[int]:
+    found = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Fields after the parenthesised command name: state, ppid, ...
+                ppid = int(f.read().rpartition(")")[2].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            found.append(int(entry))
+    return sorted(found)
+
+
+def _wait_ready(url: str, server: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"serve.py exited with {server.returncode}")
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"{url} did not answer within {timeout:.0f} s")
+
+
+def measure(mode: str, workers: int, port: int, settle: float, env: dict) -> list[tuple[str, dict]]:
+    server = subprocess.Popen(
+        [sys.executable, "serve.py", "--port", str(port), "--workers", str(workers), "--preload", mode,
+         "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        _wait_ready(f"http://127.0.0.1:{port}/", server, timeout=300)
+        time.sleep(settle)
+        rows = [("master", memory_breakdown(server.pid))]
+        rows += [(f"worker {pid}", memory_breakdown(pid)) for pid in _children(server.pid)]
+        return [(label, breakdown) for label, breakdown in rows if breakdown is not None]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+
+def _report(mode: str, rows: list[tuple[str, dict]]) -> None:
+    print(f"\n--preload {mode}")
+    print(f"  {'process':<14} {'rss':>8} {'pss':>8} {'shared':>8} {'private':>8}")
+    for label, b in rows:
+        print(f"  {label:<14} " + " ".join(f"{b[key] / MB:8.0f}" for key in ("rss", "pss", "shared", "private")))
+    workers = [b for label, b in rows if label != "master"]
+    total_pss = sum(b["pss"] for _, b in rows)
+    worker_private = sum(b["private"] for b in workers) / max(len(workers), 1)
+    print(f"  total PSS {total_pss / MB:.0f} MB, private per worker {worker_private / MB:.0f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", default="worker,master", help="comma-separated: worker, master, off")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--settle", type=float, default=10.0, help="seconds to wait after the first response")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{directory}/bench.db",
+        BLOB_STORE_PATH=f"{directory}/blobs",
+        MEMORY_SAMPLE_RATE="0",
+    )
+    for mode in args.modes.split(","):
+        _report(mode, measure(mode.strip(), args.workers, args.port, args.settle, env))
+
+
+if __name__ == "__main__":
+    main()
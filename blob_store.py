@@ -0,0 +1,287 @@
+"""Content-addressed image storage on local disk.
+
+Images are keyed by their SHA-256 hex digest and sharded into two directory
+levels (``ab/cd/abcd...``), so identical uploads are stored once. The
+``blobs`` table keeps a reference count per digest; rows in other tables only
+store the digest.
+
+Files and rows are kept consistent by ordering, not by a shared lock:
+
+- ``store_blob`` takes the reference (an upsert, which locks the row) before
+  it writes or checks the file. Callers may stage the file earlier with
+  ``blob_store.write`` to keep file I/O out of the transaction; the check
+  after the reference rewrites it if a removal got there first.
+- Dropping the last reference leaves the row at refcount 0. After the commit,
+  ``remove_unreferenced`` deletes the row with ``refcount <= 0`` in a new
+  transaction (inserting a placeholder row to lock if there is none) and
+  unlinks the file before committing. A concurrent ``retain_blob`` waits on
+  that row lock, so it either keeps the file alive or re-checks the file
+  after it is gone.
+- A rolled-back transaction checks the digests it referenced the same way,
+  so a staged file does not outlive a failed insert. Files left behind by a
+  crash are collected by ``sweep_orphans``:
+
+    python -m blob_store
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal, dialect_insert
+from models.blob import Blob
+
+logger = logging.getLogger(__name__)
+
+_PENDING_REMOVAL_KEY = "blob_store_pending_removal"
+_RETAINED_KEY = "blob_store_retained"
+_DIGEST_NAME = re.compile(r"^[0-9a-f]{64}(\.|$)")
+# Files younger than this may belong to a transaction that has not committed its reference yet
+ORPHAN_MIN_AGE = 3600.0
+SWEEP_BATCH_SIZE = 500
+
+
+class BlobStore:
+    """Sharded directory of immutable files named by SHA-256 digest."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def write(self, data: bytes, digest: str | None = None) -> str:
+        """
+        Store data (if not already present) and return its digest. Without a reference taken first (see
+        store_blob) the file is only staged: a concurrent removal or the orphan sweep may delete it.
+        """
+        digest = digest or self.digest(data)
+        path = self.path_for(digest)
+        if not path.exists():
+            _atomic_write(path, data)
+        return digest
+
+    def derivative_path(self, digest: str, suffix: str) -> Path:
+        """Path of a file derived from a blob (e.g. a thumbnail), stored next to the original."""
+        return self.path_for(digest).with_name(f"{digest}.{suffix}")
+
+    def write_derivative(self, digest: str, suffix: str, data: bytes) -> Path:
+        path = self.derivative_path(digest, suffix)
+        _atomic_write(path, data)
+        return path
+
+    def read(self, digest: str) -> bytes | None:
+        try:
+            return self.path_for(digest).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def media_type(self, digest: str) -> str:
+        """Guess the image MIME type from the file's magic bytes."""
+        with self.path_for(digest).open("rb") as f:
+            head = f.read(12)
+        if head.startswith(b"\xff\xd8\xff"):
+            return "image/jpeg"
+        if head.startswith(b"\x89PNG\r\n\x1a\n"):
+            return "image/png"
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return "image/webp"
+        return "application/octet-stream"
+
+    def iter_files(self) -> Iterable[Path]:
+        """Every file under the store root, including derivatives and interrupted temporary files."""
+        if not self.root.exists():
+            return
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                yield Path(directory) / name
+
+    def remove(self, digest: str) -> None:
+        """Delete a blob together with its derivatives."""
+        path = self.path_for(digest)
+        if path.parent.exists():
+            for derived in path.parent.glob(f"{digest}.*"):
+                derived.unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+blob_store = BlobStore(settings.BLOB_STORE_PATH)
+
+
+def retain_blob(db: Session, digest: str, size: int) -> None:
+    """Take one reference on a digest, creating its ``blobs`` row if needed; the row stays locked until commit."""
+    stmt = dialect_insert(db, Blob).values(sha256=digest, size=size, refcount=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Blob.sha256],
+        set_={"refcount": Blob.refcount + 1, "size": size},
+    )
+    db.execute(stmt)
+    db.info.setdefault(_RETAINED_KEY, set()).add(digest)
+
+
+def release_blob(db: Session, digest: str | None) -> int:
+    """
+    Drop one reference; the file is deleted once the transaction commits with no references left.
+    Returns the number of bytes that will be freed (0 while the blob is still referenced).
+    """
+    if not digest:
+        return 0
+    row = db.execute(
+        update(Blob)
+        .where(Blob.sha256 == digest)
+        .values(refcount=Blob.refcount - 1)
+        .returning(Blob.refcount, Blob.size)
+    ).first()
+    if row is None or row.refcount > 0:
+        return 0
+    db.info.setdefault(_PENDING_REMOVAL_KEY, set()).add(digest)
+    return row.size
+
+
+def store_blob(db: Session, data: bytes | None, digest: str | None = None) -> str | None:
+    """
+    Reference image bytes from the current transaction, then make sure the file is on disk. ``digest`` skips
+    hashing when the caller already staged the file with ``blob_store.write``.
+    """
+    if not data:
+        return None
+    digest = digest or blob_store.digest(data)
+    retain_blob(db, digest, len(data))
+    blob_store.write(data, digest)
+    return digest
+
+
+async def store_blob_async(db: AsyncSession, data: bytes | None) -> str | None:
+    """``store_blob`` for async sessions; hashing and the file write run in the threadpool."""
+    if not data:
+        return None
+    digest = await run_in_threadpool(blob_store.digest, data)
+    await db.run_sync(retain_blob, digest, len(data))
+    await run_in_threadpool(blob_store.write, data, digest)
+    return digest
+
+
+def load_blob(digest: str | None) -> bytes | None:
+    if not digest:
+        return None
+    return blob_store.read(digest)
+
+
+def remove_unreferenced(digests: Iterable[str]) -> int:
+    """Delete the rows and files of digests without references, each under its row lock; returns how many went."""
+    removed = 0
+    for digest in digests:
+        with SessionLocal() as db:
+            # Lock the row, or a placeholder when there is none, so retain_blob waits until the file is gone
+            db.execute(
+                dialect_insert(db, Blob)
+                .values(sha256=digest, size=0, refcount=0)
+                .on_conflict_do_nothing(index_elements=[Blob.sha256])
+            )
+            gone = db.execute(
+                delete(Blob).where(Blob.sha256 == digest, Blob.refcount <= 0).returning(Blob.sha256)
+            ).scalar()
+            if gone is None:
+                db.rollback()
+                continue
+            blob_store.remove(digest)
+            db.commit()
+            removed += 1
+    return removed
+
+
+def sweep_orphans(min_age: float = ORPHAN_MIN_AGE) -> int:
+    """
+    Remove files that have no ``blobs`` reference (left by a crash between staging and commit) and
+    rows stuck at refcount 0, plus interrupted temporary files. Returns the number of digests removed.
+    """
+    cutoff = time.time() - min_age
+    candidates: set[str] = set()
+    for path in blob_store.iter_files():
+        try:
+            if path.stat().st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        if path.name.startswith(".tmp-"):
+            path.unlink(missing_ok=True)
+        elif _DIGEST_NAME.match(path.name):
+            candidates.add(path.name[:64])
+
+    with SessionLocal() as db:
+        orphans = set(db.scalars(select(Blob.sha256).where(Blob.refcount <= 0)))
+        candidates = sorted(candidates)
+        for start in range(0, len(candidates), SWEEP_BATCH_SIZE):
+            batch = candidates[start:start + SWEEP_BATCH_SIZE]
+            referenced = set(db.scalars(select(Blob.sha256).where(Blob.sha256.in_(batch), Blob.refcount > 0)))
+            orphans.update(digest for digest in batch if digest not in referenced)
+    return remove_unreferenced(sorted(orphans))
+
+
+# Removals touch the database; run them off the committing thread, which may be the event loop
+_removal_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="blob-removal")
+
+
+def _remove_logged(digests: set[str]) -> None:
+    try:
+        remove_unreferenced(digests)
+    except Exception:
+        # The sweep picks them up later
+        logger.exception("Removing %d unreferenced blobs failed", len(digests))
+
+
+def _schedule_removal(digests: set[str]) -> None:
+    _removal_executor.submit(_remove_logged, digests)
+
+
+@event.listens_for(Session, "after_commit")
+def _remove_released_files(session: Session) -> None:
+    session.info.pop(_RETAINED_KEY, None)
+    pending = session.info.pop(_PENDING_REMOVAL_KEY, None)
+    if pending:
+        _schedule_removal(pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_removals(session: Session) -> None:
+    session.info.pop(_PENDING_REMOVAL_KEY, None)
+    # A staged file whose reference was rolled back would otherwise stay on disk with no row
+    retained = session.info.pop(_RETAINED_KEY, None)
+    if retained:
+        _schedule_removal(retained)
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    print(f"Removed {sweep_orphans()} unreferenced blobs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Bulk create / upsert for the catalog tables (regions, phenotypes, face features).
+
+The body is a JSON array or NDJSON (``Content-Type: application/x-ndjson``),
+one object per row in the shape of the table's ``*Create`` schema. Rows are
+validated one by one; the valid ones are written in a single transaction with
+one executemany INSERT (and, for upserts, one executemany UPDATE) instead of a
+commit and refresh per row. With ``upsert`` a row whose ``name`` already
+exists updates that record; when a name repeats within the batch the last
+occurrence wins and the earlier ones are reported as skipped.
+"""
+from datetime import datetime
+
+import orjson
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from http_cache import bump_table_versions
+from schemas.bulk import BulkResult, BulkRowResult
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+
+async def read_bulk_rows(request: Request) -> list:
+    body = await request.body()
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if media_type in NDJSON_MEDIA_TYPES:
+        rows = []
+        for lineno, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                rows.append(orjson.loads(line))
+            except orjson.JSONDecodeError as exc:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON on line {lineno}: {exc}")
+    else:
+        try:
+            rows = orjson.loads(body)
+        except orjson.JSONDecodeError as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {exc}")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON")
+    if len(rows) > settings.BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BULK_MAX_ROWS} rows per request")
+    return rows
+
+
+def _format_errors(exc: ValidationError) -> list[str]:
+    return [f"{'.'.join(str(p) for p in err['loc']) or 'row'}: {err['msg']}" for err in exc.errors()]
+
+
+async def bulk_write(
+    db: AsyncSession,
+    model,
+    schema: type[BaseModel],
+    raw_rows: list,
+    *,
+    upsert: bool = False,
+) -> BulkResult:
+    results: list[BulkRowResult | None] = [None] * len(raw_rows)
+    valid: dict[int, dict] = {}
+    for index, raw in enumerate(raw_rows):
+        try:
+            valid[index] = schema.model_validate(raw).model_dump()
+        except ValidationError as exc:
+            results[index] = BulkRowResult(index=index, status="invalid", errors=_format_errors(exc))
+
+    existing: dict[str, int] = {}
+    if upsert and valid:
+        last_for_name = {row["name"]: index for index, row in valid.items()}
+        for index in [i for i, row in valid.items() if last_for_name[row["name"]] != i]:
+            row = valid.pop(index)
+            results[index] = BulkRowResult(
+                index=index,
+                status="skipped",
+                errors=[f"name repeated later in the batch (row {last_for_name[row['name']]})"],
+            )
+        # Descending so that, if the table already holds duplicates, the oldest record is updated
+        found = await db.execute(
+            select(model.id, model.name).where(model.name.in_(last_for_name)).order_by(model.id.desc())
+        )
+        existing = {name: row_id for row_id, name in found}
+
+    to_insert = [(index, row) for index, row in valid.items() if row["name"] not in existing]
+    to_update = [(index, row) for index, row in valid.items() if row["name"] in existing]
+
+    if to_insert:
+        ids = (await db.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            [row for _, row in to_insert],
+        )).all()
+        for (index, _), row_id in zip(to_insert, ids):
+            results[index] = BulkRowResult(index=index, status="created", id=row_id)
+    if to_update:
+        now = datetime.utcnow()
+        await db.execute(
+            update(model),
+            [{**row, "id": existing[row["name"]], "updated_at": now} for _, row in to_update],
+        )
+        for index, row in to_update:
+            results[index] = BulkRowResult(index=index, status="updated", id=existing[row["name"]])
+    if to_insert or to_update:
+        # Core-level statements bypass the flush hook that maintains table_versions
+        await db.run_sync(bump_table_versions, model.__tablename__)
+        await db.commit()
+
+    counts = {"created": 0, "updated": 0, "skipped": 0, "invalid": 0}
+    for result in results:
+        counts[result.status] += 1
+    return BulkResult(**counts, rows=results)
@@ -0,0 +1,112 @@
+"""Response compression middleware with Accept-Encoding negotiation (brotli, then gzip).
+
+Only complete (non-streamed) bodies of at least ``minimum_size`` bytes with a
+compressible content type are compressed; images and files streamed from the
+blob store pass through untouched. Large bodies are compressed in a worker
+thread so the event loop is not blocked.
+"""
+import gzip
+
+import anyio
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+# Bodies above this size are compressed off the event loop
+THREAD_THRESHOLD = 64 * 1024
+
+
+def _compress(body: bytes, encoding: str, brotli_quality: int, gzip_level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """Pick ``br`` or ``gzip`` from an Accept-Encoding header honouring q-values (br wins ties)."""
+    weights: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for encoding in ("br", "gzip"):
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        brotli_quality: int = 4,
+        gzip_level: int = 6,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli_quality = brotli_quality
+        self.gzip_level = gzip_level
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message: Message | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            passthrough = True  # everything after the first body chunk goes straight through
+            headers = MutableHeaders(raw=start_message["headers"])
+            content_type = headers.get("content-type", "")
+            compressible = (
+                "content-encoding" not in headers
+                and content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            if compressible:
+                headers.add_vary_header("Accept-Encoding")
+            body = message.get("body", b"")
+            if (
+                not compressible
+                or encoding is None
+                or message.get("more_body", False)
+                or len(body) < self.minimum_size
+            ):
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) > THREAD_THRESHOLD:
+                body = await anyio.to_thread.run_sync(
+                    _compress, body, encoding, self.brotli_quality, self.gzip_level
+                )
+            else:
+                body = _compress(body, encoding, self.brotli_quality, self.gzip_level)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
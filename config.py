@@ -6,15 +6,106 @@ class Settings(BaseSettings):
 
     # Database
     DATABASE_URL: str = "sqlite:///./app.db"
+    # Async driver URL; derived from DATABASE_URL (aiosqlite / asyncpg) when empty
+    ASYNC_DATABASE_URL: str = ""
+    # Connection pool, per engine and per worker process (sync and async engines each get one)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection before failing
+    DB_POOL_RECYCLE: int = 1800  # seconds; -1 keeps connections forever
+    DB_POOL_PRE_PING: bool = True  # not applied to SQLite
+    DB_POOL_SLOW_CHECKOUT_MS: float = 100.0  # log checkouts that wait longer
+    # SQLite only (file databases): pragmas set on every connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KIB: int = 64 * 1024
+    # SQLite only: funnel write_queue.run_write jobs through one connection, committing them in batches
+    SQLITE_WRITE_COALESCING: bool = True
+    SQLITE_WRITE_BATCH_SIZE: int = 64
+
+    # Blob store (images are kept on disk, rows only hold the SHA-256 digest)
+    BLOB_STORE_PATH: str = "data/blobs"
 
     # JWT
     SECRET_KEY: str = "change-me-in-production-use-openssl-rand-hex-32"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Per-worker cache of verified token -> user; seconds an entry lives (0 disables) and max entries
+    AUTH_CACHE_TTL: float = 60.0
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    # Password hashing: bcrypt work factor; worker processes and how many calls may wait for one
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32
 
     # Analyzer
     LANDMARK_WEIGHTS_PATH: str = "/home/ermakov/webproj/trainModel2/landmark_model.pth"
     PHENOTYPE_WEIGHTS_PATH: str = "analyzer/weights/phenotype_best.pt"
+    # Analyses run in the threadpool, CONCURRENCY at a time per worker; quality=auto switches to the fast
+    # tier (image capped at FAST_MAX_DIMENSION px, no YOLO / annotated image) once FAST_QUEUE_DEPTH
+    # analyses are already in flight (0 = never)
+    ANALYZER_CONCURRENCY: int = 1
+    ANALYZER_FAST_QUEUE_DEPTH: int = 2
+    ANALYZER_FAST_MAX_DIMENSION: int = 512
+
+    # HTTP caching: max-age (seconds) for reference lists (regions, phenotypes, face features)
+    CATALOG_CACHE_MAX_AGE: int = 60
+
+    # Response compression (br/gzip, negotiated via Accept-Encoding)
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_GZIP_LEVEL: int = 6
+
+    # In-process cache of lookup tables: seconds between version checks against the DB
+    REFERENCE_CACHE_TTL: float = 5.0
+
+    # Bulk catalog endpoints: maximum rows per request
+    BULK_MAX_ROWS: int = 5000
+
+    # Analysis session retention: completed sessions are kept for N days, never-answered ones for
+    # N hours; a background job purges expired ones every PURGE_INTERVAL seconds. Off (0) by default:
+    # the purge deletes sessions and their images, so enabling it is a deliberate choice
+    ANALYSIS_SESSION_RETENTION_DAYS: int = 30
+    ANALYSIS_SESSION_ABANDONED_RETENTION_HOURS: int = 24
+    ANALYSIS_SESSION_PURGE_INTERVAL: int = 0
+    ANALYSIS_SESSION_PURGE_BATCH_SIZE: int = 500
+
+    # Analysis job queue (worker.py): lease a worker holds a job for, renewed every HEARTBEAT_INTERVAL;
+    # attempts before a job fails, first retry delay (doubles per attempt); idle poll; finished jobs kept N hours
+    ANALYSIS_JOB_LEASE_SECONDS: float = 60.0
+    ANALYSIS_JOB_HEARTBEAT_INTERVAL: float = 15.0
+    ANALYSIS_JOB_MAX_ATTEMPTS: int = 3
+    ANALYSIS_JOB_RETRY_DELAY: float = 5.0
+    ANALYSIS_JOB_POLL_INTERVAL: float = 1.0
+    ANALYSIS_JOB_RETENTION_HOURS: int = 24
+    # Jobs queued with quality=auto run in the fast tier while at least N jobs are waiting (0 = never)
+    ANALYSIS_JOB_FAST_QUEUE_DEPTH: int = 20
+
+    # Face similarity index: seconds between checks for other workers' profile writes; max k per query
+    FACE_INDEX_SYNC_INTERVAL: float = 5.0
+    # Each sync re-reads changes this many seconds behind its watermark: update_time is set at flush, so
+    # a transaction that commits late has an older timestamp; must exceed the longest profile transaction
+    FACE_INDEX_SYNC_LOOKBACK: int = 300
+    FACE_INDEX_MAX_K: int = 100
+
+    # SQL profiling: "off", "header" (only requests sending X-SQL-Profile: 1) or "all";
+    # a statement repeated REPEAT_THRESHOLD times in one request is reported as an N+1 candidate
+    SQL_PROFILING: str = "off"
+    SQL_PROFILE_REPEAT_THRESHOLD: int = 3
+
+    # Live profiling (admin): longest stack-sampling run in seconds; cProfile captures kept per worker
+    PROFILER_MAX_SECONDS: float = 60.0
+    PROFILER_KEEP_REQUESTS: int = 20
+
+    # Memory: fraction of requests measured with tracemalloc (0 = off; only requests that run alone in the
+    # worker are sampled, tracing slows every allocation in the process); log requests peaking above N MB;
+    # recycle the worker when RSS stays above N MB (0 = never), checked every N seconds
+    MEMORY_SAMPLE_RATE: float = 0.0
+    MEMORY_REQUEST_PEAK_WARN_MB: float = 200.0
+    MEMORY_RECYCLE_RSS_MB: int = 0
+    MEMORY_CHECK_INTERVAL: float = 30.0
 
     # App
     APP_NAME: str = "Diploma Backend"
@@ -1,22 +1,183 @@
-from sqlalchemy import create_engine
+import logging
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 from config import settings
+from sql_profiler import profile_engine
+from pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, instrument_engine
+
+logger = logging.getLogger(__name__)
+
+
+def sqlite_pragmas() -> list[str]:
+    """Per-connection settings for file-backed SQLite (see SQLITE_* in config.py)."""
+    return [
+        f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}",
+        f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        # Negative cache_size is in KiB rather than pages
+        f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KIB}",
+    ]
+
+
+def apply_sqlite_pragmas(sync_engine, pragmas: list[str] | None = None) -> None:
+    """Run the pragmas on every new DBAPI connection (pass ``async_engine.sync_engine`` for aiosqlite)."""
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def is_sqlite_file(url: str) -> bool:
+    return url.startswith("sqlite") and ":memory:" not in url and url.rstrip("/") not in ("sqlite:", "sqlite+aiosqlite:")
+
+
+def pool_options(url: str) -> dict:
+    """DB_POOL_* settings as engine arguments; in-memory SQLite keeps its single-connection pool."""
+    if url.startswith("sqlite") and not is_sqlite_file(url):
+        return {}
+    options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if not url.startswith("sqlite"):
+        # A local file cannot drop the connection; servers (and proxies in between) can
+        options["pool_pre_ping"] = settings.DB_POOL_PRE_PING
+    return options
+
+
+def _async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its asyncio driver (aiosqlite / asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    drivers = {
+        "sqlite": "sqlite+aiosqlite",
+        "postgresql": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+        "postgres": "postgresql+asyncpg",
+    }
+    return drivers.get(scheme, scheme) + sep + rest
+
 
 # SQLite needs this for foreign keys
 connect_args = {}
 if settings.DATABASE_URL.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 
+engine_kwargs = pool_options(settings.DATABASE_URL)
+if engine_kwargs:
+    engine_kwargs["poolclass"] = InstrumentedQueuePool
+
 engine = create_engine(
     settings.DATABASE_URL,
     connect_args=connect_args,
     echo=settings.DEBUG,
+    **engine_kwargs,
 )
+if is_sqlite_file(settings.DATABASE_URL):
+    apply_sqlite_pragmas(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine_kwargs = pool_options(settings.DATABASE_URL)
+if async_engine_kwargs:
+    # Explicit for SQLite too: aiosqlite defaults to NullPool, i.e. a new connection (and thread) per session
+    async_engine_kwargs["poolclass"] = InstrumentedAsyncQueuePool
+
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or _async_database_url(settings.DATABASE_URL),
+    echo=settings.DEBUG,
+    **async_engine_kwargs,
+)
+if is_sqlite_file(settings.DATABASE_URL):
+    apply_sqlite_pragmas(async_engine.sync_engine)
+if engine_kwargs:
+    instrument_engine(engine, "sync")
+    instrument_engine(async_engine.sync_engine, "async")
+profile_engine(engine)
+profile_engine(async_engine.sync_engine)
+
+# expire_on_commit=False: attributes stay readable after commit without an implicit (sync) reload
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
+def dialect_insert(db, table):
+    """INSERT construct with ``on_conflict_do_update``/``do_nothing`` for the session's dialect."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upsert is not supported for dialect {dialect!r}")
+    return insert(table)
+
+
+# Tables the app created with create_all before migrations existed (revision 0001)
+BASELINE_TABLES = frozenset({
+    "items", "users", "regions", "phenotypes", "face_features", "user_profiles",
+    "user_profile_face_features", "analysis_sessions", "analysis_questions",
+})
+# Arbitrary key for pg_advisory_xact_lock, shared by every process migrating the same database
+_MIGRATION_LOCK_KEY = 0x64697031
+
+
+def _lock_for_migration(connection) -> None:
+    """Serialize concurrent upgrades (one per worker) until the surrounding transaction ends."""
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        connection.exec_driver_sql(f"SELECT pg_advisory_xact_lock({_MIGRATION_LOCK_KEY})")
+    elif dialect == "sqlite":
+        # Takes the write lock up front; other workers wait for it (busy_timeout) and then find the schema at head
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _is_baseline_schema(connection, tables: set[str]) -> bool:
+    """The schema of databases created by create_all before revision 0001 (images still in the tables)."""
+    if not BASELINE_TABLES <= tables:
+        return False
+    return "original_image" in {c["name"] for c in inspect(connection).get_columns("user_profiles")}
+
+
+def upgrade_database() -> None:
+    """Migrate the schema to the latest Alembic revision (``alembic upgrade head``); a no-op when already there.
+
+    Safe to call from every worker at once: the upgrade runs under a database lock, so one worker migrates
+    and the others find the schema at head. A database created by ``create_all`` before migrations existed
+    (the baseline tables, no ``alembic_version``) is stamped ``0001`` and upgraded from there. Any other
+    schema without ``alembic_version`` is refused (see README, "Database migrations").
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    root = Path(__file__).resolve().parent
+    config = Config(str(root / "alembic.ini"))
+    config.set_main_option("script_location", str(root / "migrations"))
+    with engine.begin() as connection:
+        _lock_for_migration(connection)
+        tables = set(inspect(connection).get_table_names())
+        # Run on this connection: keeps the app's logging setup, the SQLite pragmas and the lock
+        config.attributes["connection"] = connection
+        if tables and "alembic_version" not in tables:
+            if not _is_baseline_schema(connection, tables):
+                raise RuntimeError(
+                    f"{engine.url.render_as_string(hide_password=True)} has tables but no alembic_version; "
+                    "mark it with `alembic stamp <revision>` before starting the app"
+                )
+            logger.info("Database predates migrations; stamping revision 0001")
+            command.stamp(config, "0001")
+        command.upgrade(config, "head")
+
 
 def get_db():
     """Dependency that provides a database session."""
@@ -25,3 +186,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency that provides an asyncio database session (does not hold a threadpool thread)."""
+    async with AsyncSessionLocal() as db:
+        yield db
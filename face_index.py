@@ -0,0 +1,237 @@
+"""In-memory k-NN index over profile measurement vectors.
+
+All vectors live in one contiguous float32 (N x d) array, with parallel
+arrays of profile ids and region ids, so a query is a single vectorized
+distance computation plus ``argpartition``: a few milliseconds for hundreds
+of thousands of profiles. Rows are added in place (capacity doubles as
+needed) and removed by moving the last row into the hole.
+
+The measurements have different spreads (face length varies far more than lip
+length), so distances are standardized: each dimension is divided by its
+standard deviation over the indexed profiles, recomputed whenever the index
+changes through a load or sync.
+
+Each worker builds the index at startup and updates it after its own profile
+writes. Writes made by other workers are picked up before a query, at most
+every FACE_INDEX_SYNC_INTERVAL seconds, in the threadpool. Only the changes
+are read: profiles with a newer ``update_time`` (indexed) and deletion
+tombstones in ``user_profile_deletions``, written by a flush listener in the
+deleting transaction. Both timestamps are taken at flush, not at commit, so a
+transaction that commits after a sync has already moved past its timestamp
+would be missed; every sync therefore re-reads FACE_INDEX_SYNC_LOOKBACK
+seconds behind its watermarks (re-applying a change is harmless). Tombstones are kept for TOMBSTONE_RETENTION seconds; a
+worker that has not synced for that long reloads the whole index instead.
+"""
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal, dialect_insert
+from measurements import DIMENSIONS
+from models.user_profile import UserProfile, unix_timestamp
+from models.user_profile_deletion import UserProfileDeletion
+
+_INITIAL_CAPACITY = 1024
+TOMBSTONE_RETENTION = 24 * 3600
+
+
+class FaceIndex:
+    def __init__(self, dimensions: int = DIMENSIONS):
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        self._reset(_INITIAL_CAPACITY)
+        self._weights = np.ones(dimensions, dtype=np.float32)  # 1 / variance per dimension
+        self._watermark = 0  # highest update_time seen while syncing
+        self._deleted_watermark = 0  # highest tombstone deleted_at seen
+        self._synced_at = 0  # unix time of the last load or sync
+        self._checked_at = 0.0
+        self._sync_lock = threading.Lock()
+
+    def _reset(self, capacity: int) -> None:
+        self._vectors = np.empty((capacity, self.dimensions), dtype=np.float32)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._regions = np.empty(capacity, dtype=np.int64)
+        self._size = 0
+        self._positions: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _grow(self) -> None:
+        capacity = len(self._ids) * 2
+        self._vectors = np.resize(self._vectors, (capacity, self.dimensions))
+        self._ids = np.resize(self._ids, capacity)
+        self._regions = np.resize(self._regions, capacity)
+
+    def _put(self, profile_id: int, region_id: int, vector) -> None:
+        row = self._positions.get(profile_id)
+        if row is None:
+            if self._size == len(self._ids):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._positions[profile_id] = row
+            self._ids[row] = profile_id
+        self._regions[row] = region_id
+        self._vectors[row] = vector
+
+    def _drop(self, profile_id: int) -> None:
+        row = self._positions.pop(profile_id, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            moved = int(self._ids[last])
+            self._ids[row] = moved
+            self._regions[row] = self._regions[last]
+            self._vectors[row] = self._vectors[last]
+            self._positions[moved] = row
+        self._size = last
+
+    def _update_weights(self) -> None:
+        if self._size < 2:
+            self._weights = np.ones(self.dimensions, dtype=np.float32)
+            return
+        variance = self._vectors[:self._size].var(axis=0)
+        self._weights = np.divide(1, variance, out=np.ones_like(variance), where=variance > 0)
+
+    def upsert(self, profile_id: int, region_id: int, vector: list[float] | None) -> None:
+        """Add or replace a profile; a missing vector removes it."""
+        with self._lock:
+            if vector is None or len(vector) != self.dimensions:
+                self._drop(profile_id)
+            else:
+                self._put(profile_id, region_id, vector)
+
+    def remove(self, profile_id: int) -> None:
+        with self._lock:
+            self._drop(profile_id)
+
+    def search(
+        self,
+        vector: list[float],
+        k: int = 10,
+        region_id: int | None = None,
+        exclude_id: int | None = None,
+    ) -> list[tuple[int, int, float]]:
+        """The ``k`` nearest profiles as (profile_id, region_id, standardized euclidean distance), closest first."""
+        query = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            vectors = self._vectors[:self._size]
+            ids = self._ids[:self._size]
+            regions = self._regions[:self._size]
+            if region_id is not None:
+                mask = regions == region_id
+                vectors, ids, regions = vectors[mask], ids[mask], regions[mask]
+            diff = vectors - query
+            distances = np.einsum("ij,ij,j->i", diff, diff, self._weights)
+            if exclude_id is not None:
+                distances[ids == exclude_id] = np.inf
+            k = min(k, len(distances))
+            if k == 0:
+                return []
+            nearest = np.argpartition(distances, k - 1)[:k]
+            nearest = nearest[np.argsort(distances[nearest])]
+            return [
+                (int(ids[i]), int(regions[i]), float(np.sqrt(distances[i])))
+                for i in nearest
+                if np.isfinite(distances[i])
+            ]
+
+    def load(self, db: Session) -> int:
+        """(Re)build from the database; returns the number of indexed profiles."""
+        now = unix_timestamp()
+        rows = db.execute(
+            select(UserProfile.id, UserProfile.region_id, UserProfile.measurement_vector, UserProfile.update_time)
+            .where(UserProfile.measurement_vector.is_not(None))
+        ).all()
+        with self._lock:
+            self._reset(max(_INITIAL_CAPACITY, len(rows)))
+            watermark = 0
+            for profile_id, region_id, vector, update_time in rows:
+                if vector is not None and len(vector) == self.dimensions:
+                    self._put(profile_id, region_id, vector)
+                watermark = max(watermark, update_time or 0)
+            self._update_weights()
+            self._watermark = watermark
+            self._deleted_watermark = self._synced_at = now
+            self._checked_at = time.monotonic()
+            return self._size
+
+    def sync_due(self) -> bool:
+        return time.monotonic() - self._checked_at >= settings.FACE_INDEX_SYNC_INTERVAL
+
+    def sync(self, db: Session) -> None:
+        """Apply other workers' writes since the last sync (rate-limited; concurrent callers skip)."""
+        if not self.sync_due():
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = time.monotonic()
+            now = unix_timestamp()
+            if now - self._synced_at > TOMBSTONE_RETENTION:
+                # Tombstones this index has not seen may already be purged
+                self.load(db)
+                return
+            # Late commits carry older timestamps; upserts and drops are idempotent, so re-read a window
+            lookback = settings.FACE_INDEX_SYNC_LOOKBACK
+            changed = db.execute(
+                select(UserProfile.id, UserProfile.region_id, UserProfile.measurement_vector, UserProfile.update_time)
+                .where(UserProfile.update_time >= self._watermark - lookback)
+            ).all()
+            deleted = db.execute(
+                select(UserProfileDeletion.profile_id, UserProfileDeletion.deleted_at)
+                .where(UserProfileDeletion.deleted_at >= self._deleted_watermark - lookback)
+            ).all()
+            with self._lock:
+                # Deletions first: a reused id that shows up in ``changed`` was created after its deletion
+                for profile_id, deleted_at in deleted:
+                    self._drop(profile_id)
+                    self._deleted_watermark = max(self._deleted_watermark, deleted_at)
+                for profile_id, region_id, vector, update_time in changed:
+                    if vector is not None and len(vector) == self.dimensions:
+                        self._put(profile_id, region_id, vector)
+                    else:
+                        self._drop(profile_id)
+                    self._watermark = max(self._watermark, update_time or 0)
+                if changed or deleted:
+                    self._update_weights()
+                self._synced_at = now
+        finally:
+            self._sync_lock.release()
+
+
+face_index = FaceIndex()
+
+
+def build_face_index() -> int:
+    with SessionLocal() as db:
+        return face_index.load(db)
+
+
+def sync_face_index() -> None:
+    """Blocking; run in the threadpool, never on the event loop."""
+    with SessionLocal() as db:
+        face_index.sync(db)
+
+
+@event.listens_for(Session, "after_flush")
+def _record_profile_deletions(session: Session, flush_context) -> None:
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, UserProfile)]
+    if not deleted:
+        return
+    now = unix_timestamp()
+    conn = session.connection()
+    stmt = dialect_insert(session, UserProfileDeletion).values(
+        [{"profile_id": profile_id, "deleted_at": now} for profile_id in sorted(deleted)]
+    )
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=[UserProfileDeletion.profile_id], set_={"deleted_at": now},
+    ))
+    # Deletes are rare; trimming old tombstones here keeps the table small without a scheduled job
+    conn.execute(delete(UserProfileDeletion).where(UserProfileDeletion.deleted_at < now - TOMBSTONE_RETENTION))
@@ -0,0 +1,150 @@
+"""HTTP conditional caching (ETag / Last-Modified / Cache-Control) for read endpoints.
+
+Writes to the reference tables (VERSIONED_TABLES) bump a per-table counter in
+``table_versions``, so a response built from them can be validated with one
+tiny query instead of being rebuilt. Other tables are written far more often
+and by many transactions at once; a shared counter row would serialize those
+writers, so their responses build validators from the rows themselves. Handlers
+call ``check_conditional`` before building the response and return its 304
+response when the client's copy is still current.
+"""
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import dialect_insert
+from models.table_version import TableVersion
+
+CATALOG_CACHE_CONTROL = f"public, max-age={settings.CATALOG_CACHE_MAX_AGE}"
+# Per-record resources: may be stored, but must be revalidated (cheap 304) on every use
+RECORD_CACHE_CONTROL = "private, no-cache"
+# Small, rarely written lookup tables (see reference_cache.py)
+VERSIONED_TABLES = frozenset({"regions", "phenotypes", "face_features", "analysis_questions"})
+
+_PENDING_KEY = "http_cache_pending_versions"
+
+
+@dataclass(frozen=True)
+class Validators:
+    etag: str
+    last_modified: datetime | None = None  # UTC; naive (like TimestampMixin) or aware
+
+
+def bump_table_versions(db: Session, *table_names: str) -> None:
+    """Increment version counters when the transaction commits; call after Core statements that bypass the ORM flush hook."""
+    db.info.setdefault(_PENDING_KEY, set()).update(table_names)
+
+
+def _apply_pending_versions(db: Session) -> None:
+    names = db.info.pop(_PENDING_KEY, None)
+    if not names:
+        return
+    now = datetime.utcnow()
+    conn = db.connection()
+    # One sorted pass at commit: writers lock the counter rows in the same order and only until they commit
+    for name in sorted(names):
+        stmt = dialect_insert(db, TableVersion).values(table_name=name, version=1, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TableVersion.table_name],
+            set_={"version": TableVersion.version + 1, "updated_at": now},
+        )
+        conn.execute(stmt)
+
+
+def get_table_versions(db: Session, *table_names: str) -> dict[str, tuple[int, datetime | None]]:
+    rows = db.execute(
+        select(TableVersion.table_name, TableVersion.version, TableVersion.updated_at)
+        .where(TableVersion.table_name.in_(table_names))
+    ).all()
+    found = {r.table_name: (r.version, r.updated_at) for r in rows}
+    return {name: found.get(name, (0, None)) for name in table_names}
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    # Weak: the same representation may be sent with different Content-Encoding
+    return f'W/"{digest}"'
+
+
+def table_validators(db: Session, *table_names: str, extra=()) -> Validators:
+    """Validators for a response built only from the given tables (``extra`` = query params etc.)."""
+    versions = get_table_versions(db, *table_names)
+    modified = [ts for _, ts in versions.values() if ts is not None]
+    return Validators(
+        etag=make_etag(sorted(versions.items()), extra),
+        last_modified=max(modified) if modified else None,
+    )
+
+
+def _matches(request: Request, validators: Validators) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        opaque = validators.etag.removeprefix("W/")
+        return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and validators.last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = validators.last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return modified <= since
+    return False
+
+
+def check_conditional(
+    request: Request,
+    response: Response,
+    validators: Validators,
+    cache_control: str,
+) -> Response | None:
+    """
+    Put ETag/Last-Modified/Cache-Control on ``response``.
+    Returns a 304 response to send instead when the client's cached copy is current.
+    """
+    headers = {"ETag": validators.etag, "Cache-Control": cache_control}
+    if validators.last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            validators.last_modified.replace(tzinfo=timezone.utc), usegmt=True
+        )
+    if _matches(request, validators):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_flushed_tables(session: Session, flush_context) -> None:
+    tables = {
+        obj.__table__.name
+        for obj in (*session.new, *session.deleted)
+    } | {
+        obj.__table__.name
+        for obj in session.dirty
+        if session.is_modified(obj)
+    }
+    tables &= VERSIONED_TABLES
+    if tables:
+        bump_table_versions(session, *tables)
+
+
+@event.listens_for(Session, "before_commit")
+def _bump_on_commit(session: Session) -> None:
+    # before_commit runs ahead of the final flush; flush now so its tables are included
+    session.flush()
+    _apply_pending_versions(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_versions(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
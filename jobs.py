@@ -0,0 +1,227 @@
+"""
+Table-based queue of analysis jobs, shared by the API and the analyzer workers.
+
+The API stores the uploaded image in the blob store and inserts an
+``analysis_jobs`` row (``enqueue_job``, a write_queue job). Any number of
+``worker.py`` processes, on this host or others, claim jobs with one
+statement:
+
+    UPDATE analysis_jobs SET status = 'running', worker_id = ..., lease_expires_at = ...
+    WHERE id IN (SELECT id FROM analysis_jobs WHERE <claimable>
+                 ORDER BY id LIMIT n FOR UPDATE SKIP LOCKED)
+    RETURNING ...
+
+On PostgreSQL, SKIP LOCKED lets concurrent workers pass over rows that
+another worker is claiming instead of queueing behind it. SQLite has no row
+locks. The clause is dropped there, and the statement runs under SQLite's
+database write lock, so claims are serialized. That is enough for one host
+and a handful of worker processes.
+
+A claimed job carries a lease. The worker extends it every
+ANALYSIS_JOB_HEARTBEAT_INTERVAL. If the worker dies, the lease runs out and
+the job becomes claimable again. Every state change after the claim is
+conditional on the job still being ``running`` under the same ``worker_id``.
+A worker that lost its lease therefore cannot overwrite the outcome of the
+worker that took the job over. Exceptions are retried with exponential
+backoff up to ANALYSIS_JOB_MAX_ATTEMPTS. An analysis that reports an error of
+its own (no face, invalid image) fails at once.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import Row, and_, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from blob_store import release_blob, store_blob
+from config import settings
+from database import SessionLocal
+from models.analysis_job import AnalysisJob
+
+JOB_KINDS = ("landmarks", "phenotype")
+PURGE_BATCH_SIZE = 500
+
+
+class JobFailed(Exception):
+    """The analysis itself rejected the input; retrying would give the same answer."""
+
+
+def enqueue_job(db: Session, kind: str, params: dict | None, image: bytes, digest: str | None = None) -> str:
+    """Write job (see write_queue.run_write): queue an analysis of an image (staged under ``digest``, if given)."""
+    digest = store_blob(db, image, digest)
+    job = AnalysisJob(
+        job_id=AnalysisJob.generate_job_id(),
+        kind=kind,
+        params=params,
+        image_hash=digest,
+        max_attempts=settings.ANALYSIS_JOB_MAX_ATTEMPTS,
+    )
+    db.add(job)
+    db.flush()
+    return job.job_id
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(AnalysisJob.status == "queued", AnalysisJob.available_at <= now),
+        and_(
+            AnalysisJob.status == "running",
+            AnalysisJob.lease_expires_at < now,
+            AnalysisJob.attempts < AnalysisJob.max_attempts,
+        ),
+    )
+
+
+def _owned(job_id: int, worker_id: str):
+    return and_(AnalysisJob.id == job_id, AnalysisJob.worker_id == worker_id, AnalysisJob.status == "running")
+
+
+def queued_job_count(kinds: tuple[str, ...] = JOB_KINDS) -> int:
+    """Jobs that are due and waiting for a worker (drives ``auto`` quality, see analysis_quality.py)."""
+    with SessionLocal() as db:
+        return db.scalar(
+            select(func.count())
+            .select_from(AnalysisJob)
+            .where(AnalysisJob.status == "queued", AnalysisJob.available_at <= datetime.utcnow(), AnalysisJob.kind.in_(kinds))
+        )
+
+
+def claim_jobs(worker_id: str, kinds: tuple[str, ...] = JOB_KINDS, limit: int = 1) -> list[Row]:
+    """Lease up to ``limit`` due jobs to ``worker_id``; rows carry id, job_id, kind, params, image_hash, attempts, max_attempts."""
+    now = datetime.utcnow()
+    claimable = and_(_claimable(now), AnalysisJob.kind.in_(kinds))
+    candidates = (
+        select(AnalysisJob.id)
+        .where(claimable)
+        .order_by(AnalysisJob.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    with SessionLocal() as db:
+        # The outer condition is re-checked after PostgreSQL locks the row
+        jobs = db.execute(
+            update(AnalysisJob)
+            .where(AnalysisJob.id.in_(candidates), claimable)
+            .values(
+                status="running",
+                worker_id=worker_id,
+                attempts=AnalysisJob.attempts + 1,
+                lease_expires_at=now + timedelta(seconds=settings.ANALYSIS_JOB_LEASE_SECONDS),
+                heartbeat_at=now,
+                started_at=now,
+            )
+            .returning(
+                AnalysisJob.id, AnalysisJob.job_id, AnalysisJob.kind, AnalysisJob.params,
+                AnalysisJob.image_hash, AnalysisJob.attempts, AnalysisJob.max_attempts,
+            )
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.commit()
+    return jobs
+
+
+def extend_lease(job_id: int, worker_id: str) -> bool:
+    """Heartbeat: push the lease forward; False once the job is no longer this worker's."""
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        result = db.execute(
+            update(AnalysisJob)
+            .where(_owned(job_id, worker_id))
+            .values(heartbeat_at=now, lease_expires_at=now + timedelta(seconds=settings.ANALYSIS_JOB_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    return result.rowcount == 1
+
+
+def complete_job(job_id: int, worker_id: str, result: dict, image: bytes | None = None) -> bool:
+    """Store the result (and the annotated image); False if the lease was lost meanwhile."""
+    with SessionLocal() as db:
+        updated = db.execute(
+            update(AnalysisJob)
+            .where(_owned(job_id, worker_id))
+            .values(status="done", result=result, error=None, finished_at=datetime.utcnow(), lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        if updated.rowcount != 1:
+            db.rollback()
+            return False
+        if image:
+            db.execute(
+                update(AnalysisJob)
+                .where(AnalysisJob.id == job_id)
+                .values(result_image_hash=store_blob(db, image))
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    return True
+
+
+def fail_job(job: Row, worker_id: str, error: str, retry: bool) -> str | None:
+    """Requeue with backoff (``retry`` and attempts left) or fail; returns the new status, None if the lease was lost."""
+    now = datetime.utcnow()
+    if retry and job.attempts < job.max_attempts:
+        delay = settings.ANALYSIS_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+        values = {"status": "queued", "available_at": now + timedelta(seconds=delay), "worker_id": None}
+    else:
+        values = {"status": "failed", "finished_at": now}
+    with SessionLocal() as db:
+        result = db.execute(
+            update(AnalysisJob)
+            .where(_owned(job.id, worker_id))
+            .values(error=error[:2000], lease_expires_at=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    return values["status"] if result.rowcount == 1 else None
+
+
+def fail_abandoned_jobs() -> int:
+    """Fail running jobs whose lease expired on their last attempt (the worker died or hung every time)."""
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        result = db.execute(
+            update(AnalysisJob)
+            .where(
+                AnalysisJob.status == "running",
+                AnalysisJob.lease_expires_at < now,
+                AnalysisJob.attempts >= AnalysisJob.max_attempts,
+            )
+            .values(
+                status="failed",
+                error="Lease expired on the last attempt (worker crashed or hung)",
+                finished_at=now,
+                lease_expires_at=None,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    return result.rowcount
+
+
+def purge_finished_jobs(now: datetime | None = None) -> int:
+    """Delete jobs finished more than ANALYSIS_JOB_RETENTION_HOURS ago, releasing their images."""
+    now = now or datetime.utcnow()
+    finished_before = now - timedelta(hours=settings.ANALYSIS_JOB_RETENTION_HOURS)
+    purged = 0
+    while True:
+        with SessionLocal() as db:
+            ids = db.scalars(
+                select(AnalysisJob.id)
+                .where(AnalysisJob.status.in_(("done", "failed")), AnalysisJob.finished_at < finished_before)
+                .order_by(AnalysisJob.id)
+                .limit(PURGE_BATCH_SIZE)
+            ).all()
+            if not ids:
+                break
+            deleted = db.execute(
+                delete(AnalysisJob)
+                .where(AnalysisJob.id.in_(ids))
+                .returning(AnalysisJob.image_hash, AnalysisJob.result_image_hash)
+            ).all()
+            for image_hash, result_image_hash in deleted:
+                release_blob(db, image_hash)
+                release_blob(db, result_image_hash)
+            db.commit()
+            purged += len(deleted)
+        if len(ids) < PURGE_BATCH_SIZE:
+            break
+    return purged
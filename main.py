@@ -1,28 +1,65 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
+from compression import CompressionMiddleware
 from config import settings
-from database import engine, Base
-from models import Item, User, Region, Phenotype, FaceFeature, UserProfile, AnalysisSession, AnalysisQuestion  # noqa: F401 - register models
+from database import upgrade_database
+from face_index import build_face_index
+from memory import MemoryTrackingMiddleware, run_memory_watchdog
+from models import Item, User, Region, Phenotype, FaceFeature, UserProfile, UserProfileDeletion, AnalysisSession, AnalysisQuestion, AnalysisJob, Blob, TableVersion, RegionPhenotypeStat  # noqa: F401 - register models
 from models.user_profile_face_feature import user_profile_face_features  # noqa: F401 - register association table
-from routers import items, auth, analyzer, regions, phenotypes, face_features, user_profiles
+from passwords import shutdown_password_pool
+from profiling import RequestProfilerMiddleware
+from routers import items, auth, analyzer, regions, phenotypes, face_features, user_profiles, statistics, admin
+from session_retention import run_purge_loop
+from sql_profiler import SQLProfilerMiddleware
+from write_queue import stop_write_queue
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Create database tables on startup."""
-    Base.metadata.create_all(bind=engine)
+    """Migrate the database and build the face similarity index on startup; run the session purge and memory watchdog in the background."""
+    await run_in_threadpool(upgrade_database)
+    await run_in_threadpool(build_face_index)
+    purge_task = None
+    if settings.ANALYSIS_SESSION_PURGE_INTERVAL > 0:
+        purge_task = asyncio.create_task(run_purge_loop(settings.ANALYSIS_SESSION_PURGE_INTERVAL))
+    watchdog_task = None
+    if settings.MEMORY_RECYCLE_RSS_MB > 0:
+        watchdog_task = asyncio.create_task(
+            run_memory_watchdog(settings.MEMORY_RECYCLE_RSS_MB, settings.MEMORY_CHECK_INTERVAL)
+        )
     yield
-    # Cleanup if needed
+    for task in (purge_task, watchdog_task):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await stop_write_queue()
+    shutdown_password_pool()
 
 
 app = FastAPI(
     title=settings.APP_NAME,
     lifespan=lifespan,
+    # orjson: much faster than stdlib json, and serializes NumPy arrays natively
+    default_response_class=ORJSONResponse,
 )
 
+# Innermost, so a profiled request measures the endpoint and serialization, not compression
+app.add_middleware(RequestProfilerMiddleware)
+if settings.MEMORY_SAMPLE_RATE > 0:
+    app.add_middleware(
+        MemoryTrackingMiddleware,
+        sample_rate=settings.MEMORY_SAMPLE_RATE,
+        warn_peak_mb=settings.MEMORY_REQUEST_PEAK_WARN_MB,
+    )
+
 origins = [o.strip() for o in settings.CORS_ORIGINS.split(",") if o.strip()]
 app.add_middleware(
     CORSMiddleware,
@@ -30,7 +67,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified", "Link", "X-Next-Cursor", "X-SQL-Profile", "Server-Timing", "X-Profile-Id", "X-Analysis-Quality"],
+)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
 )
+if settings.SQL_PROFILING in ("header", "all"):
+    app.add_middleware(
+        SQLProfilerMiddleware,
+        mode=settings.SQL_PROFILING,
+        repeat_threshold=settings.SQL_PROFILE_REPEAT_THRESHOLD,
+    )
 
 app.include_router(auth.router, prefix="/api")
 app.include_router(items.router, prefix="/api")
@@ -39,6 +89,8 @@ app.include_router(regions.router, prefix="/api")
 app.include_router(phenotypes.router, prefix="/api")
 app.include_router(face_features.router, prefix="/api")
 app.include_router(user_profiles.router, prefix="/api")
+app.include_router(statistics.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
 
 
 @app.get("/")
@@ -0,0 +1,39 @@
+"""Face-mesh measurement vectors for similarity search (see face_index.py).
+
+``analyze_face_mesh`` reports distances between landmark pairs, already
+normalized by face length, as ``{"comment": ..., "value": ...}`` entries of a
+``measurements`` list. A profile's vector is those values in the fixed order
+of MEASUREMENT_KEYS (the order of analyzer.phenotype.CONNECTIONS_BASE, kept
+here so that this module does not import MediaPipe).
+"""
+
+MEASUREMENT_KEYS = (
+    "Длина лица",
+    "Ширина лица",
+    "Ширина носа",
+    "Длина носа",
+    "Длина губ",
+    "Ширина челюсти",
+)
+DIMENSIONS = len(MEASUREMENT_KEYS)
+
+
+def measurement_vector(analysis) -> list[float] | None:
+    """Vector from a ``phenotype_analyze`` blob (``measurements`` at the top level or one level down)."""
+    if not isinstance(analysis, dict):
+        return None
+    scopes = [analysis] + [v for v in analysis.values() if isinstance(v, dict)]
+    for scope in scopes:
+        entries = scope.get("measurements")
+        if not isinstance(entries, list):
+            continue
+        values = {
+            e.get("comment"): e.get("value")
+            for e in entries
+            if isinstance(e, dict)
+        }
+        try:
+            return [float(values[key]) for key in MEASUREMENT_KEYS]
+        except (KeyError, TypeError, ValueError):
+            return None
+    return None
@@ -0,0 +1,287 @@
+"""
+Memory accounting, leak hunting and RSS-based worker recycling.
+
+- ``MemoryTrackingMiddleware`` measures a random MEMORY_SAMPLE_RATE fraction of
+  requests (off by default). For each one it records the peak of Python
+  allocations while the request ran (tracemalloc, switched on only for that
+  request) and the change in RSS. Numbers are aggregated per route for
+  GET /api/admin/memory. tracemalloc is process-wide and slows every
+  allocation, so a request is only sampled when no other request is in flight
+  in the worker. Requests that arrive while it runs still pay the overhead and
+  count towards its peak. Peaks above MEMORY_REQUEST_PEAK_WARN_MB are logged.
+- ``start_tracing`` / ``snapshot_diff`` / ``stop_tracing`` back the admin
+  tracemalloc endpoints. Start, let traffic run, then diff against the baseline
+  to see which lines keep allocations alive.
+- ``run_memory_watchdog`` checks RSS every MEMORY_CHECK_INTERVAL seconds. Above
+  MEMORY_RECYCLE_RSS_MB it first runs gc and hands freed heap back to the OS
+  (glibc ``malloc_trim``). If RSS is still too high, it sends itself SIGTERM.
+  Uvicorn then finishes in-flight requests and exits, and the process manager
+  (uvicorn/gunicorn workers, systemd, Docker restart policy) starts a fresh
+  worker.
+
+All numbers are per worker process.
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+import random
+import signal
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# Admin endpoints (tracemalloc control, reports) are never sampled themselves
+ADMIN_PATH_PREFIX = "/api/admin/"
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> int | None:
+    """Resident set size of this process in bytes (Linux; None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def memory_breakdown(pid: int | str = "self") -> dict[str, int] | None:
+    """
+    RSS split into proportional (PSS), shared and private bytes from /proc/<pid>/smaps_rollup
+    (Linux 4.14+; None elsewhere). PSS divides each shared page between the processes mapping
+    it, so summing PSS over the workers gives their real combined footprint.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                parts = value.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[name] = int(parts[0]) * 1024
+    except (OSError, ValueError):
+        return None
+    if "Rss" not in fields:
+        return None
+    return {
+        "rss": fields["Rss"],
+        "pss": fields.get("Pss", 0),
+        "shared": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _load_malloc_trim():
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return None
+    try:
+        return getattr(ctypes.CDLL(libc_name), "malloc_trim", None)
+    except OSError:
+        return None
+
+
+_malloc_trim = _load_malloc_trim()
+
+
+def release_memory() -> None:
+    """Collect garbage and return free heap pages to the OS where the allocator supports it."""
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+# --- per-request sampling --------------------------------------------------------------------
+
+@dataclass
+class RouteMemoryStats:
+    samples: int = 0
+    peak_total: int = 0
+    peak_max: int = 0
+    rss_delta_total: int = 0
+    rss_delta_max: int = 0
+
+    def add(self, peak: int, rss_delta: int) -> None:
+        self.samples += 1
+        self.peak_total += peak
+        self.peak_max = max(self.peak_max, peak)
+        self.rss_delta_total += rss_delta
+        self.rss_delta_max = max(self.rss_delta_max, rss_delta)
+
+    def as_dict(self) -> dict:
+        return {
+            "samples": self.samples,
+            "alloc_peak_avg_mb": round(self.peak_total / self.samples / MB, 2),
+            "alloc_peak_max_mb": round(self.peak_max / MB, 2),
+            "rss_delta_avg_mb": round(self.rss_delta_total / self.samples / MB, 2),
+            "rss_delta_max_mb": round(self.rss_delta_max / MB, 2),
+        }
+
+
+route_memory: dict[str, RouteMemoryStats] = {}
+_route_memory_lock = threading.Lock()
+# One request traced at a time; an admin tracing session (start_tracing) takes precedence
+_request_tracing = threading.Lock()
+_admin_baseline: tracemalloc.Snapshot | None = None
+
+
+class MemoryTrackingMiddleware:
+    def __init__(self, app: ASGIApp, sample_rate: float = 0.0, warn_peak_mb: float = 200.0) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        self.warn_peak = warn_peak_mb * MB
+        self.in_flight = 0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            if (
+                self.in_flight > 1  # tracing would slow down the requests already running
+                or random.random() >= self.sample_rate
+                or scope["path"].startswith(ADMIN_PATH_PREFIX)
+                or tracemalloc.is_tracing()  # an admin session (or PYTHONTRACEMALLOC) owns it
+                or not _request_tracing.acquire(blocking=False)
+            ):
+                await self.app(scope, receive, send)
+                return
+            await self._traced(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    async def _traced(self, scope: Scope, receive: Receive, send: Send) -> None:
+        rss_before = current_rss() or 0
+        tracemalloc.start(1)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            _request_tracing.release()
+            rss_delta = (current_rss() or 0) - rss_before
+            self._record(scope, peak, rss_delta)
+
+    def _record(self, scope: Scope, peak: int, rss_delta: int) -> None:
+        route = scope.get("route")
+        key = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+        with _route_memory_lock:
+            route_memory.setdefault(key, RouteMemoryStats()).add(peak, rss_delta)
+        if peak > self.warn_peak:
+            logger.warning("%s allocated a peak of %.0f MB (RSS %+.0f MB)", key, peak / MB, rss_delta / MB)
+
+
+# --- tracemalloc snapshots for admins -------------------------------------------------------
+
+def start_tracing(frames: int = 10) -> None:
+    """Start tracemalloc and take the baseline snapshot later diffs compare against."""
+    global _admin_baseline
+    # Wait for a sampled request to finish rather than stopping its trace under it
+    if not _request_tracing.acquire(timeout=10):
+        raise RuntimeError("A sampled request is still being traced; try again")
+    try:
+        if tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is already running; stop it first")
+        tracemalloc.start(frames)
+        _admin_baseline = _take_snapshot()
+    finally:
+        _request_tracing.release()
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+
+
+def snapshot_diff(limit: int = 30, group_by: str = "lineno", rebase: bool = False) -> dict:
+    """Top allocation changes since the baseline (or the previous diff when ``rebase``)."""
+    global _admin_baseline
+    if _admin_baseline is None:
+        raise RuntimeError("tracemalloc is not running; start it first")
+    snapshot = _take_snapshot()
+    stats = snapshot.compare_to(_admin_baseline, group_by)
+    current, peak = tracemalloc.get_traced_memory()
+    if rebase:
+        _admin_baseline = snapshot
+    return {
+        "traced_current_mb": round(current / MB, 2),
+        "traced_peak_mb": round(peak / MB, 2),
+        "rss_mb": round((current_rss() or 0) / MB, 1),
+        "top": [
+            {
+                "where": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "size_kb": round(stat.size / 1024, 1),
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+            for stat in stats[:limit]
+        ],
+    }
+
+
+def stop_tracing() -> None:
+    global _admin_baseline
+    if _admin_baseline is not None:
+        _admin_baseline = None
+        tracemalloc.stop()
+
+
+def memory_report() -> dict:
+    rss = current_rss()
+    breakdown = memory_breakdown() or {}
+    with _route_memory_lock:
+        routes = {key: stats.as_dict() for key, stats in sorted(route_memory.items())}
+    return {
+        "pid": os.getpid(),
+        "rss_mb": round(rss / MB, 1) if rss is not None else None,
+        # Shared pages include model weights preloaded by serve.py before forking
+        **{f"{key}_mb": round(breakdown[key] / MB, 1) for key in ("pss", "shared", "private") if key in breakdown},
+        "recycle_rss_mb": settings.MEMORY_RECYCLE_RSS_MB or None,
+        "gc_counts": gc.get_count(),
+        "gc_objects": len(gc.get_objects()),
+        "tracemalloc_session": _admin_baseline is not None,
+        "sample_rate": settings.MEMORY_SAMPLE_RATE,
+        "routes": routes,
+    }
+
+
+# --- recycling ------------------------------------------------------------------------------
+
+async def run_memory_watchdog(limit_mb: int, interval: float) -> None:
+    """Recycle this worker (SIGTERM to itself) once RSS stays above ``limit_mb`` after a cleanup."""
+    limit = limit_mb * MB
+    while True:
+        await asyncio.sleep(interval)
+        rss = current_rss()
+        if rss is None:
+            logger.warning("RSS is not available on this platform; memory watchdog stopped")
+            return
+        if rss <= limit:
+            continue
+        started = time.perf_counter()
+        await asyncio.to_thread(release_memory)
+        after = current_rss() or rss
+        logger.warning(
+            "Worker %d RSS %.0f MB over limit %d MB; gc + malloc_trim -> %.0f MB in %.0f ms",
+            os.getpid(), rss / MB, limit_mb, after / MB, (time.perf_counter() - started) * 1000,
+        )
+        if after > limit:
+            logger.warning("Recycling worker %d (RSS %.0f MB)", os.getpid(), after / MB)
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
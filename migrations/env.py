@@ -0,0 +1,61 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from config import settings
+from database import Base
+import models  # noqa: F401 - register models
+
+config = context.config
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+
+# Called from the app (database.upgrade_database) the connection is passed in and logging is already set up
+connection = config.attributes.get("connection")
+if config.config_file_name is not None and connection is None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+# SQLite cannot ALTER most things in place; batch mode recreates tables instead.
+render_as_batch = settings.DATABASE_URL.startswith("sqlite")
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=settings.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=render_as_batch,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=render_as_batch,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    if connection is not None:
+        _run_migrations(connection)
+        return
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+    with connectable.connect() as own_connection:
+        _run_migrations(own_connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,112 @@
+"""Initial schema (tables as created by Base.metadata.create_all before migrations existed).
+
+Databases created by an older version of the app already have these tables;
+the app stamps them 0001 on startup (database.upgrade_database). When running
+Alembic by hand, mark them with ``alembic stamp 0001`` before ``alembic upgrade head``.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _timestamps() -> list[sa.Column]:
+    return [
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "items",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("title", sa.String(255), nullable=False),
+        sa.Column("description", sa.String(500), nullable=True),
+        *_timestamps(),
+    )
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("username", sa.String(100), nullable=False),
+        sa.Column("name", sa.String(255), nullable=True),
+        sa.Column("hashed_password", sa.String(255), nullable=False),
+        sa.Column("role", sa.String(50), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        *_timestamps(),
+    )
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    for table in ("regions", "phenotypes", "face_features"):
+        op.create_table(
+            table,
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("view_name", sa.String(255), nullable=False),
+            sa.Column("name", sa.String(255), nullable=False),
+            *_timestamps(),
+        )
+    op.create_table(
+        "user_profiles",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("region_id", sa.Integer(), sa.ForeignKey("regions.id"), nullable=False),
+        sa.Column("phenotype_analyze", sa.JSON(), nullable=True),
+        sa.Column("original_image", sa.LargeBinary(), nullable=True),
+        sa.Column("analyzed_image", sa.LargeBinary(), nullable=True),
+        sa.Column("create_time", sa.Integer(), nullable=False),
+        sa.Column("update_time", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "user_profile_face_features",
+        sa.Column(
+            "user_profile_id",
+            sa.Integer(),
+            sa.ForeignKey("user_profiles.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+        sa.Column(
+            "face_feature_id",
+            sa.Integer(),
+            sa.ForeignKey("face_features.id", ondelete="CASCADE"),
+            primary_key=True,
+        ),
+    )
+    op.create_table(
+        "analysis_sessions",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("session_id", sa.String(36), nullable=False),
+        sa.Column("original_image", sa.LargeBinary(), nullable=True),
+        sa.Column("result", sa.JSON(), nullable=True),
+    )
+    op.create_index("ix_analysis_sessions_session_id", "analysis_sessions", ["session_id"], unique=True)
+    op.create_table(
+        "analysis_questions",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("label", sa.String(500), nullable=False),
+        sa.Column("type", sa.String(20), nullable=False),
+        sa.Column("options", sa.JSON(), nullable=True),
+        *_timestamps(),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("analysis_questions")
+    op.drop_index("ix_analysis_sessions_session_id", table_name="analysis_sessions")
+    op.drop_table("analysis_sessions")
+    op.drop_table("user_profile_face_features")
+    op.drop_table("user_profiles")
+    for table in ("face_features", "phenotypes", "regions"):
+        op.drop_table(table)
+    op.drop_index("ix_users_username", table_name="users")
+    op.drop_index("ix_users_email", table_name="users")
+    op.drop_table("users")
+    op.drop_table("items")
@@ -0,0 +1,151 @@
+"""Move image blobs out of the database into the content-addressed blob store.
+
+Adds the ``blobs`` refcount table and ``*_image_hash`` columns, copies every
+existing image to BLOB_STORE_PATH in batches of BATCH_SIZE rows (so only one
+batch of images is held in memory at a time), then drops the LargeBinary
+columns.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from blob_store import blob_store
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 100
+
+# (table, [(blob column, hash column), ...])
+IMAGE_COLUMNS = [
+    ("user_profiles", [("original_image", "original_image_hash"), ("analyzed_image", "analyzed_image_hash")]),
+    ("analysis_sessions", [("original_image", "original_image_hash")]),
+]
+
+blobs = sa.table(
+    "blobs",
+    sa.column("sha256", sa.String),
+    sa.column("size", sa.Integer),
+    sa.column("refcount", sa.Integer),
+    sa.column("created_at", sa.DateTime),
+    sa.column("updated_at", sa.DateTime),
+)
+
+
+def _retain(bind, digest: str, size: int) -> None:
+    result = bind.execute(
+        blobs.update().where(blobs.c.sha256 == digest).values(refcount=blobs.c.refcount + 1)
+    )
+    if result.rowcount == 0:
+        now = datetime.utcnow()
+        bind.execute(
+            blobs.insert().values(sha256=digest, size=size, refcount=1, created_at=now, updated_at=now)
+        )
+
+
+def _move_to_store(bind, table_name: str, columns: list[tuple[str, str]]) -> None:
+    table = sa.table(
+        table_name,
+        sa.column("id", sa.Integer),
+        *[sa.column(blob_col, sa.LargeBinary) for blob_col, _ in columns],
+        *[sa.column(hash_col, sa.String) for _, hash_col in columns],
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, *[table.c[blob_col] for blob_col, _ in columns])
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            values = {}
+            for blob_col, hash_col in columns:
+                data = row._mapping[blob_col]
+                if data:
+                    digest = blob_store.write(data)
+                    _retain(bind, digest, len(data))
+                    values[hash_col] = digest
+            if values:
+                bind.execute(table.update().where(table.c.id == row.id).values(**values))
+        last_id = rows[-1].id
+
+
+def _move_to_database(bind, table_name: str, columns: list[tuple[str, str]]) -> None:
+    table = sa.table(
+        table_name,
+        sa.column("id", sa.Integer),
+        *[sa.column(blob_col, sa.LargeBinary) for blob_col, _ in columns],
+        *[sa.column(hash_col, sa.String) for _, hash_col in columns],
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, *[table.c[hash_col] for _, hash_col in columns])
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            values = {
+                blob_col: blob_store.read(row._mapping[hash_col])
+                for blob_col, hash_col in columns
+                if row._mapping[hash_col]
+            }
+            if values:
+                bind.execute(table.update().where(table.c.id == row.id).values(**values))
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blobs",
+        sa.Column("sha256", sa.String(64), primary_key=True),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("refcount", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    for table_name, columns in IMAGE_COLUMNS:
+        with op.batch_alter_table(table_name) as batch:
+            for _, hash_col in columns:
+                batch.add_column(sa.Column(hash_col, sa.String(64), nullable=True))
+
+    bind = op.get_bind()
+    for table_name, columns in IMAGE_COLUMNS:
+        _move_to_store(bind, table_name, columns)
+
+    for table_name, columns in IMAGE_COLUMNS:
+        with op.batch_alter_table(table_name) as batch:
+            for blob_col, _ in columns:
+                batch.drop_column(blob_col)
+
+
+def downgrade() -> None:
+    # Files are left in the blob store; remove BLOB_STORE_PATH manually if no longer needed.
+    for table_name, columns in IMAGE_COLUMNS:
+        with op.batch_alter_table(table_name) as batch:
+            for blob_col, _ in columns:
+                batch.add_column(sa.Column(blob_col, sa.LargeBinary(), nullable=True))
+
+    bind = op.get_bind()
+    for table_name, columns in IMAGE_COLUMNS:
+        _move_to_database(bind, table_name, columns)
+
+    for table_name, columns in IMAGE_COLUMNS:
+        with op.batch_alter_table(table_name) as batch:
+            for _, hash_col in columns:
+                batch.drop_column(hash_col)
+    op.drop_table("blobs")
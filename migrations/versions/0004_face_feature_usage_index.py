@@ -0,0 +1,26 @@
+"""Index user_profile_face_features by face_feature_id.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_user_profile_face_features_face_feature_id",
+        "user_profile_face_features",
+        ["face_feature_id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_profile_face_features_face_feature_id", table_name="user_profile_face_features")
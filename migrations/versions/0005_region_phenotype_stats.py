@@ -0,0 +1,37 @@
+"""Per-region phenotype / face type / nose type counters.
+
+Creates ``region_phenotype_stats`` and fills it from the existing profiles
+(see phenotype_stats.rebuild); from then on it is maintained on every
+profile write.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from phenotype_stats import rebuild
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "region_phenotype_stats",
+        sa.Column("region_id", sa.Integer(), sa.ForeignKey("regions.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("dimension", sa.String(32), primary_key=True),
+        sa.Column("value", sa.String(255), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False),
+    )
+    rebuild(Session(bind=op.get_bind()))
+
+
+def downgrade() -> None:
+    op.drop_table("region_phenotype_stats")
@@ -0,0 +1,54 @@
+"""Creation / completion timestamps on analysis sessions for the retention purge.
+
+Existing sessions get the migration time as ``created_at`` (and as
+``completed_at`` when they have a result), so they age out one full retention
+period after the upgrade rather than all at once.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+analysis_sessions = sa.table(
+    "analysis_sessions",
+    sa.column("result", sa.JSON),
+    sa.column("created_at", sa.DateTime),
+    sa.column("completed_at", sa.DateTime),
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("analysis_sessions") as batch:
+        batch.add_column(sa.Column("created_at", sa.DateTime(), nullable=True))
+        batch.add_column(sa.Column("completed_at", sa.DateTime(), nullable=True))
+
+    now = datetime.utcnow()
+    op.execute(analysis_sessions.update().values(created_at=now))
+    op.execute(
+        analysis_sessions.update()
+        .where(analysis_sessions.c.result.is_not(None))
+        .values(completed_at=now)
+    )
+
+    with op.batch_alter_table("analysis_sessions") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+        batch.create_index("ix_analysis_sessions_created_at", ["created_at"])
+        batch.create_index("ix_analysis_sessions_completed_at", ["completed_at"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("analysis_sessions") as batch:
+        batch.drop_index("ix_analysis_sessions_completed_at")
+        batch.drop_index("ix_analysis_sessions_created_at")
+        batch.drop_column("completed_at")
+        batch.drop_column("created_at")
@@ -0,0 +1,64 @@
+"""Face-mesh measurement vector per profile, for similarity search.
+
+Adds ``user_profiles.measurement_vector`` and fills it from the existing
+``phenotype_analyze`` blobs in batches of BATCH_SIZE rows.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from measurements import measurement_vector
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+user_profiles = sa.table(
+    "user_profiles",
+    sa.column("id", sa.Integer),
+    sa.column("phenotype_analyze", sa.JSON),
+    sa.column("measurement_vector", sa.JSON),
+)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("user_profiles") as batch:
+        batch.add_column(sa.Column("measurement_vector", sa.JSON(), nullable=True))
+
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(user_profiles.c.id, user_profiles.c.phenotype_analyze)
+            .where(user_profiles.c.id > last_id)
+            .order_by(user_profiles.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            vector = measurement_vector(row.phenotype_analyze)
+            if vector is not None:
+                updates.append({"row_id": row.id, "vector": vector})
+        if updates:
+            conn.execute(
+                user_profiles.update()
+                .where(user_profiles.c.id == sa.bindparam("row_id"))
+                .values(measurement_vector=sa.bindparam("vector")),
+                updates,
+            )
+        last_id = rows[-1].id
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("user_profiles") as batch:
+        batch.drop_column("measurement_vector")
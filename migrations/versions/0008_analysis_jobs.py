@@ -0,0 +1,47 @@
+"""Queue table for analysis jobs run by standalone workers (worker.py).
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "analysis_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("job_id", sa.String(36), nullable=False),
+        sa.Column("kind", sa.String(20), nullable=False),
+        sa.Column("params", sa.JSON(), nullable=True),
+        sa.Column("image_hash", sa.String(64), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.Column("worker_id", sa.String(100), nullable=True),
+        sa.Column("lease_expires_at", sa.DateTime(), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(), nullable=True),
+        sa.Column("result", sa.JSON(), nullable=True),
+        sa.Column("result_image_hash", sa.String(64), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_analysis_jobs_job_id", "analysis_jobs", ["job_id"], unique=True)
+    op.create_index("ix_analysis_jobs_finished_at", "analysis_jobs", ["finished_at"])
+    op.create_index("ix_analysis_jobs_status_available_at", "analysis_jobs", ["status", "available_at"])
+    op.create_index("ix_analysis_jobs_status_lease_expires_at", "analysis_jobs", ["status", "lease_expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("analysis_jobs")
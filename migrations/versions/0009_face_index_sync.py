@@ -0,0 +1,31 @@
+"""Incremental face index sync: profile deletion tombstones and an update_time index.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_profile_deletions",
+        sa.Column("profile_id", sa.Integer(), primary_key=True),
+        sa.Column("deleted_at", sa.Integer(), nullable=False),
+    )
+    op.create_index("ix_user_profile_deletions_deleted_at", "user_profile_deletions", ["deleted_at"])
+    op.create_index("ix_user_profiles_update_time", "user_profiles", ["update_time"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_user_profiles_update_time", table_name="user_profiles")
+    op.drop_index("ix_user_profile_deletions_deleted_at", table_name="user_profile_deletions")
+    op.drop_table("user_profile_deletions")
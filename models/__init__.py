@@ -4,8 +4,13 @@ from models.region import Region
 from models.phenotype import Phenotype
 from models.face_feature import FaceFeature
 from models.user_profile import UserProfile
+from models.user_profile_deletion import UserProfileDeletion
 from models.user_profile_face_feature import user_profile_face_features  # noqa: F401 - register table
 from models.analysis_session import AnalysisSession
 from models.analysis_question import AnalysisQuestion
+from models.analysis_job import AnalysisJob
+from models.blob import Blob
+from models.table_version import TableVersion
+from models.region_phenotype_stat import RegionPhenotypeStat
 
-__all__ = ["Item", "User", "Region", "Phenotype", "FaceFeature", "UserProfile", "AnalysisSession", "AnalysisQuestion"]
+__all__ = ["Item", "User", "Region", "Phenotype", "FaceFeature", "UserProfile", "UserProfileDeletion", "AnalysisSession", "AnalysisQuestion", "AnalysisJob", "Blob", "TableVersion", "RegionPhenotypeStat"]
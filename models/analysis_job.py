@@ -0,0 +1,42 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import JSON, Index, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from models.base import Base
+
+
+class AnalysisJob(Base):
+    """Queued image analysis run by a standalone worker (see jobs.py and worker.py)."""
+
+    __tablename__ = "analysis_jobs"
+    # Claim query: queued jobs that are due, running jobs whose lease ran out
+    __table_args__ = (
+        Index("ix_analysis_jobs_status_available_at", "status", "available_at"),
+        Index("ix_analysis_jobs_status_lease_expires_at", "status", "lease_expires_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    job_id: Mapped[str] = mapped_column(String(36), unique=True, nullable=False, index=True)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)  # "landmarks" | "phenotype"
+    params: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    image_hash: Mapped[str] = mapped_column(String(64), nullable=False)  # blob store digest
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="queued")  # queued | running | done | failed
+    attempts: Mapped[int] = mapped_column(default=0, nullable=False)
+    max_attempts: Mapped[int] = mapped_column(nullable=False)
+    available_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)  # retry backoff
+    # Lease: the worker holding a running job extends it with heartbeats; an expired lease is claimable again
+    worker_id: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    lease_expires_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    result: Mapped[dict | list | None] = mapped_column(JSON, nullable=True)
+    result_image_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)  # annotated image
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, nullable=False)
+    started_at: Mapped[datetime | None] = mapped_column(nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(nullable=True, index=True)
+
+    @staticmethod
+    def generate_job_id() -> str:
+        return str(uuid.uuid4())
@@ -1,6 +1,7 @@
 import uuid
+from datetime import datetime
 
-from sqlalchemy import JSON, LargeBinary, String
+from sqlalchemy import JSON, String
 from sqlalchemy.orm import Mapped, mapped_column
 
 from models.base import Base
@@ -13,8 +14,11 @@ class AnalysisSession(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     session_id: Mapped[str] = mapped_column(String(36), unique=True, nullable=False, index=True)
-    original_image: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    original_image_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)  # blob store digest
     result: Mapped[dict | list | None] = mapped_column(JSON, nullable=True)
+    # Retention (session_retention.py): completed and abandoned sessions expire separately
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, index=True)
+    completed_at: Mapped[datetime | None] = mapped_column(nullable=True, index=True)
 
     @staticmethod
     def generate_session_id() -> str:
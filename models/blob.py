@@ -0,0 +1,14 @@
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from models.base import Base, TimestampMixin
+
+
+class Blob(Base, TimestampMixin):
+    """Reference-counted entry for an image stored in the blob store (see blob_store.py)."""
+
+    __tablename__ = "blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    refcount: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -12,9 +12,12 @@ class FaceFeature(Base, TimestampMixin):
     view_name: Mapped[str] = mapped_column(String(255), nullable=False)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
 
+    # Never loaded implicitly: a popular feature links to a large share of all profiles.
+    # Use GET /face-features/{id}/profiles (paginated) or /face-features/usage instead.
     user_profiles: Mapped[list["UserProfile"]] = relationship(
         "UserProfile",
         secondary=user_profile_face_features,
         back_populates="face_features",
-        lazy="selectin",
+        lazy="raise",
+        passive_deletes=True,
     )
@@ -0,0 +1,15 @@
+from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from models.base import Base
+
+
+class RegionPhenotypeStat(Base):
+    """Number of profiles in a region per category value, maintained by phenotype_stats.py."""
+
+    __tablename__ = "region_phenotype_stats"
+
+    region_id: Mapped[int] = mapped_column(ForeignKey("regions.id", ondelete="CASCADE"), primary_key=True)
+    dimension: Mapped[str] = mapped_column(String(32), primary_key=True)  # "profiles" | "phenotype" | "face_type" | "nose_type"
+    value: Mapped[str] = mapped_column(String(255), primary_key=True)  # "" for dimension "profiles"
+    count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
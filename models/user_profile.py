@@ -1,8 +1,9 @@
 import time
 
-from sqlalchemy import ForeignKey, Integer, LargeBinary, JSON
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import ForeignKey, Integer, JSON, String
+from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
 
+from measurements import measurement_vector
 from models.base import Base
 from models.user_profile_face_feature import user_profile_face_features
 
@@ -17,10 +18,14 @@ class UserProfile(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     region_id: Mapped[int] = mapped_column(ForeignKey("regions.id"), nullable=False)
     phenotype_analyze: Mapped[dict | list | None] = mapped_column(JSON, nullable=True)
-    original_image: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
-    analyzed_image: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    # SHA-256 digests of images kept in the blob store (see blob_store.py)
+    original_image_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    analyzed_image_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Derived from phenotype_analyze on assignment; indexed in memory by face_index.py
+    measurement_vector: Mapped[list[float] | None] = mapped_column(JSON, nullable=True)
     create_time: Mapped[int] = mapped_column(Integer, default=unix_timestamp)
-    update_time: Mapped[int] = mapped_column(Integer, default=unix_timestamp, onupdate=unix_timestamp)
+    # Indexed: face_index.py syncs from it
+    update_time: Mapped[int] = mapped_column(Integer, default=unix_timestamp, onupdate=unix_timestamp, index=True)
 
     face_features: Mapped[list["FaceFeature"]] = relationship(
         "FaceFeature",
@@ -28,3 +33,8 @@ class UserProfile(Base):
         back_populates="user_profiles",
         lazy="selectin",
     )
+
+    @validates("phenotype_analyze")
+    def _derive_measurement_vector(self, key, value):
+        self.measurement_vector = measurement_vector(value)
+        return value
@@ -0,0 +1,13 @@
+from sqlalchemy import Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from models.base import Base
+
+
+class UserProfileDeletion(Base):
+    """Tombstone of a deleted profile, so other workers' face indexes can drop it (see face_index.py)."""
+
+    __tablename__ = "user_profile_deletions"
+
+    profile_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    deleted_at: Mapped[int] = mapped_column(Integer, nullable=False, index=True)  # unix time, like update_time
@@ -1,5 +1,5 @@
 """Association table for UserProfile <-> FaceFeature many-to-many relationship."""
-from sqlalchemy import Table, Column, ForeignKey
+from sqlalchemy import Table, Column, ForeignKey, Index
 
 from database import Base
 
@@ -8,4 +8,6 @@ user_profile_face_features = Table(
     Base.metadata,
     Column("user_profile_id", ForeignKey("user_profiles.id", ondelete="CASCADE"), primary_key=True),
     Column("face_feature_id", ForeignKey("face_features.id", ondelete="CASCADE"), primary_key=True),
+    # The primary key leads with user_profile_id; lookups and counts per feature need their own index
+    Index("ix_user_profile_face_features_face_feature_id", "face_feature_id"),
 )
@@ -0,0 +1,58 @@
+"""Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered by primary key. A client passes the opaque ``cursor`` from
+the previous page's ``X-Next-Cursor`` header (also sent as a ``Link: rel=next``
+URL) and the next page is read with ``WHERE id > :last_id``, an index range
+scan whose cost does not depend on how deep the page is. ``skip`` (OFFSET)
+keeps working for existing clients.
+"""
+import base64
+import bisect
+import json
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import Select
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+
+def paginate(stmt: Select, id_column, *, skip: int, limit: int, cursor: str | None) -> Select:
+    """Apply a stable order plus keyset (``cursor``) or offset (``skip``) paging; cursor wins."""
+    stmt = stmt.order_by(id_column).limit(limit)
+    if cursor is not None:
+        return stmt.where(id_column > decode_cursor(cursor))
+    return stmt.offset(skip)
+
+
+def paginate_list(items: list, *, skip: int, limit: int, cursor: str | None) -> list:
+    """``paginate`` for an in-memory list already sorted by ``id``."""
+    if cursor is not None:
+        start = bisect.bisect_right(items, decode_cursor(cursor), key=lambda item: item.id)
+        return items[start:start + limit]
+    return items[skip:skip + limit]
+
+
+def set_next_cursor(request: Request, response: Response, rows: list, limit: int) -> None:
+    """Advertise the next page when this one is full."""
+    if not rows or len(rows) < limit:
+        return
+    token = encode_cursor(rows[-1].id)
+    next_url = request.url.remove_query_params("skip").include_query_params(cursor=token)
+    response.headers[NEXT_CURSOR_HEADER] = token
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
@@ -0,0 +1,97 @@
+"""
+Password hashing in a dedicated process pool.
+
+bcrypt is deliberately slow (~0.25 s at 12 rounds) and holds the GIL while it
+runs, so hashing on the shared threadpool lets a burst of logins starve every
+other sync endpoint and the event loop. Here it runs in PASSWORD_HASH_WORKERS
+separate processes instead. At most PASSWORD_HASH_QUEUE_LIMIT further calls
+may wait for a worker; beyond that callers get 503 instead of an
+ever-growing backlog. A pool whose worker died is replaced; the calls it
+breaks get 503 as well.
+
+The work factor is BCRYPT_ROUNDS. Hashes made with a different factor still
+verify, and ``verify_password`` returns a replacement hash so that login can
+upgrade them transparently.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from config import settings
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    # Hashes outside [BCRYPT_ROUNDS, BCRYPT_ROUNDS] are reported by needs_update / verify_and_update
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+_pool: ProcessPoolExecutor | None = None
+_in_flight = 0
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(password, hashed)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that runs an event loop and DB pools is not safe
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def _submit(fn, *args):
+    global _in_flight, _pool
+    if _in_flight >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent sign-ins, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    _in_flight += 1
+    try:
+        pool = _get_pool()
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool on the next call
+        if _pool is pool:
+            _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Password hashing is restarting, try again shortly",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        _in_flight -= 1
+
+
+async def hash_password(password: str) -> str:
+    return await _submit(_hash, password)
+
+
+async def verify_password(password: str, hashed: str) -> tuple[bool, str | None]:
+    """(matches, new hash or None); a new hash means the stored one uses an outdated work factor."""
+    return await _submit(_verify_and_update, password, hashed)
+
+
+def shutdown_password_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
@@ -0,0 +1,193 @@
+"""Per-region distribution of phenotype, face type and nose type.
+
+``region_phenotype_stats`` holds one counter per (region, dimension, value).
+A flush listener keeps it in step with ``user_profiles`` in the same
+transaction as the profile write, so statistics cost one row per region and
+category instead of a scan over every ``phenotype_analyze`` blob. Deleted or
+changed profiles whose old region/analysis were never loaded (``load_only``,
+expired attributes) have them read back before the flush. Profiles
+written with raw SQL bypass the listener; if the counters drift, rebuild them:
+
+    python -m phenotype_stats
+"""
+import logging
+from collections import Counter
+
+from sqlalchemy import delete, event, insert, inspect, select, text
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, dialect_insert
+from models.region_phenotype_stat import RegionPhenotypeStat
+from models.user_profile import UserProfile
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ("phenotype", "face_type", "nose_type")
+PROFILES = "profiles"  # dimension with a single value "": number of profiles in the region
+_MAX_VALUE_LENGTH = 255
+
+StatKey = tuple[int, str, str]
+
+
+def profile_categories(analysis) -> dict[str, str]:
+    """
+    Category values of a ``phenotype_analyze`` blob. Keys are looked up at the top level and
+    one level down (e.g. ``{"mesh": {"face_type": ...}}``); the phenotype is either a
+    ``phenotype`` string or the ``top1`` of a YOLO prediction.
+    """
+    if not isinstance(analysis, dict):
+        return {}
+    scopes = [analysis] + [v for v in analysis.values() if isinstance(v, dict)]
+    found = {}
+    for dimension in DIMENSIONS:
+        for scope in scopes:
+            value = scope.get(dimension)
+            if dimension == "phenotype":
+                if isinstance(value, dict):
+                    value = value.get("top1")
+                if value is None:
+                    value = scope.get("top1")
+            if isinstance(value, (str, int, float)) and not isinstance(value, bool) and str(value):
+                found[dimension] = str(value)[:_MAX_VALUE_LENGTH]
+                break
+    return found
+
+
+def _stat_keys(region_id: int | None, analysis) -> list[StatKey]:
+    if region_id is None:
+        return []
+    categories = profile_categories(analysis)
+    return [(region_id, PROFILES, "")] + [(region_id, d, v) for d, v in categories.items()]
+
+
+def apply_deltas(db: Session, deltas: Counter) -> None:
+    """Add ``deltas`` to the counters; rows that reach zero are removed."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    conn = db.connection()
+    # Sorted so concurrent transactions lock counter rows in the same order
+    for (region_id, dimension, value), delta in sorted(deltas.items()):
+        stmt = dialect_insert(db, RegionPhenotypeStat).values(
+            region_id=region_id, dimension=dimension, value=value, count=delta
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RegionPhenotypeStat.region_id, RegionPhenotypeStat.dimension, RegionPhenotypeStat.value],
+            set_={"count": RegionPhenotypeStat.count + delta},
+        )
+        conn.execute(stmt)
+    if any(delta < 0 for delta in deltas.values()):
+        conn.execute(
+            delete(RegionPhenotypeStat).where(
+                RegionPhenotypeStat.region_id.in_({key[0] for key in deltas}),
+                RegionPhenotypeStat.count <= 0,
+            )
+        )
+
+
+_TRACKED = ("region_id", "phenotype_analyze")
+_COMMITTED_KEY = "phenotype_stats_committed"
+
+
+def _unknown(state, attr: str) -> bool:
+    """True if the value before this flush was never loaded (deferred, expired, or set without loading)."""
+    history = state.attrs[attr].history
+    return not history.deleted and not history.unchanged
+
+
+def _previous(session: Session, state, attr: str):
+    """Value of ``attr`` before this flush."""
+    history = state.attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    committed = session.info.get(_COMMITTED_KEY, {}).get(state.identity[0] if state.identity else None)
+    if committed is not None:
+        return committed[attr]
+    logger.warning("Previous %s of profile %s unknown; region_phenotype_stats may drift", attr, state.identity)
+    return None
+
+
+def rebuild(db: Session, batch_size: int = 1000) -> int:
+    """Recount every profile; returns the number of profiles scanned. Caller commits."""
+    if db.get_bind().dialect.name == "postgresql":
+        # Keep profile writes out until the new counts are committed
+        db.execute(text("LOCK TABLE user_profiles IN SHARE MODE"))
+    counts: Counter = Counter()
+    scanned = 0
+    rows = db.execute(
+        select(UserProfile.region_id, UserProfile.phenotype_analyze).execution_options(yield_per=batch_size)
+    )
+    for region_id, analysis in rows:
+        scanned += 1
+        counts.update(_stat_keys(region_id, analysis))
+    db.execute(delete(RegionPhenotypeStat))
+    if counts:
+        db.execute(
+            insert(RegionPhenotypeStat),
+            [
+                {"region_id": region_id, "dimension": dimension, "value": value, "count": count}
+                for (region_id, dimension, value), count in sorted(counts.items())
+            ],
+        )
+    return scanned
+
+
+@event.listens_for(Session, "before_flush")
+def _load_committed_values(session: Session, flush_context, instances) -> None:
+    """Read the stored region/analysis of deleted or changed profiles whose old values were never loaded."""
+    states = [inspect(obj) for obj in session.deleted if isinstance(obj, UserProfile)]
+    states += [
+        inspect(obj) for obj in session.dirty
+        if isinstance(obj, UserProfile) and any(inspect(obj).attrs[attr].history.has_changes() for attr in _TRACKED)
+    ]
+    ids = {state.identity[0] for state in states if state.identity and any(_unknown(state, a) for a in _TRACKED)}
+    if not ids:
+        return
+    # Through the connection: a Session query here would autoflush
+    rows = session.connection().execute(
+        select(UserProfile.id, UserProfile.region_id, UserProfile.phenotype_analyze).where(UserProfile.id.in_(ids))
+    )
+    session.info.setdefault(_COMMITTED_KEY, {}).update(
+        (profile_id, {"region_id": region_id, "phenotype_analyze": analysis}) for profile_id, region_id, analysis in rows
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _track_profile_stats(session: Session, flush_context) -> None:
+    deltas: Counter = Counter()
+    for obj in session.new:
+        if isinstance(obj, UserProfile):
+            deltas.update(_stat_keys(obj.region_id, obj.phenotype_analyze))
+    for obj in session.deleted:
+        if isinstance(obj, UserProfile):
+            state = inspect(obj)
+            deltas.subtract(_stat_keys(*(_previous(session, state, attr) for attr in _TRACKED)))
+    for obj in session.dirty:
+        if not isinstance(obj, UserProfile):
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[attr].history.has_changes() for attr in _TRACKED):
+            continue
+        previous = [_previous(session, state, attr) for attr in _TRACKED]
+        # An attribute that was not set keeps its previous value (and may not be loaded on the object)
+        current = [
+            state.attrs[attr].history.added[0] if state.attrs[attr].history.added else old
+            for attr, old in zip(_TRACKED, previous)
+        ]
+        deltas.subtract(_stat_keys(*previous))
+        deltas.update(_stat_keys(*current))
+    session.info.pop(_COMMITTED_KEY, None)
+    apply_deltas(session, deltas)
+
+
+def main() -> None:
+    with SessionLocal() as db:
+        scanned = rebuild(db)
+        db.commit()
+    print(f"region_phenotype_stats rebuilt from {scanned} profiles")
+
+
+if __name__ == "__main__":
+    main()
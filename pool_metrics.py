@@ -0,0 +1,143 @@
+"""Connection pool instrumentation.
+
+``InstrumentedQueuePool`` / ``InstrumentedAsyncQueuePool`` time every checkout
+(the wait for a free connection, plus connecting when the pool grows) and count
+timeouts; pool events track connections in use, the peak, overflow, new
+connections and invalidations. ``pool_snapshot`` reports one engine's numbers
+for GET /api/admin/pool. The numbers are per worker process, so they can be
+used to size DB_POOL_SIZE / DB_MAX_OVERFLOW per worker. Checkouts slower than
+DB_POOL_SLOW_CHECKOUT_MS are logged.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import AsyncAdaptedQueuePool, QueuePool, event, exc
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the checkout wait histogram buckets; the last bucket is open-ended
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+@dataclass
+class PoolStats:
+    name: str
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    wait_histogram: list[int] = field(default_factory=lambda: [0] * (len(WAIT_BUCKETS_MS) + 1))
+    in_use: int = 0
+    in_use_peak: int = 0
+    connects: int = 0
+    invalidations: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_wait(self, seconds: float) -> None:
+        ms = seconds * 1000
+        bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if ms <= bound), len(WAIT_BUCKETS_MS))
+        with self.lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self.wait_histogram[bucket] += 1
+        if ms > settings.DB_POOL_SLOW_CHECKOUT_MS:
+            logger.warning("Slow connection checkout from %s pool: %.0f ms", self.name, ms)
+
+
+class _InstrumentedMixin:
+    stats: PoolStats | None = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                with self.stats.lock:
+                    self.stats.timeouts += 1
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.record_wait(time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(_InstrumentedMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+_registry: dict[str, tuple[object, PoolStats]] = {}
+
+
+def instrument_engine(sync_engine, name: str) -> PoolStats:
+    """Attach stats to the engine's pool (and to the pool that replaces it on ``dispose()``)."""
+    stats = PoolStats(name)
+    sync_engine.pool.stats = stats
+    _registry[name] = (sync_engine, stats)
+
+    @event.listens_for(sync_engine, "engine_disposed")
+    def _reattach(engine):
+        engine.pool.stats = stats
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        with stats.lock:
+            stats.connects += 1
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        with stats.lock:
+            stats.checkouts += 1
+            stats.in_use += 1
+            stats.in_use_peak = max(stats.in_use_peak, stats.in_use)
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        with stats.lock:
+            stats.in_use -= 1
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        with stats.lock:
+            stats.invalidations += 1
+
+    return stats
+
+
+def pool_snapshot(name: str) -> dict:
+    engine, stats = _registry[name]
+    pool = engine.pool
+    with stats.lock:
+        snapshot = {
+            "pool": name,
+            "pid": os.getpid(),
+            "class": type(pool).__name__,
+            "status": pool.status(),
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "wait_avg_ms": round(stats.wait_total / stats.checkouts * 1000, 3) if stats.checkouts else 0.0,
+            "wait_max_ms": round(stats.wait_max * 1000, 3),
+            "wait_histogram_ms": {
+                **{f"<={bound}": n for bound, n in zip(WAIT_BUCKETS_MS, stats.wait_histogram)},
+                f">{WAIT_BUCKETS_MS[-1]}": stats.wait_histogram[-1],
+            },
+            "in_use": stats.in_use,
+            "in_use_peak": stats.in_use_peak,
+            "connects": stats.connects,
+            "invalidations": stats.invalidations,
+        }
+    if isinstance(pool, QueuePool):
+        snapshot.update(size=pool.size(), checked_in=pool.checkedin(), overflow=max(pool.overflow(), 0))
+    return snapshot
+
+
+def pool_snapshots() -> list[dict]:
+    return [pool_snapshot(name) for name in _registry]
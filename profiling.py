@@ -0,0 +1,232 @@
+"""
+Live profiling of a worker process, for admins (see routers/admin.py).
+
+``sample_stacks`` is a wall-clock sampling profiler: a background thread
+reads every other thread's Python stack (``sys._current_frames``) every
+``interval`` seconds and counts identical stacks. The result is in collapsed
+"frame;frame;frame count" format, ready for flamegraph.pl / speedscope. The
+sampled threads are never paused or traced, so overhead is one stack walk per
+thread per tick and it is safe to run against a loaded production worker.
+
+``RequestProfilerMiddleware`` runs a single request under cProfile when an
+admin sends ``X-Profile: cprofile``. The request's endpoint code and
+response serialization run on the event loop thread, which is what cProfile
+sees. Other requests interleaved on the loop during that time are included
+too. Blocking work the request hands to the threadpool through
+``profile_in_thread`` (the model calls in analysis_quality.analysis_gate) is
+profiled in its worker thread and merged into the request's stats; other
+threadpool work is not. The captured stats are kept in memory (last
+PROFILER_KEEP_REQUESTS) and the response carries ``X-Profile-Id`` to fetch
+them.
+"""
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from auth import authenticate_token
+from config import settings
+
+PROFILE_HEADER = "x-profile"
+_PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+# A thread whose innermost frame is in one of these is waiting, not working
+_IDLE_FILES = tuple(
+    os.path.join(*parts)
+    for parts in (
+        ("threading.py",),
+        ("selectors.py",),
+        ("queue.py",),
+        ("concurrent", "futures", "thread.py"),
+        ("aiosqlite", "core.py"),
+    )
+)
+
+_sampling = threading.Lock()
+_cprofile_active = threading.Lock()
+# Profiles of worker threads run for the request being profiled (see profile_in_thread)
+_thread_profiles: ContextVar[list[cProfile.Profile] | None] = ContextVar("profiling_thread_profiles", default=None)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_PROJECT_ROOT):
+        filename = filename[len(_PROJECT_ROOT):]
+    else:
+        _, marker, rest = filename.rpartition("site-packages" + os.sep)
+        filename = rest if marker else os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    return frame.f_code.co_filename.endswith(_IDLE_FILES)
+
+
+def sample_stacks(seconds: float, interval: float = 0.01, include_idle: bool = False) -> tuple[Counter, int]:
+    """Sample all other threads for ``seconds``; returns (collapsed stack -> samples, number of ticks)."""
+    if not _sampling.acquire(blocking=False):
+        raise RuntimeError("A sampling run is already in progress in this worker")
+    try:
+        own = threading.get_ident()
+        counts: Counter = Counter()
+        ticks = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (not include_idle and _is_idle(frame)):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                counts[";".join(reversed(stack))] += 1
+            ticks += 1
+            time.sleep(interval)
+        return counts, ticks
+    finally:
+        _sampling.release()
+
+
+def collapsed(counts: Counter) -> str:
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+@dataclass
+class CapturedProfile:
+    id: int
+    method: str
+    path: str
+    started_at: datetime
+    duration_ms: float
+    stats: bytes  # marshal-ed pstats dict, the format of cProfile's dump_stats
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 1),
+        }
+
+    def text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        out = io.StringIO()
+        stats = pstats.Stats(_StatsLoader(self.stats), stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class _StatsLoader:
+    """pstats.Stats accepts any object with ``create_stats``/``stats``; this one wraps a dump."""
+
+    def __init__(self, dump: bytes):
+        self.stats = marshal.loads(dump)
+
+    def create_stats(self) -> None:
+        pass
+
+
+captured_profiles: deque[CapturedProfile] = deque(maxlen=settings.PROFILER_KEEP_REQUESTS)
+_profile_ids = itertools.count(1)
+
+
+def get_captured_profile(profile_id: int) -> CapturedProfile | None:
+    for captured in captured_profiles:
+        if captured.id == profile_id:
+            return captured
+    return None
+
+
+def profile_in_thread(fn):
+    """``fn`` wrapped to run under its own cProfile when the current request is profiled; else ``fn`` itself.
+
+    Wrap before handing ``fn`` to the threadpool: the wrapper runs in the worker thread, which the
+    request's profiler does not see, and the middleware merges its stats into the request's.
+    """
+    profiles = _thread_profiles.get()
+    if profiles is None:
+        return fn
+
+    def profiled(*args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: cProfile hooks every thread, so the request's profiler already sees this one
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profiles.append(profiler)
+
+    return profiled
+
+
+class RequestProfilerMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not await self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+        # cProfile hooks the whole thread; only one request can own it at a time
+        if not _cprofile_active.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_profile_ids)
+        profiler = cProfile.Profile()
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", str(profile_id))
+            await send(message)
+
+        thread_profiles: list[cProfile.Profile] = []
+        token = _thread_profiles.set(thread_profiles)
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.disable()
+            _thread_profiles.reset(token)
+            _cprofile_active.release()
+            stats = pstats.Stats(profiler)
+            for thread_profile in thread_profiles:
+                stats.add(thread_profile)
+            captured_profiles.append(CapturedProfile(
+                id=profile_id,
+                method=scope["method"],
+                path=scope["path"],
+                started_at=started_at,
+                duration_ms=(time.perf_counter() - started) * 1000,
+                stats=marshal.dumps(stats.stats),
+            ))
+
+    async def _wanted(self, scope: Scope) -> bool:
+        headers = Headers(scope=scope)
+        if headers.get(PROFILE_HEADER, "").lower() != "cprofile":
+            return False
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        user = await authenticate_token(token)
+        return user is not None and user.role == "admin"
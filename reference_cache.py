@@ -0,0 +1,96 @@
+"""In-process cache for small, rarely changing lookup tables.
+
+Each cache holds a snapshot of the whole table (as response schemas) tagged
+with its ``table_versions`` counter. Reads within REFERENCE_CACHE_TTL seconds
+are served from memory; after that the counter is checked (one tiny query)
+and the table is reloaded only if it changed. Writes through this worker's
+routers call ``invalidate()`` so they are visible immediately; writes made by
+other workers are picked up at the next version check.
+"""
+import asyncio
+import bisect
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import settings
+from http_cache import Validators, get_table_versions, make_etag
+from models.analysis_question import AnalysisQuestion
+from models.face_feature import FaceFeature
+from models.phenotype import Phenotype
+from models.region import Region
+from schemas.analysis import AnalysisQuestionSchema
+from schemas.face_feature import FaceFeatureResponse
+from schemas.phenotype import PhenotypeResponse
+from schemas.region import RegionResponse
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    table_name: str
+    version: int
+    last_modified: datetime | None
+    items: list  # ordered by id
+    ids: list[int] = field(default_factory=list)
+
+    def get(self, item_id: int) -> Any | None:
+        i = bisect.bisect_left(self.ids, item_id)
+        if i < len(self.ids) and self.ids[i] == item_id:
+            return self.items[i]
+        return None
+
+    def validators(self, extra=()) -> Validators:
+        """Same role as ``http_cache.table_validators``, without the version query."""
+        return Validators(
+            etag=make_etag([(self.table_name, (self.version, self.last_modified))], extra),
+            last_modified=self.last_modified,
+        )
+
+
+class ReferenceCache:
+    def __init__(self, model, to_item: Callable[[Any], Any], ttl: float = settings.REFERENCE_CACHE_TTL):
+        self.model = model
+        self.table_name = model.__tablename__
+        self.to_item = to_item
+        self.ttl = ttl
+        self._snapshot: Snapshot | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, db: AsyncSession) -> Snapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+            return snapshot
+        async with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+                return self._snapshot
+            # Read the version before the rows: a concurrent write then at worst causes one extra reload
+            versions = await db.run_sync(get_table_versions, self.table_name)
+            version, last_modified = versions[self.table_name]
+            if self._snapshot is None or self._snapshot.version != version:
+                rows = (await db.scalars(select(self.model).order_by(self.model.id))).all()
+                self._snapshot = Snapshot(
+                    table_name=self.table_name,
+                    version=version,
+                    last_modified=last_modified,
+                    items=[self.to_item(r) for r in rows],
+                    ids=[r.id for r in rows],
+                )
+            self._checked_at = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        self._checked_at = 0.0
+
+
+regions_cache = ReferenceCache(Region, RegionResponse.model_validate)
+phenotypes_cache = ReferenceCache(Phenotype, PhenotypeResponse.model_validate)
+face_features_cache = ReferenceCache(FaceFeature, FaceFeatureResponse.model_validate)
+analysis_questions_cache = ReferenceCache(
+    AnalysisQuestion,
+    lambda q: AnalysisQuestionSchema(id=str(q.id), label=q.label, type=q.type, options=q.options),
+)
@@ -0,0 +1,118 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, Response
+
+from analysis_quality import analysis_gate
+from auth import get_current_admin
+from config import settings
+from memory import MB, current_rss, memory_report, release_memory, snapshot_diff, start_tracing, stop_tracing
+from pool_metrics import pool_snapshots
+from profiling import captured_profiles, collapsed, get_captured_profile, sample_stacks
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(get_current_admin)])
+
+PSTATS_SORT_KEYS = {"cumulative", "tottime", "calls", "ncalls", "time", "name", "filename"}
+TRACEMALLOC_GROUP_BY = {"lineno", "filename", "traceback"}
+
+
+@router.get("/pool")
+def get_pool_stats():
+    """Connection pool usage of the worker process that serves the request (one entry per engine)."""
+    return pool_snapshots()
+
+
+@router.get("/analysis")
+def get_analysis_stats():
+    """Analyses running or waiting in this worker, and how many ran at each quality tier."""
+    return analysis_gate.snapshot()
+
+
+@router.get("/profile/sample", response_class=PlainTextResponse)
+async def sample_worker_stacks(seconds: float = 10.0, interval_ms: float = 10.0, idle: bool = False):
+    """
+    Sample this worker's thread stacks for ``seconds`` and return them as collapsed stacks
+    (flamegraph.pl / speedscope input). ``idle=true`` keeps threads that are only waiting.
+    """
+    if not 0 < seconds <= settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {settings.PROFILER_MAX_SECONDS}]")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    try:
+        counts, ticks = await run_in_threadpool(sample_stacks, seconds, interval_ms / 1000, idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        collapsed(counts),
+        headers={"X-Worker-Pid": str(os.getpid()), "X-Profile-Samples": str(ticks)},
+    )
+
+
+@router.get("/profile/requests")
+def list_request_profiles():
+    """cProfile captures of requests sent with ``X-Profile: cprofile`` in this worker, newest first."""
+    return [captured.summary() for captured in reversed(captured_profiles)]
+
+
+@router.get("/profile/requests/{profile_id}")
+def get_request_profile(profile_id: int, sort: str = "cumulative", limit: int = 50, format: str = "text"):
+    """One capture as a pstats table (``format=text``) or a ``.prof`` file (``format=pstats``) for snakeviz etc."""
+    captured = get_captured_profile(profile_id)
+    if captured is None:
+        raise HTTPException(status_code=404, detail="Profile not found (captures are per worker and only the latest are kept)")
+    if format == "pstats":
+        return Response(
+            captured.stats,
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="request-{profile_id}.prof"'},
+        )
+    if sort not in PSTATS_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(sorted(PSTATS_SORT_KEYS))}")
+    return PlainTextResponse(captured.text(sort, limit))
+
+
+@router.get("/memory")
+def get_memory_stats():
+    """RSS, GC counters and sampled per-route allocation peaks of this worker."""
+    return memory_report()
+
+
+@router.post("/memory/release")
+def release_worker_memory():
+    """Run a full GC and return free heap to the OS; reports RSS before and after."""
+    before = current_rss()
+    release_memory()
+    after = current_rss()
+    return {
+        "rss_before_mb": round(before / MB, 1) if before is not None else None,
+        "rss_after_mb": round(after / MB, 1) if after is not None else None,
+    }
+
+
+@router.post("/memory/tracemalloc", status_code=status.HTTP_204_NO_CONTENT)
+async def start_tracemalloc(frames: int = 10):
+    """Start tracemalloc in this worker with a baseline snapshot (slows allocations while on)."""
+    if not 1 <= frames <= 50:
+        raise HTTPException(status_code=400, detail="frames must be between 1 and 50")
+    try:
+        await run_in_threadpool(start_tracing, frames)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/memory/tracemalloc/diff")
+async def get_tracemalloc_diff(limit: int = 30, group_by: str = "lineno", rebase: bool = False):
+    """Largest allocation growth since the baseline; ``rebase=true`` makes this snapshot the new baseline."""
+    if group_by not in TRACEMALLOC_GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(sorted(TRACEMALLOC_GROUP_BY))}")
+    try:
+        return await run_in_threadpool(snapshot_diff, limit, group_by, rebase)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.delete("/memory/tracemalloc", status_code=status.HTTP_204_NO_CONTENT)
+def stop_tracemalloc():
+    """Stop the tracemalloc session started with POST /admin/memory/tracemalloc."""
+    stop_tracing()
@@ -1,19 +1,39 @@
 import base64
 import re
-
-from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from config import settings
-from analyzer.tui import analyze_face_landmarks
-from database import get_db
-from models.analysis_question import AnalysisQuestion
+from analysis_quality import QUALITY_HEADER, analysis_gate
+from analysis_quality import analyze_landmarks as run_landmarks
+from blob_store import blob_store, store_blob
+from database import get_async_db
+from http_cache import RECORD_CACHE_CONTROL, Validators, check_conditional, make_etag
+from jobs import enqueue_job
+from models.analysis_job import AnalysisJob
 from models.analysis_session import AnalysisSession
-from schemas.analysis import AnalyzeRequest, AnalyzeResponse, AnalysisQuestionSchema, SubmitAnswersRequest
+from reference_cache import analysis_questions_cache
+from schemas.analysis import (
+    AnalysisJobCreated,
+    AnalysisJobResponse,
+    AnalyzeRequest,
+    AnalyzeResponse,
+    AnalysisQuestionSchema,
+    SubmitAnswersRequest,
+)
+from thumbnails import THUMBNAIL_SIZES, generate_thumbnails, get_thumbnail
+from write_queue import run_write
 
 router = APIRouter(prefix="/analyze", tags=["analyze"])
 
 ALLOWED_CONTENT_TYPES = {"image/jpeg", "image/png", "image/webp"}
+Quality = Literal["auto", "full", "fast"]
 
 # Default questions when DB has none (per MODELS_AND_FILES.md)
 DEFAULT_QUESTIONS = [
@@ -31,17 +51,34 @@ def _parse_data_url(data_url: str) -> bytes:
     return base64.b64decode(match.group(1))
 
 
-def _get_questions(db: Session) -> list[AnalysisQuestionSchema]:
-    """Get questions from DB or return defaults."""
-    questions = db.query(AnalysisQuestion).order_by(AnalysisQuestion.id).all()
+async def _get_questions(db: AsyncSession) -> list[AnalysisQuestionSchema]:
+    """Get questions from the reference cache or return defaults."""
+    questions = (await analysis_questions_cache.get(db)).items
     if questions:
-        return [
-            AnalysisQuestionSchema(id=str(q.id), label=q.label, type=q.type, options=q.options)
-            for q in questions
-        ]
+        return questions
     return [AnalysisQuestionSchema(**q) for q in DEFAULT_QUESTIONS]
 
 
+def _create_session(db: Session, image_bytes: bytes, digest: str | None) -> str:
+    """Write job (see write_queue.run_write): new session referencing an image staged under ``digest``."""
+    store_blob(db, image_bytes, digest)
+    session = AnalysisSession(session_id=AnalysisSession.generate_session_id(), original_image_hash=digest)
+    db.add(session)
+    db.flush()
+    return session.session_id
+
+
+def _complete_session(db: Session, session_id: str, result: dict) -> bool:
+    """Write job: store the result; False if the session does not exist."""
+    session = db.scalar(select(AnalysisSession).where(AnalysisSession.session_id == session_id))
+    if not session:
+        return False
+    session.result = result
+    session.completed_at = datetime.utcnow()
+    db.flush()
+    return True
+
+
 def _build_result_from_answers(answers: dict) -> dict:
     """Build result object from answers (phenotype, origin, concentration, recommendations, summary)."""
     return {
@@ -57,12 +94,32 @@ def _build_result_from_answers(answers: dict) -> dict:
     }
 
 
+async def _landmarks_response(image_bytes: bytes, requested: str) -> ORJSONResponse:
+    quality = analysis_gate.choose(requested)
+    result = await analysis_gate.run(run_landmarks, image_bytes, quality)
+
+    if result["error"]:
+        raise HTTPException(status_code=422, detail=result["error"], headers={QUALITY_HEADER: quality})
+
+    # Returned directly so the points (list or NumPy array) skip jsonable_encoder
+    return ORJSONResponse(
+        {
+            "points": result["points"],
+            "annotated_image_base64": result["annotated_image_base64"],
+            "quality": quality,
+        },
+        headers={QUALITY_HEADER: quality},
+    )
+
+
 @router.post("/landmarks")
 async def analyze_landmarks(
     file: UploadFile = File(..., description="Image file (JPEG, PNG, WebP)"),
+    quality: Quality = "full",
 ):
     """
     Accept an image file, detect face landmarks, and return points + optional annotated image.
+    Opt-in ``quality=fast`` (or ``auto``, fast under load) skips the annotated image and works on a smaller copy.
     """
     if file.content_type and file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(
@@ -74,24 +131,11 @@ async def analyze_landmarks(
     if not image_bytes:
         raise HTTPException(status_code=400, detail="Empty file")
 
-    result = analyze_face_landmarks(
-        image_bytes=image_bytes,
-        weights_path=settings.LANDMARK_WEIGHTS_PATH,
-        draw_points=True,
-        return_image_base64=True,
-    )
-
-    if result["error"]:
-        raise HTTPException(status_code=422, detail=result["error"])
-
-    return {
-        "points": result["points"],
-        "annotated_image_base64": result["annotated_image_base64"],
-    }
+    return await _landmarks_response(image_bytes, quality)
 
 
 @router.post("/landmarks/bytes")
-async def analyze_landmarks_bytes(request: Request):
+async def analyze_landmarks_bytes(request: Request, quality: Quality = "full"):
     """
     Accept raw image bytes in request body (Content-Type: image/jpeg, image/png, etc.).
     """
@@ -105,28 +149,81 @@ async def analyze_landmarks_bytes(request: Request):
     if not image_bytes:
         raise HTTPException(status_code=400, detail="Empty body")
 
-    result = analyze_face_landmarks(
-        image_bytes=image_bytes,
-        weights_path=settings.LANDMARK_WEIGHTS_PATH,
-        draw_points=True,
-        return_image_base64=True,
+    return await _landmarks_response(image_bytes, quality)
+
+
+# --- Queued analysis (run by worker.py, see jobs.py) ---
+
+@router.post("/jobs", status_code=202, response_model=AnalysisJobCreated)
+async def create_analysis_job(
+    response: Response,
+    file: UploadFile = File(..., description="Image file (JPEG, PNG, WebP)"),
+    kind: Literal["landmarks", "phenotype"] = "landmarks",
+    annotate: bool = False,
+    quality: Quality = "full",
+):
+    """
+    Queue an analysis for the analyzer workers instead of running it in this process.
+    Poll GET /api/analyze/jobs/{jobId} (Location header) for the result.
+    """
+    if file.content_type and file.content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid content type. Allowed: {', '.join(ALLOWED_CONTENT_TYPES)}",
+        )
+    image_bytes = await file.read()
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail="Empty file")
+
+    # Staged outside the write queue; the job takes the reference and re-checks the file
+    digest = await run_in_threadpool(blob_store.write, image_bytes)
+    job_id = await run_write(enqueue_job, kind, {"annotate": annotate, "quality": quality}, image_bytes, digest)
+    response.headers["Location"] = f"/api/analyze/jobs/{job_id}"
+    return AnalysisJobCreated(jobId=job_id, status="queued")
+
+
+async def _get_job(db: AsyncSession, job_id: str) -> AnalysisJob:
+    job = await db.scalar(select(AnalysisJob).where(AnalysisJob.job_id == job_id))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobResponse)
+async def get_analysis_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Job status; ``result`` is set once ``status`` is ``done``, ``error`` when it is ``failed`` (or being retried)."""
+    job = await _get_job(db, job_id)
+    return AnalysisJobResponse(
+        jobId=job.job_id,
+        kind=job.kind,
+        status=job.status,
+        attempts=job.attempts,
+        result=job.result,
+        annotatedImageUrl=f"/api/analyze/jobs/{job.job_id}/image" if job.result_image_hash else None,
+        error=job.error,
+        createdAt=job.created_at,
+        startedAt=job.started_at,
+        finishedAt=job.finished_at,
     )
 
-    if result["error"]:
-        raise HTTPException(status_code=422, detail=result["error"])
 
-    return {
-        "points": result["points"],
-        "annotated_image_base64": result["annotated_image_base64"],
-    }
+@router.get("/jobs/{job_id}/image")
+async def get_analysis_job_image(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Annotated image of a finished job queued with ``annotate=true``."""
+    job = await _get_job(db, job_id)
+    if not job.result_image_hash:
+        raise HTTPException(status_code=404, detail="Job has no annotated image")
+    media_type = await run_in_threadpool(blob_store.media_type, job.result_image_hash)
+    return FileResponse(blob_store.path_for(job.result_image_hash), media_type=media_type)
 
 
 # --- Analysis flow (per MODELS_AND_FILES.md) ---
 
 @router.post("", response_model=AnalyzeResponse)
-def analyze_image(
+async def analyze_image(
     body: AnalyzeRequest,
-    db: Session = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     POST /api/analyze
@@ -138,52 +235,84 @@ def analyze_image(
     except (ValueError, Exception) as e:
         raise HTTPException(status_code=400, detail=f"Invalid image data: {e}")
 
-    session = AnalysisSession(
-        session_id=AnalysisSession.generate_session_id(),
-        original_image=image_bytes,
-    )
-    db.add(session)
-    db.commit()
+    # Staged outside the write queue; the job takes the reference and re-checks the file
+    digest = await run_in_threadpool(blob_store.write, image_bytes) if image_bytes else None
+    session_id = await run_write(_create_session, image_bytes, digest)
+    background_tasks.add_task(generate_thumbnails, digest)
 
-    questions = _get_questions(db)
-    return AnalyzeResponse(sessionId=session.session_id, questions=questions)
+    questions = await _get_questions(db)
+    return AnalyzeResponse(sessionId=session_id, questions=questions)
 
 
 @router.post("/answers")
-def submit_answers(
-    body: SubmitAnswersRequest,
-    db: Session = Depends(get_db),
-):
+async def submit_answers(body: SubmitAnswersRequest):
     """
     POST /api/analyze/answers
     Body: { sessionId: string, answers: Record<string, string | number> }
     Returns: { result: Record<string, unknown> | string }
     """
-    session = db.query(AnalysisSession).filter(
-        AnalysisSession.session_id == body.sessionId
-    ).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-
     result = _build_result_from_answers(body.answers)
-    session.result = result
-    db.commit()
+    if not await run_write(_complete_session, body.sessionId, result):
+        raise HTTPException(status_code=404, detail="Session not found")
 
     return {"result": result}
 
 
 @router.get("/sessions/{session_id}")
-def get_session_result(session_id: str, db: Session = Depends(get_db)):
+async def get_session_result(
+    session_id: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
     """
     GET /api/analyze/sessions/{sessionId}
     Returns session with result (for history/display).
     """
-    session = db.query(AnalysisSession).filter(
+    stamps = (await db.execute(
+        select(AnalysisSession.created_at, AnalysisSession.completed_at)
+        .where(AnalysisSession.session_id == session_id)
+    )).first()
+    if not stamps:
+        raise HTTPException(status_code=404, detail="Session not found")
+    # The result is only ever written together with completed_at
+    validators = Validators(
+        etag=make_etag(session_id, stamps.created_at, stamps.completed_at),
+        last_modified=stamps.completed_at or stamps.created_at,
+    )
+    not_modified = check_conditional(request, response, validators, RECORD_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    session = await db.scalar(select(AnalysisSession).where(
         AnalysisSession.session_id == session_id
-    ).first()
+    ))
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     return {
         "sessionId": session.session_id,
         "result": session.result,
     }
+
+
+@router.get("/sessions/{session_id}/thumbnail")
+async def get_session_thumbnail(
+    session_id: str,
+    size: int = THUMBNAIL_SIZES[0],
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    GET /api/analyze/sessions/{sessionId}/thumbnail?size=128
+    WebP thumbnail of the analyzed image (for history lists).
+    """
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid size. Allowed: {', '.join(map(str, THUMBNAIL_SIZES))}",
+        )
+    digest = await db.scalar(select(AnalysisSession.original_image_hash).where(
+        AnalysisSession.session_id == session_id
+    ))
+    path = await run_in_threadpool(get_thumbnail, digest, size) if digest else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Session image not found")
+    return FileResponse(path, media_type="image/webp")
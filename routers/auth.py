@@ -1,55 +1,77 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from auth import create_access_token, get_password_hash, get_current_user
-from database import get_db
+from auth import AuthenticatedUser, create_access_token, get_current_user
+from database import get_async_db
 from models.user import User
+from passwords import hash_password, verify_password
 from schemas.auth import UserCreate, UserLogin, Token, UserResponse
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-@router.post("/register", response_model=UserResponse)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
-    """Register a new user."""
-    if db.query(User).filter(User.email == user_data.email).first():
+async def _check_available(db: AsyncSession, user_data: UserCreate) -> None:
+    if await db.scalar(select(User.id).where(User.email == user_data.email)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered",
         )
-    if db.query(User).filter(User.username == user_data.username).first():
+    if await db.scalar(select(User.id).where(User.username == user_data.username)):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken",
         )
+
+
+@router.post("/register", response_model=UserResponse)
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    """Register a new user."""
+    await _check_available(db, user_data)
+    # End the read transaction so the pooled connection is not held while bcrypt runs
+    await db.commit()
     user = User(
         email=user_data.email,
         username=user_data.username,
         name=user_data.name,
-        hashed_password=get_password_hash(user_data.password),
+        hashed_password=await hash_password(user_data.password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent registration took the email or username while the password was hashed
+        await db.rollback()
+        await _check_available(db, user_data)
+        raise
+    await db.refresh(user)
     return user
 
 
 @router.post("/login", response_model=Token)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Authenticate user and return JWT access token."""
-    from auth import verify_password
-
-    user = db.query(User).filter(User.username == credentials.username).first()
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    user = await db.scalar(select(User).where(User.username == credentials.username))
+    # End the read transaction so the pooled connection is not held while bcrypt runs
+    await db.commit()
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await verify_password(credentials.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
     access_token = create_access_token(data={"sub": user.username})
+    if new_hash:
+        # Stored hash uses an outdated work factor (BCRYPT_ROUNDS changed); upgrade it now
+        user.hashed_password = new_hash
+        await db.commit()
     return Token(access_token=access_token)
 
 
 @router.get("/me", response_model=UserResponse)
-def get_me(current_user: User = Depends(get_current_user)):
+def get_me(current_user: AuthenticatedUser = Depends(get_current_user)):
     """Get current authenticated user."""
     return current_user
@@ -1,53 +1,151 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from bulk import bulk_write, read_bulk_rows
+from database import get_async_db
+from http_cache import CATALOG_CACHE_CONTROL, Validators, check_conditional, make_etag
 from models.face_feature import FaceFeature
-from schemas.face_feature import FaceFeatureCreate, FaceFeatureUpdate, FaceFeatureResponse
+from models.user_profile import UserProfile
+from models.user_profile_face_feature import user_profile_face_features
+from pagination import paginate, paginate_list, set_next_cursor
+from reference_cache import face_features_cache
+from routers.user_profiles import list_user_profiles
+from schemas.bulk import BulkResult
+from schemas.face_feature import FaceFeatureCreate, FaceFeatureUpdate, FaceFeatureResponse, FaceFeatureUsage
+from schemas.user_profile import UserProfileListItem
 
 router = APIRouter(prefix="/face-features", tags=["face-features"])
 
 
 @router.get("/", response_model=list[FaceFeatureResponse])
-def list_face_features(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    face_features = db.query(FaceFeature).offset(skip).limit(limit).all()
+async def list_face_features(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    snapshot = await face_features_cache.get(db)
+    not_modified = check_conditional(
+        request, response, snapshot.validators(extra=(skip, limit, cursor)), CATALOG_CACHE_CONTROL
+    )
+    if not_modified is not None:
+        return not_modified
+    face_features = paginate_list(snapshot.items, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(request, response, face_features, limit)
     return face_features
 
 
 @router.post("/", response_model=FaceFeatureResponse)
-def create_face_feature(face_feature: FaceFeatureCreate, db: Session = Depends(get_db)):
+async def create_face_feature(face_feature: FaceFeatureCreate, db: AsyncSession = Depends(get_async_db)):
     db_face_feature = FaceFeature(**face_feature.model_dump())
     db.add(db_face_feature)
-    db.commit()
-    db.refresh(db_face_feature)
+    await db.commit()
+    face_features_cache.invalidate()
+    await db.refresh(db_face_feature)
     return db_face_feature
 
 
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_create_face_features(request: Request, upsert: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """JSON array or NDJSON of FaceFeatureCreate; ``upsert=true`` updates rows whose name exists."""
+    result = await bulk_write(db, FaceFeature, FaceFeatureCreate, await read_bulk_rows(request), upsert=upsert)
+    face_features_cache.invalidate()
+    return result
+
+
+@router.get("/usage", response_model=list[FaceFeatureUsage])
+async def face_feature_usage(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Number of profiles linked to each face feature, counted in the database."""
+    link = user_profile_face_features.c
+    stmt = (
+        select(
+            FaceFeature.id,
+            FaceFeature.view_name,
+            FaceFeature.name,
+            func.count(link.user_profile_id).label("profile_count"),
+        )
+        .outerjoin(user_profile_face_features, link.face_feature_id == FaceFeature.id)
+        .group_by(FaceFeature.id, FaceFeature.view_name, FaceFeature.name)
+    )
+    rows = (await db.execute(paginate(stmt, FaceFeature.id, skip=skip, limit=limit, cursor=cursor))).all()
+    # Counts move with every profile write; validate against the page itself
+    validators = Validators(etag=make_etag([tuple(row) for row in rows], skip, limit, cursor))
+    not_modified = check_conditional(request, response, validators, CATALOG_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    set_next_cursor(request, response, rows, limit)
+    return [FaceFeatureUsage.model_validate(row._mapping) for row in rows]
+
+
 @router.get("/{face_feature_id}", response_model=FaceFeatureResponse)
-def get_face_feature(face_feature_id: int, db: Session = Depends(get_db)):
-    face_feature = db.query(FaceFeature).filter(FaceFeature.id == face_feature_id).first()
+async def get_face_feature(face_feature_id: int, db: AsyncSession = Depends(get_async_db)):
+    face_feature = (await face_features_cache.get(db)).get(face_feature_id)
+    if face_feature is None:
+        # May have been created by another worker since the last version check
+        face_feature = await db.get(FaceFeature, face_feature_id)
     if not face_feature:
         raise HTTPException(status_code=404, detail="Face feature not found")
     return face_feature
 
 
+@router.get(
+    "/{face_feature_id}/profiles",
+    response_model=list[UserProfileListItem],
+    response_model_exclude_unset=True,
+)
+async def list_face_feature_profiles(
+    face_feature_id: int,
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    fields: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Profiles linked to the feature; same paging and ``fields`` as GET /user-profiles/."""
+    if (await face_features_cache.get(db)).get(face_feature_id) is None:
+        if await db.get(FaceFeature, face_feature_id) is None:
+            raise HTTPException(status_code=404, detail="Face feature not found")
+    return await list_user_profiles(
+        request, response, skip=skip, limit=limit, cursor=cursor, fields=fields,
+        face_feature_id=face_feature_id, db=db,
+    )
+
+
 @router.patch("/{face_feature_id}", response_model=FaceFeatureResponse)
-def update_face_feature(face_feature_id: int, face_feature_update: FaceFeatureUpdate, db: Session = Depends(get_db)):
-    face_feature = db.query(FaceFeature).filter(FaceFeature.id == face_feature_id).first()
+async def update_face_feature(face_feature_id: int, face_feature_update: FaceFeatureUpdate, db: AsyncSession = Depends(get_async_db)):
+    face_feature = await db.get(FaceFeature, face_feature_id)
     if not face_feature:
         raise HTTPException(status_code=404, detail="Face feature not found")
     update_data = face_feature_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(face_feature, key, value)
-    db.commit()
-    db.refresh(face_feature)
+    await db.commit()
+    face_features_cache.invalidate()
+    await db.refresh(face_feature)
     return face_feature
 
 
 @router.delete("/{face_feature_id}", status_code=204)
-def delete_face_feature(face_feature_id: int, db: Session = Depends(get_db)):
-    face_feature = db.query(FaceFeature).filter(FaceFeature.id == face_feature_id).first()
+async def delete_face_feature(face_feature_id: int, db: AsyncSession = Depends(get_async_db)):
+    face_feature = await db.get(FaceFeature, face_feature_id)
     if not face_feature:
         raise HTTPException(status_code=404, detail="Face feature not found")
-    db.delete(face_feature)
-    db.commit()
+    # user_profiles is never loaded, so the ORM does not clear the links (SQLite may not enforce ON DELETE CASCADE)
+    await db.execute(
+        delete(user_profile_face_features).where(user_profile_face_features.c.face_feature_id == face_feature_id)
+    )
+    await db.delete(face_feature)
+    await db.commit()
+    face_features_cache.invalidate()
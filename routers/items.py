@@ -1,64 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from auth import get_current_user
-from database import get_db
+from auth import AuthenticatedUser, get_current_user
+from database import get_async_db
 from models.item import Item
-from models.user import User
+from pagination import paginate, set_next_cursor
 from schemas.item import ItemCreate, ItemUpdate, ItemResponse
 
 router = APIRouter(prefix="/items", tags=["items"])
 
 
 @router.get("/", response_model=list[ItemResponse])
-def list_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """List all items with pagination."""
-    items = db.query(Item).offset(skip).limit(limit).all()
+async def list_items(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """List all items with pagination (``cursor`` from X-Next-Cursor, or ``skip``)."""
+    stmt = paginate(select(Item), Item.id, skip=skip, limit=limit, cursor=cursor)
+    items = (await db.scalars(stmt)).all()
+    set_next_cursor(request, response, items, limit)
     return items
 
 
 @router.post("/", response_model=ItemResponse)
-def create_item(
+async def create_item(
     item: ItemCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: AuthenticatedUser = Depends(get_current_user),
 ):
     """Create a new item (requires authentication)."""
     db_item = Item(**item.model_dump())
     db.add(db_item)
-    db.commit()
-    db.refresh(db_item)
+    await db.commit()
+    await db.refresh(db_item)
     return db_item
 
 
 @router.get("/{item_id}", response_model=ItemResponse)
-def get_item(item_id: int, db: Session = Depends(get_db)):
+async def get_item(item_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a single item by ID."""
-    item = db.query(Item).filter(Item.id == item_id).first()
+    item = await db.get(Item, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     return item
 
 
 @router.patch("/{item_id}", response_model=ItemResponse)
-def update_item(item_id: int, item_update: ItemUpdate, db: Session = Depends(get_db)):
+async def update_item(item_id: int, item_update: ItemUpdate, db: AsyncSession = Depends(get_async_db)):
     """Update an item."""
-    item = db.query(Item).filter(Item.id == item_id).first()
+    item = await db.get(Item, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     update_data = item_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(item, key, value)
-    db.commit()
-    db.refresh(item)
+    await db.commit()
+    await db.refresh(item)
     return item
 
 
 @router.delete("/{item_id}", status_code=204)
-def delete_item(item_id: int, db: Session = Depends(get_db)):
+async def delete_item(item_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete an item."""
-    item = db.query(Item).filter(Item.id == item_id).first()
+    item = await db.get(Item, item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    db.delete(item)
-    db.commit()
+    await db.delete(item)
+    await db.commit()
@@ -1,53 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from bulk import bulk_write, read_bulk_rows
+from database import get_async_db
+from http_cache import CATALOG_CACHE_CONTROL, check_conditional
 from models.phenotype import Phenotype
+from pagination import paginate_list, set_next_cursor
+from reference_cache import phenotypes_cache
+from schemas.bulk import BulkResult
 from schemas.phenotype import PhenotypeCreate, PhenotypeUpdate, PhenotypeResponse
 
 router = APIRouter(prefix="/phenotypes", tags=["phenotypes"])
 
 
 @router.get("/", response_model=list[PhenotypeResponse])
-def list_phenotypes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    phenotypes = db.query(Phenotype).offset(skip).limit(limit).all()
+async def list_phenotypes(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    snapshot = await phenotypes_cache.get(db)
+    not_modified = check_conditional(
+        request, response, snapshot.validators(extra=(skip, limit, cursor)), CATALOG_CACHE_CONTROL
+    )
+    if not_modified is not None:
+        return not_modified
+    phenotypes = paginate_list(snapshot.items, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(request, response, phenotypes, limit)
     return phenotypes
 
 
 @router.post("/", response_model=PhenotypeResponse)
-def create_phenotype(phenotype: PhenotypeCreate, db: Session = Depends(get_db)):
+async def create_phenotype(phenotype: PhenotypeCreate, db: AsyncSession = Depends(get_async_db)):
     db_phenotype = Phenotype(**phenotype.model_dump())
     db.add(db_phenotype)
-    db.commit()
-    db.refresh(db_phenotype)
+    await db.commit()
+    phenotypes_cache.invalidate()
+    await db.refresh(db_phenotype)
     return db_phenotype
 
 
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_create_phenotypes(request: Request, upsert: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """JSON array or NDJSON of PhenotypeCreate; ``upsert=true`` updates rows whose name exists."""
+    result = await bulk_write(db, Phenotype, PhenotypeCreate, await read_bulk_rows(request), upsert=upsert)
+    phenotypes_cache.invalidate()
+    return result
+
+
 @router.get("/{phenotype_id}", response_model=PhenotypeResponse)
-def get_phenotype(phenotype_id: int, db: Session = Depends(get_db)):
-    phenotype = db.query(Phenotype).filter(Phenotype.id == phenotype_id).first()
+async def get_phenotype(phenotype_id: int, db: AsyncSession = Depends(get_async_db)):
+    phenotype = (await phenotypes_cache.get(db)).get(phenotype_id)
+    if phenotype is None:
+        # May have been created by another worker since the last version check
+        phenotype = await db.get(Phenotype, phenotype_id)
     if not phenotype:
         raise HTTPException(status_code=404, detail="Phenotype not found")
     return phenotype
 
 
 @router.patch("/{phenotype_id}", response_model=PhenotypeResponse)
-def update_phenotype(phenotype_id: int, phenotype_update: PhenotypeUpdate, db: Session = Depends(get_db)):
-    phenotype = db.query(Phenotype).filter(Phenotype.id == phenotype_id).first()
+async def update_phenotype(phenotype_id: int, phenotype_update: PhenotypeUpdate, db: AsyncSession = Depends(get_async_db)):
+    phenotype = await db.get(Phenotype, phenotype_id)
     if not phenotype:
         raise HTTPException(status_code=404, detail="Phenotype not found")
     update_data = phenotype_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(phenotype, key, value)
-    db.commit()
-    db.refresh(phenotype)
+    await db.commit()
+    phenotypes_cache.invalidate()
+    await db.refresh(phenotype)
     return phenotype
 
 
 @router.delete("/{phenotype_id}", status_code=204)
-def delete_phenotype(phenotype_id: int, db: Session = Depends(get_db)):
-    phenotype = db.query(Phenotype).filter(Phenotype.id == phenotype_id).first()
+async def delete_phenotype(phenotype_id: int, db: AsyncSession = Depends(get_async_db)):
+    phenotype = await db.get(Phenotype, phenotype_id)
     if not phenotype:
         raise HTTPException(status_code=404, detail="Phenotype not found")
-    db.delete(phenotype)
-    db.commit()
+    await db.delete(phenotype)
+    await db.commit()
+    phenotypes_cache.invalidate()
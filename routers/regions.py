@@ -1,53 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import get_db
+from bulk import bulk_write, read_bulk_rows
+from database import get_async_db
+from http_cache import CATALOG_CACHE_CONTROL, check_conditional
 from models.region import Region
+from pagination import paginate_list, set_next_cursor
+from reference_cache import regions_cache
+from schemas.bulk import BulkResult
 from schemas.region import RegionCreate, RegionUpdate, RegionResponse
 
 router = APIRouter(prefix="/regions", tags=["regions"])
 
 
 @router.get("/", response_model=list[RegionResponse])
-def list_regions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    regions = db.query(Region).offset(skip).limit(limit).all()
+async def list_regions(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    snapshot = await regions_cache.get(db)
+    not_modified = check_conditional(
+        request, response, snapshot.validators(extra=(skip, limit, cursor)), CATALOG_CACHE_CONTROL
+    )
+    if not_modified is not None:
+        return not_modified
+    regions = paginate_list(snapshot.items, skip=skip, limit=limit, cursor=cursor)
+    set_next_cursor(request, response, regions, limit)
     return regions
 
 
 @router.post("/", response_model=RegionResponse)
-def create_region(region: RegionCreate, db: Session = Depends(get_db)):
+async def create_region(region: RegionCreate, db: AsyncSession = Depends(get_async_db)):
     db_region = Region(**region.model_dump())
     db.add(db_region)
-    db.commit()
-    db.refresh(db_region)
+    await db.commit()
+    regions_cache.invalidate()
+    await db.refresh(db_region)
     return db_region
 
 
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_create_regions(request: Request, upsert: bool = False, db: AsyncSession = Depends(get_async_db)):
+    """JSON array or NDJSON of RegionCreate; ``upsert=true`` updates rows whose name exists."""
+    result = await bulk_write(db, Region, RegionCreate, await read_bulk_rows(request), upsert=upsert)
+    regions_cache.invalidate()
+    return result
+
+
 @router.get("/{region_id}", response_model=RegionResponse)
-def get_region(region_id: int, db: Session = Depends(get_db)):
-    region = db.query(Region).filter(Region.id == region_id).first()
+async def get_region(region_id: int, db: AsyncSession = Depends(get_async_db)):
+    region = (await regions_cache.get(db)).get(region_id)
+    if region is None:
+        # May have been created by another worker since the last version check
+        region = await db.get(Region, region_id)
     if not region:
         raise HTTPException(status_code=404, detail="Region not found")
     return region
 
 
 @router.patch("/{region_id}", response_model=RegionResponse)
-def update_region(region_id: int, region_update: RegionUpdate, db: Session = Depends(get_db)):
-    region = db.query(Region).filter(Region.id == region_id).first()
+async def update_region(region_id: int, region_update: RegionUpdate, db: AsyncSession = Depends(get_async_db)):
+    region = await db.get(Region, region_id)
     if not region:
         raise HTTPException(status_code=404, detail="Region not found")
     update_data = region_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(region, key, value)
-    db.commit()
-    db.refresh(region)
+    await db.commit()
+    regions_cache.invalidate()
+    await db.refresh(region)
     return region
 
 
 @router.delete("/{region_id}", status_code=204)
-def delete_region(region_id: int, db: Session = Depends(get_db)):
-    region = db.query(Region).filter(Region.id == region_id).first()
+async def delete_region(region_id: int, db: AsyncSession = Depends(get_async_db)):
+    region = await db.get(Region, region_id)
     if not region:
         raise HTTPException(status_code=404, detail="Region not found")
-    db.delete(region)
-    db.commit()
+    await db.delete(region)
+    await db.commit()
+    regions_cache.invalidate()
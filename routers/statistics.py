@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_db
+from http_cache import CATALOG_CACHE_CONTROL, Validators, check_conditional, make_etag
+from models.region_phenotype_stat import RegionPhenotypeStat
+from phenotype_stats import DIMENSIONS, PROFILES
+from reference_cache import regions_cache
+from schemas.statistics import RegionStatistics
+
+router = APIRouter(prefix="/statistics", tags=["statistics"])
+
+
+async def _region_statistics(
+    db: AsyncSession, region_id: int | None = None
+) -> tuple[list[RegionStatistics], Validators]:
+    """
+    The statistics and their validators. The counters change with every profile write, so the ETag is taken
+    from the (small) counter rows themselves rather than a table version.
+    """
+    snapshot = await regions_cache.get(db)
+    regions = snapshot.items
+    stmt = select(
+        RegionPhenotypeStat.region_id,
+        RegionPhenotypeStat.dimension,
+        RegionPhenotypeStat.value,
+        RegionPhenotypeStat.count,
+    ).order_by(
+        RegionPhenotypeStat.region_id,
+        RegionPhenotypeStat.dimension,
+        RegionPhenotypeStat.count.desc(),
+        RegionPhenotypeStat.value,
+    )
+    if region_id is not None:
+        regions = [r for r in regions if r.id == region_id]
+        stmt = stmt.where(RegionPhenotypeStat.region_id == region_id)
+    stats = {
+        r.id: RegionStatistics(
+            region_id=r.id,
+            region_name=r.name,
+            region_view_name=r.view_name,
+            profiles=0,
+            **{dimension: {} for dimension in DIMENSIONS},
+        )
+        for r in regions
+    }
+    rows = (await db.execute(stmt)).all()
+    for row in rows:
+        entry = stats.get(row.region_id)
+        if entry is None:
+            continue
+        if row.dimension == PROFILES:
+            entry.profiles = row.count
+        elif row.dimension in DIMENSIONS:
+            getattr(entry, row.dimension)[row.value] = row.count
+    validators = Validators(etag=make_etag(snapshot.version, region_id, [tuple(row) for row in rows]))
+    return list(stats.values()), validators
+
+
+@router.get("/regions", response_model=list[RegionStatistics])
+async def list_region_statistics(request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    """Phenotype / face type / nose type distribution of profiles in every region."""
+    stats, validators = await _region_statistics(db)
+    not_modified = check_conditional(request, response, validators, CATALOG_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    return stats
+
+
+@router.get("/regions/{region_id}", response_model=RegionStatistics)
+async def get_region_statistics(
+    region_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    stats, validators = await _region_statistics(db, region_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="Region not found")
+    not_modified = check_conditional(request, response, validators, CATALOG_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    return stats[0]
@@ -1,15 +1,37 @@
 import base64
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Literal
 
-from database import get_db
-from models.user_profile import UserProfile
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from sqlalchemy import delete, exists, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, noload, selectinload
+
+from blob_store import blob_store, release_blob, store_blob_async
+from config import settings
+from database import get_async_db
+from face_index import face_index, sync_face_index
+from http_cache import RECORD_CACHE_CONTROL, Validators, check_conditional, get_table_versions, make_etag
+from measurements import DIMENSIONS, measurement_vector
+from models.face_feature import FaceFeature
+from models.user_profile import UserProfile, unix_timestamp
+from models.user_profile_face_feature import user_profile_face_features
+from pagination import paginate, set_next_cursor
+import phenotype_stats  # noqa: F401 - keeps region_phenotype_stats in step with profile writes
 from schemas.user_profile import (
+    LIST_DEFAULT_FIELDS,
+    PROFILE_FIELDS,
     UserProfileCreate,
     UserProfileUpdate,
+    UserProfileListItem,
     UserProfileResponse,
+    SimilarProfile,
+    SimilarityQuery,
     profile_to_response,
 )
+from thumbnails import THUMBNAIL_SIZES, generate_thumbnails, get_thumbnail
 
 router = APIRouter(prefix="/user-profiles", tags=["user-profiles"])
 
@@ -23,66 +45,288 @@ def _decode_base64(value: str | None) -> bytes | None:
         return None
 
 
-@router.get("/", response_model=list[UserProfileResponse])
-def list_user_profiles(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    profiles = db.query(UserProfile).offset(skip).limit(limit).all()
-    return [profile_to_response(p) for p in profiles]
+async def _set_face_features(db: AsyncSession, profile_id: int, face_feature_ids: list[int]) -> bool:
+    """
+    Make the profile's links equal ``face_feature_ids`` with one DELETE and one INSERT ... SELECT,
+    touching only the rows that change. Unknown feature IDs are ignored. Returns True if anything changed.
+    """
+    link = user_profile_face_features.c
+    wanted = set(face_feature_ids)
+    removed = await db.execute(
+        delete(user_profile_face_features).where(
+            link.user_profile_id == profile_id,
+            link.face_feature_id.not_in(wanted),
+        )
+    )
+    changed = removed.rowcount > 0
+    if wanted:
+        added = await db.execute(
+            insert(user_profile_face_features).from_select(
+                ["user_profile_id", "face_feature_id"],
+                select(literal(profile_id), FaceFeature.id).where(
+                    FaceFeature.id.in_(wanted),
+                    ~exists().where(link.user_profile_id == profile_id, link.face_feature_id == FaceFeature.id),
+                ),
+            )
+        )
+        changed = changed or added.rowcount > 0
+    return changed
+
 
+# Response field -> columns it needs (face_features is a relationship, handled separately)
+_FIELD_COLUMNS = {
+    "id": (UserProfile.id,),
+    "region_id": (UserProfile.region_id,),
+    "phenotype_analyze": (UserProfile.phenotype_analyze,),
+    "original_image_base64": (UserProfile.original_image_hash,),
+    "analyzed_image_base64": (UserProfile.analyzed_image_hash,),
+    "create_time": (UserProfile.create_time,),
+    "update_time": (UserProfile.update_time,),
+    "face_features": (),
+}
 
-@router.post("/", response_model=UserProfileResponse)
-def create_user_profile(profile: UserProfileCreate, db: Session = Depends(get_db)):
-    from models.face_feature import FaceFeature
 
+def _parse_fields(fields: str | None) -> tuple[str, ...]:
+    if not fields:
+        return LIST_DEFAULT_FIELDS
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in PROFILE_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(PROFILE_FIELDS)}",
+        )
+    return requested
+
+
+@router.get("/", response_model=list[UserProfileListItem], response_model_exclude_unset=True)
+async def list_user_profiles(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    fields: str | None = None,
+    face_feature_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    List profiles. ``fields`` is a comma-separated projection (default: everything except images);
+    only the columns backing the requested fields are loaded. Page with ``cursor`` (X-Next-Cursor) or ``skip``.
+    ``face_feature_id`` keeps only profiles linked to that feature.
+    """
+    selected = _parse_fields(fields)
+    columns = [UserProfile.id] + [c for f in selected for c in _FIELD_COLUMNS[f]]
+    relation = (
+        selectinload(UserProfile.face_features)
+        if "face_features" in selected
+        else noload(UserProfile.face_features)
+    )
+    stmt = select(UserProfile).options(load_only(*columns), relation)
+    if face_feature_id is not None:
+        stmt = stmt.join(
+            user_profile_face_features,
+            user_profile_face_features.c.user_profile_id == UserProfile.id,
+        ).where(user_profile_face_features.c.face_feature_id == face_feature_id)
+    stmt = paginate(
+        stmt,
+        UserProfile.id,
+        skip=skip,
+        limit=limit,
+        cursor=cursor,
+    )
+    profiles = (await db.scalars(stmt)).all()
+    set_next_cursor(request, response, profiles, limit)
+    if any(f.endswith("_image_base64") for f in selected):
+        # Reading and encoding images is blocking work
+        return await run_in_threadpool(lambda: [profile_to_response(p, selected) for p in profiles])
+    return [profile_to_response(p, selected) for p in profiles]
+
+
+@router.post("/", response_model=UserProfileResponse)
+async def create_user_profile(
+    profile: UserProfileCreate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+):
     db_profile = UserProfile(
         region_id=profile.region_id,
         phenotype_analyze=profile.phenotype_analyze,
-        original_image=_decode_base64(profile.original_image_base64),
-        analyzed_image=_decode_base64(profile.analyzed_image_base64),
+        original_image_hash=await store_blob_async(db, _decode_base64(profile.original_image_base64)),
+        analyzed_image_hash=await store_blob_async(db, _decode_base64(profile.analyzed_image_base64)),
+        face_features=[],
     )
     db.add(db_profile)
-    db.flush()  # get db_profile.id before setting face_features
+    await db.flush()  # get db_profile.id before linking face features
     if profile.face_feature_ids:
-        face_features = db.query(FaceFeature).filter(FaceFeature.id.in_(profile.face_feature_ids)).all()
-        db_profile.face_features = face_features
-    db.commit()
-    db.refresh(db_profile)
-    return profile_to_response(db_profile)
+        await _set_face_features(db, db_profile.id, profile.face_feature_ids)
+    await db.commit()
+    await db.refresh(db_profile)
+    face_index.upsert(db_profile.id, db_profile.region_id, db_profile.measurement_vector)
+    background_tasks.add_task(generate_thumbnails, db_profile.original_image_hash)
+    background_tasks.add_task(generate_thumbnails, db_profile.analyzed_image_hash)
+    return await run_in_threadpool(profile_to_response, db_profile)
+
+
+async def _find_similar(
+    vector: list[float],
+    k: int,
+    region_id: int | None,
+    exclude_id: int | None = None,
+) -> list[SimilarProfile]:
+    if not 1 <= k <= settings.FACE_INDEX_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {settings.FACE_INDEX_MAX_K}")
+    if face_index.sync_due():
+        await run_in_threadpool(sync_face_index)
+    matches = await run_in_threadpool(face_index.search, vector, k, region_id, exclude_id)
+    return [SimilarProfile(id=i, region_id=r, distance=d) for i, r, d in matches]
+
+
+@router.post("/similar", response_model=list[SimilarProfile])
+async def find_similar_profiles(query: SimilarityQuery):
+    """Profiles with the closest face-mesh measurements to the given vector or analysis."""
+    vector = query.measurements if query.measurements is not None else measurement_vector(query.phenotype_analyze)
+    if vector is None or len(vector) != DIMENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Provide measurements ({DIMENSIONS} values) or a phenotype_analyze with face-mesh measurements",
+        )
+    return await _find_similar(vector, query.k, query.region_id)
+
+
+@router.get("/{profile_id}/similar", response_model=list[SimilarProfile])
+async def get_similar_profiles(
+    profile_id: int,
+    k: int = 10,
+    region_id: int | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Profiles whose face-mesh measurements are closest to this profile's (optionally in one region)."""
+    row = (await db.execute(
+        select(UserProfile.measurement_vector).where(UserProfile.id == profile_id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="User profile not found")
+    if row.measurement_vector is None:
+        raise HTTPException(status_code=422, detail="User profile has no face-mesh measurements")
+    return await _find_similar(row.measurement_vector, k, region_id, exclude_id=profile_id)
 
 
 @router.get("/{profile_id}", response_model=UserProfileResponse)
-def get_user_profile(profile_id: int, db: Session = Depends(get_db)):
-    profile = db.query(UserProfile).filter(UserProfile.id == profile_id).first()
+async def get_user_profile(
+    profile_id: int,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db),
+):
+    profile = await db.get(UserProfile, profile_id)
     if not profile:
         raise HTTPException(status_code=404, detail="User profile not found")
-    return profile_to_response(profile)
+    # update_time has 1s resolution, so the ETag covers the row's own values too; the face_features
+    # version catches renames of linked features. A 304 skips reading and encoding the images.
+    versions = await db.run_sync(get_table_versions, FaceFeature.__tablename__)
+    validators = Validators(
+        etag=make_etag(
+            profile_id,
+            profile.update_time,
+            profile.region_id,
+            profile.original_image_hash,
+            profile.analyzed_image_hash,
+            profile.phenotype_analyze,
+            sorted(f.id for f in profile.face_features),
+            versions[FaceFeature.__tablename__],
+        ),
+        last_modified=datetime.fromtimestamp(profile.update_time, timezone.utc),
+    )
+    not_modified = check_conditional(request, response, validators, RECORD_CACHE_CONTROL)
+    if not_modified is not None:
+        return not_modified
+    return await run_in_threadpool(profile_to_response, profile)
 
 
-@router.patch("/{profile_id}", response_model=UserProfileResponse)
-def update_user_profile(profile_id: int, profile_update: UserProfileUpdate, db: Session = Depends(get_db)):
-    from models.face_feature import FaceFeature
+@router.get("/{profile_id}/image/{kind}")
+async def get_user_profile_image(
+    profile_id: int,
+    kind: Literal["original", "analyzed"],
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Raw bytes of one profile image, streamed from the blob store."""
+    row = (await db.execute(
+        select(UserProfile.original_image_hash, UserProfile.analyzed_image_hash)
+        .where(UserProfile.id == profile_id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="User profile not found")
+    digest = row.original_image_hash if kind == "original" else row.analyzed_image_hash
+    if not digest or not blob_store.path_for(digest).exists():
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(blob_store.path_for(digest), media_type=blob_store.media_type(digest))
+
+
+@router.get("/{profile_id}/image/{kind}/thumbnail")
+async def get_user_profile_thumbnail(
+    profile_id: int,
+    kind: Literal["original", "analyzed"],
+    size: int = THUMBNAIL_SIZES[0],
+    db: AsyncSession = Depends(get_async_db),
+):
+    """WebP thumbnail (``size`` = longest side, one of THUMBNAIL_SIZES) of a profile image."""
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid size. Allowed: {', '.join(map(str, THUMBNAIL_SIZES))}",
+        )
+    row = (await db.execute(
+        select(UserProfile.original_image_hash, UserProfile.analyzed_image_hash)
+        .where(UserProfile.id == profile_id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="User profile not found")
+    digest = row.original_image_hash if kind == "original" else row.analyzed_image_hash
+    path = await run_in_threadpool(get_thumbnail, digest, size) if digest else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(path, media_type="image/webp")
+
 
-    profile = db.query(UserProfile).filter(UserProfile.id == profile_id).first()
+@router.patch("/{profile_id}", response_model=UserProfileResponse)
+async def update_user_profile(
+    profile_id: int,
+    profile_update: UserProfileUpdate,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # The current links are diffed in SQL, never loaded
+    profile = await db.get(UserProfile, profile_id, options=[noload(UserProfile.face_features)])
     if not profile:
         raise HTTPException(status_code=404, detail="User profile not found")
     update_data = profile_update.model_dump(exclude_unset=True)
     face_feature_ids = update_data.pop("face_feature_ids", None)
     for key, value in update_data.items():
         if key in ("original_image_base64", "analyzed_image_base64"):
-            setattr(profile, key.replace("_base64", ""), _decode_base64(value))
+            column = key.replace("_base64", "_hash")
+            new_hash = await store_blob_async(db, _decode_base64(value))
+            await db.run_sync(release_blob, getattr(profile, column))
+            setattr(profile, column, new_hash)
+            background_tasks.add_task(generate_thumbnails, new_hash)
         else:
             setattr(profile, key, value)
-    if face_feature_ids is not None:
-        face_features = db.query(FaceFeature).filter(FaceFeature.id.in_(face_feature_ids)).all()
-        profile.face_features = face_features
-    db.commit()
-    db.refresh(profile)
-    return profile_to_response(profile)
+    if face_feature_ids is not None and await _set_face_features(db, profile_id, face_feature_ids):
+        # Link rows are written with Core statements, which do not touch the profile row
+        profile.update_time = unix_timestamp()
+    await db.commit()
+    profile = await db.get(UserProfile, profile_id, populate_existing=True)
+    face_index.upsert(profile.id, profile.region_id, profile.measurement_vector)
+    return await run_in_threadpool(profile_to_response, profile)
 
 
 @router.delete("/{profile_id}", status_code=204)
-def delete_user_profile(profile_id: int, db: Session = Depends(get_db)):
-    profile = db.query(UserProfile).filter(UserProfile.id == profile_id).first()
+async def delete_user_profile(profile_id: int, db: AsyncSession = Depends(get_async_db)):
+    profile = await db.get(UserProfile, profile_id)
     if not profile:
         raise HTTPException(status_code=404, detail="User profile not found")
-    db.delete(profile)
-    db.commit()
+    await db.run_sync(release_blob, profile.original_image_hash)
+    await db.run_sync(release_blob, profile.analyzed_image_hash)
+    await db.delete(profile)
+    await db.commit()
+    face_index.remove(profile_id)
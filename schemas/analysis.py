@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
@@ -23,3 +25,23 @@ class SubmitAnswersRequest(BaseModel):
     sessionId: str
     answers: dict[str, str | int | float]
 
+
+
+class AnalysisJobCreated(BaseModel):
+    """POST /api/analyze/jobs (202)."""
+    jobId: str
+    status: str
+
+
+class AnalysisJobResponse(BaseModel):
+    """GET /api/analyze/jobs/{jobId}."""
+    jobId: str
+    kind: str
+    status: str  # "queued" | "running" | "done" | "failed"
+    attempts: int
+    result: dict | list | None = None
+    annotatedImageUrl: str | None = None
+    error: str | None = None
+    createdAt: datetime
+    startedAt: datetime | None = None
+    finishedAt: datetime | None = None
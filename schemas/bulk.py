@@ -0,0 +1,18 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class BulkRowResult(BaseModel):
+    index: int  # position in the request (array index / NDJSON line order)
+    status: Literal["created", "updated", "skipped", "invalid"]
+    id: int | None = None
+    errors: list[str] | None = None
+
+
+class BulkResult(BaseModel):
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    rows: list[BulkRowResult]
@@ -22,3 +22,10 @@ class FaceFeatureResponse(FaceFeatureBase):
     id: int
     created_at: datetime
     updated_at: datetime
+
+
+class FaceFeatureUsage(BaseModel):
+    id: int
+    view_name: str
+    name: str
+    profile_count: int
@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+
+
+class RegionStatistics(BaseModel):
+    region_id: int
+    region_name: str
+    region_view_name: str
+    profiles: int
+    # value -> number of profiles, most frequent first
+    phenotype: dict[str, int]
+    face_type: dict[str, int]
+    nose_type: dict[str, int]
@@ -1,6 +1,8 @@
 import base64
 from pydantic import BaseModel, ConfigDict
 
+from blob_store import load_blob
+
 
 class UserProfileBase(BaseModel):
     region_id: int
@@ -39,25 +41,68 @@ class UserProfileResponse(UserProfileBase):
     face_features: list[FaceFeatureRef] = []
 
 
-def profile_to_response(profile) -> dict:
-    """Convert UserProfile ORM to response dict with base64-encoded images and face_features."""
-    face_features = getattr(profile, "face_features", []) or []
-    return {
-        "id": profile.id,
-        "region_id": profile.region_id,
-        "phenotype_analyze": profile.phenotype_analyze,
-        "original_image_base64": (
-            base64.b64encode(profile.original_image).decode()
-            if profile.original_image else None
-        ),
-        "analyzed_image_base64": (
-            base64.b64encode(profile.analyzed_image).decode()
-            if profile.analyzed_image else None
-        ),
-        "create_time": profile.create_time,
-        "update_time": profile.update_time,
-        "face_features": [
+class UserProfileListItem(BaseModel):
+    """List entry; only the fields requested via ``fields=`` are present."""
+
+    id: int | None = None
+    region_id: int | None = None
+    phenotype_analyze: dict | list | None = None
+    original_image_base64: str | None = None
+    analyzed_image_base64: str | None = None
+    create_time: int | None = None
+    update_time: int | None = None
+    face_features: list[FaceFeatureRef] | None = None
+
+
+class SimilarityQuery(BaseModel):
+    """Either a measurement vector (MEASUREMENT_KEYS order) or a phenotype_analyze blob containing measurements."""
+    measurements: list[float] | None = None
+    phenotype_analyze: dict | None = None
+    k: int = 10
+    region_id: int | None = None
+
+
+class SimilarProfile(BaseModel):
+    id: int
+    region_id: int
+    distance: float
+
+
+PROFILE_FIELDS = (
+    "id",
+    "region_id",
+    "phenotype_analyze",
+    "original_image_base64",
+    "analyzed_image_base64",
+    "create_time",
+    "update_time",
+    "face_features",
+)
+# Images are opt-in for lists; fetch them per profile via GET /user-profiles/{id}/image/{kind}
+LIST_DEFAULT_FIELDS = tuple(f for f in PROFILE_FIELDS if not f.endswith("_image_base64"))
+
+
+def _encode_blob(digest: str | None) -> str | None:
+    data = load_blob(digest)
+    return base64.b64encode(data).decode() if data else None
+
+
+def profile_to_response(profile, fields: tuple[str, ...] = PROFILE_FIELDS) -> dict:
+    """
+    Convert UserProfile ORM to response dict with base64-encoded images and face_features.
+    Only keys listed in ``fields`` are built, so unrequested images are never read or encoded.
+    """
+    getters = {
+        "id": lambda: profile.id,
+        "region_id": lambda: profile.region_id,
+        "phenotype_analyze": lambda: profile.phenotype_analyze,
+        "original_image_base64": lambda: _encode_blob(profile.original_image_hash),
+        "analyzed_image_base64": lambda: _encode_blob(profile.analyzed_image_hash),
+        "create_time": lambda: profile.create_time,
+        "update_time": lambda: profile.update_time,
+        "face_features": lambda: [
             {"id": f.id, "view_name": f.view_name, "name": f.name}
-            for f in face_features
+            for f in (getattr(profile, "face_features", []) or [])
         ],
     }
+    return {field: getters[field]() for field in fields}
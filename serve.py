@@ -0,0 +1,203 @@
+"""
+Preload-then-fork server for running several workers on one node.
+
+    python serve.py --host 0.0.0.0 --port 8000 --workers 4
+
+``uvicorn main:app --workers N`` starts N fresh interpreters. Each one loads
+the landmark model and the YOLO weights on its first analysis request, so N
+workers hold N copies. Here the master imports the app and loads the weights
+once, then forks the workers, which share those pages instead of copying them:
+
+- The models' tensors are moved to shared memory (``share_memory()``). Those
+  pages are mapped shared and are never copied on write.
+- ``gc.freeze()`` runs right before forking. It moves every object that exists
+  at that point out of the collector's reach, so collections in the workers do
+  not write to (and copy) the pages the master's objects live on.
+- Nothing runs inference in the master. torch's thread pool and MediaPipe's
+  graph threads would not survive the fork. MediaPipe graphs (FaceMesh,
+  FaceDetection) are small and are still created in each worker, as before.
+  With CUDA the landmark model is not preloaded, because a CUDA context cannot
+  be used after fork.
+
+The master restarts workers that exit, for example when they crash or recycle
+themselves at MEMORY_RECYCLE_RSS_MB. Replacements start from the preloaded
+pages again. SIGTERM or SIGINT to the master shuts all workers down gracefully.
+SIGUSR1 logs each worker's RSS / PSS / shared / private memory. ``--preload
+worker`` loads a private copy in every worker instead, for comparison (see
+benchmarks/worker_memory.py). Needs os.fork (Linux, macOS).
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Callable
+
+import uvicorn
+
+from memory import MB, memory_breakdown
+
+logger = logging.getLogger("uvicorn.error")
+
+# A worker that dies sooner than this after starting is probably failing at startup; pace its restarts
+MIN_WORKER_UPTIME = 5.0
+
+
+def preload_models(share: bool) -> None:
+    """Load the analyzer weights into their module-level caches; ``share`` moves the tensors to shared memory."""
+    from config import settings
+
+    try:
+        import torch
+        from analyzer.tui import _get_model
+    except ImportError as e:
+        logger.warning("Landmark model not preloaded: %s", e)
+    else:
+        if share and torch.cuda.is_available():
+            logger.warning("Landmark model not preloaded: CUDA is available and does not survive fork")
+        else:
+            started = time.perf_counter()
+            try:
+                model, _ = _get_model(settings.LANDMARK_WEIGHTS_PATH)
+            except OSError as e:
+                logger.warning("Landmark model not preloaded: %s", e)
+            else:
+                if share:
+                    model.share_memory()
+                logger.info("Loaded landmark model in %.1f s", time.perf_counter() - started)
+
+    try:
+        from analyzer.phenotype import _get_yolo_model
+    except ImportError as e:
+        logger.warning("YOLO model not preloaded: %s", e)
+        return
+    started = time.perf_counter()
+    try:
+        yolo = _get_yolo_model(settings.PHENOTYPE_WEIGHTS_PATH)
+    except OSError as e:
+        logger.warning("YOLO model not preloaded: %s", e)
+        return
+    # The predictor fuses conv+bn on first use, which would replace the shared weights with per-worker copies
+    yolo.fuse()
+    if share:
+        yolo.model.share_memory()
+    logger.info("Loaded YOLO model in %.1f s", time.perf_counter() - started)
+
+
+def _format_memory(pid: int | str) -> str:
+    breakdown = memory_breakdown(pid)
+    if breakdown is None:
+        return "memory n/a"
+    return ", ".join(f"{key} {value / MB:.0f} MB" for key, value in breakdown.items())
+
+
+def _run_worker(config: uvicorn.Config, sock, preload: str) -> None:
+    if preload == "worker":
+        preload_models(share=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _reset_child() -> None:
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    # Own process group: Ctrl+C reaches only the master, which then stops each worker once
+    os.setpgid(0, 0)
+    gc.enable()
+
+
+def supervise(target: Callable[[], None], workers: int) -> None:
+    """Fork ``workers`` processes running ``target`` and keep that many alive until SIGTERM/SIGINT."""
+    children: dict[int, float] = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _reset_child()
+                target()
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                logger.exception("Worker %d failed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+        logger.info("Started worker %d", pid)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(signum, frame) -> None:
+        logger.info("Master %d: %s", os.getpid(), _format_memory("self"))
+        for pid in list(children):
+            logger.info("Worker %d: %s", pid, _format_memory(pid))
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, report)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        pid, status = os.wait()
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        logger.warning("Worker %d exited with code %d", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started < MIN_WORKER_UPTIME:
+            time.sleep(1)
+        if not stopping:
+            spawn()
+    logger.info("All workers stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--preload", choices=("master", "worker", "off"), default="master",
+        help="load weights once before forking (shared), in every worker after forking, or lazily on first use",
+    )
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--proxy-headers", action="store_true")
+    args = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs os.fork; use `uvicorn main:app --workers N` on this platform")
+
+    # Objects created from here on are frozen before forking instead of being collected
+    gc.disable()
+    from main import app
+    from database import engine, upgrade_database
+
+    config = uvicorn.Config(
+        app, host=args.host, port=args.port, log_level=args.log_level, proxy_headers=args.proxy_headers,
+    )
+    if args.preload == "master":
+        preload_models(share=True)
+    # Once here rather than racing in every worker's lifespan; pooled connections must not cross the fork
+    upgrade_database()
+    engine.dispose()
+    sock = config.bind_socket()
+    gc.collect()
+    gc.freeze()
+    gc.enable()
+    logger.info("Master %d ready (%s)", os.getpid(), _format_memory("self"))
+    supervise(lambda: _run_worker(config, sock, args.preload), args.workers)
+
+
+if __name__ == "__main__":
+    main()
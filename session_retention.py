@@ -0,0 +1,91 @@
+"""Retention policy for analysis sessions.
+
+Completed sessions are kept for ANALYSIS_SESSION_RETENTION_DAYS, sessions that
+never got answers for ANALYSIS_SESSION_ABANDONED_RETENTION_HOURS. Expired rows
+are deleted in batches of ANALYSIS_SESSION_PURGE_BATCH_SIZE, each in its own
+short transaction, so the purge never holds locks on the whole table; their
+image references are released and unreferenced files removed on commit.
+
+Nothing is purged unless enabled: the app runs the purge every
+ANALYSIS_SESSION_PURGE_INTERVAL seconds when that is set (default 0, off), or
+it runs by hand / from cron:
+
+    python -m session_retention
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, delete, or_, select
+
+from blob_store import release_blob
+from config import settings
+from database import SessionLocal
+from models.analysis_session import AnalysisSession
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PurgeReport:
+    rows: int = 0
+    bytes: int = 0  # image bytes whose last reference was dropped
+
+
+def _expired(now: datetime):
+    completed_before = now - timedelta(days=settings.ANALYSIS_SESSION_RETENTION_DAYS)
+    abandoned_before = now - timedelta(hours=settings.ANALYSIS_SESSION_ABANDONED_RETENTION_HOURS)
+    return or_(
+        AnalysisSession.completed_at < completed_before,
+        and_(AnalysisSession.completed_at.is_(None), AnalysisSession.created_at < abandoned_before),
+    )
+
+
+def purge_expired_sessions(now: datetime | None = None, batch_size: int | None = None) -> PurgeReport:
+    """Delete expired sessions batch by batch until none are left."""
+    now = now or datetime.utcnow()
+    batch_size = batch_size or settings.ANALYSIS_SESSION_PURGE_BATCH_SIZE
+    report = PurgeReport()
+    while True:
+        with SessionLocal() as db:
+            ids = db.scalars(
+                select(AnalysisSession.id).where(_expired(now)).order_by(AnalysisSession.id).limit(batch_size)
+            ).all()
+            if not ids:
+                break
+            # Release only what this transaction actually deleted: another worker may purge concurrently
+            deleted = db.execute(
+                delete(AnalysisSession)
+                .where(AnalysisSession.id.in_(ids))
+                .returning(AnalysisSession.original_image_hash)
+            ).scalars().all()
+            for digest in deleted:
+                report.bytes += release_blob(db, digest)
+            db.commit()
+            report.rows += len(deleted)
+        if len(ids) < batch_size:
+            break
+    return report
+
+
+async def run_purge_loop(interval: float) -> None:
+    """Purge every ``interval`` seconds until cancelled (started from the app lifespan)."""
+    while True:
+        try:
+            report = await run_in_threadpool(purge_expired_sessions)
+            if report.rows:
+                logger.info("Purged %d expired analysis sessions, %d image bytes reclaimed", report.rows, report.bytes)
+        except Exception:
+            logger.exception("Analysis session purge failed")
+        await asyncio.sleep(interval)
+
+
+def main() -> None:
+    report = purge_expired_sessions()
+    print(f"Purged {report.rows} analysis sessions, reclaimed {report.bytes} bytes of images")
+
+
+if __name__ == "__main__":
+    main()
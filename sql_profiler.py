@@ -0,0 +1,234 @@
+"""
+Per-request SQL profiling and N+1 detection.
+
+``profile_engine`` hooks cursor events on an engine (database.py does this for
+every engine, at the cost of one check per statement); each statement executed
+while a ``QueryLog`` is active is recorded with its duration and the first
+call site in this project's code. A log is active
+
+- for one request, when SQL_PROFILING is ``all``, or ``header`` and the request
+  sends ``X-SQL-Profile: 1`` (``SQLProfilerMiddleware``). The response gets an
+  ``X-SQL-Profile`` summary and a ``Server-Timing: db`` entry, and statement
+  shapes run SQL_PROFILE_REPEAT_THRESHOLD or more times are logged as N+1
+  candidates with their call sites;
+- process-wide, inside ``count_queries()`` / ``assert_max_queries(n)``, for
+  tests (the ``max_queries`` fixture in tests/conftest.py)::
+
+      with max_queries(2):
+          client.get("/api/user-profiles/")
+
+Statements issued by the SQLite write queue run in its own task and are
+only seen by the process-wide helpers.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import greenlet
+except ImportError:  # only needed to see past AsyncSession's greenlet boundary
+    greenlet = None
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-sql-profile"
+_PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__)) + os.sep
+_IGNORED_PATHS = (os.path.abspath(__file__), os.sep + "site-packages" + os.sep, os.sep + ".venv" + os.sep)
+
+# Expanded IN lists and numbered bind parameters, so that "IN (?, ?)" and "IN (?, ?, ?)" share a shape
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|\$\d+(?:::\w+)?|:\w+)\s*,)+\s*(?:\?|%s|\$\d+(?:::\w+)?|:\w+)\s*\)")
+_NUMBERED_PARAM = re.compile(r"\$\d+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass(slots=True)
+class Query:
+    statement: str
+    duration: float
+    call_site: str | None
+
+
+@dataclass
+class QueryLog:
+    queries: list[Query] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    @property
+    def total_time(self) -> float:
+        return sum(q.duration for q in self.queries)
+
+    def repeated(self, threshold: int = 2) -> list[tuple[str, int, list[str]]]:
+        """Statement shapes executed at least ``threshold`` times: (shape, count, distinct call sites)."""
+        counts = Counter(statement_shape(q.statement) for q in self.queries)
+        result = []
+        for shape, count in counts.most_common():
+            if count < threshold:
+                break
+            sites = sorted({q.call_site or "?" for q in self.queries if statement_shape(q.statement) == shape})
+            result.append((shape, count, sites))
+        return result
+
+    def summary(self, threshold: int) -> str:
+        return f"queries={len(self)}; time={self.total_time * 1000:.1f}ms; repeated={len(self.repeated(threshold))}"
+
+    def report(self, threshold: int = 2) -> str:
+        lines = [f"{len(self)} queries, {self.total_time * 1000:.1f} ms"]
+        for q in self.queries:
+            lines.append(f"  {q.duration * 1000:7.2f} ms  {q.call_site or '?'}  {_WHITESPACE.sub(' ', q.statement)[:200]}")
+        for shape, count, sites in self.repeated(threshold):
+            lines.append(f"  N+1 candidate ({count}x, from {', '.join(sites)}): {shape[:200]}")
+        return "\n".join(lines)
+
+
+_current: ContextVar[QueryLog | None] = ContextVar("sql_profiler_log", default=None)
+_collectors: list[QueryLog] = []
+_collectors_lock = threading.Lock()
+
+
+def statement_shape(statement: str) -> str:
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _PLACEHOLDER_LIST.sub("(?)", shape)
+    return _NUMBERED_PARAM.sub("?", shape)
+
+
+def _stack_frames():
+    """Innermost first; continues into parent greenlets, where AsyncSession callers live."""
+    frame = sys._getframe(2)
+    current = greenlet.getcurrent() if greenlet is not None else None
+    while True:
+        while frame is not None:
+            yield frame
+            frame = frame.f_back
+        if current is None or current.parent is None:
+            return
+        current = current.parent
+        frame = current.gr_frame
+
+
+def _call_site() -> str | None:
+    for frame in _stack_frames():
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_ROOT) and not any(p in filename for p in _IGNORED_PATHS):
+            return f"{filename[len(_PROJECT_ROOT):]}:{frame.f_lineno} ({frame.f_code.co_name})"
+    return None
+
+
+def _active_logs() -> list[QueryLog]:
+    logs = list(_collectors) if _collectors else []
+    current = _current.get()
+    if current is not None:
+        logs.append(current)
+    return logs
+
+
+def profile_engine(sync_engine) -> None:
+    """Record statements on this engine (for async engines pass ``async_engine.sync_engine``)."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if not _collectors and _current.get() is None:
+            return
+        conn.info.setdefault("sql_profiler", []).append((time.perf_counter(), _call_site()))
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        pending = conn.info.get("sql_profiler")
+        if not pending:
+            return
+        started, call_site = pending.pop()
+        query = Query(statement, time.perf_counter() - started, call_site)
+        for log in _active_logs():
+            log.queries.append(query)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(context):
+        pending = context.connection.info.get("sql_profiler") if context.connection is not None else None
+        if pending:
+            pending.pop()
+
+
+@contextmanager
+def profile() -> Iterator[QueryLog]:
+    """Record statements issued from the current context (request, task, or thread)."""
+    log = QueryLog()
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryLog]:
+    """Record every statement in the process while active (e.g. around a TestClient call)."""
+    log = QueryLog()
+    with _collectors_lock:
+        _collectors.append(log)
+    try:
+        yield log
+    finally:
+        with _collectors_lock:
+            _collectors.remove(log)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryLog]:
+    """Fail with the full query report when more than ``limit`` statements run inside the block."""
+    with count_queries() as log:
+        yield log
+    if len(log) > limit:
+        raise AssertionError(f"Expected at most {limit} queries, got {len(log)}\n{log.report()}")
+
+
+class SQLProfilerMiddleware:
+    def __init__(self, app: ASGIApp, mode: str = "header", repeat_threshold: int = 3) -> None:
+        self.app = app
+        self.mode = mode
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        with profile() as log:
+            async def send_with_summary(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers.append("X-SQL-Profile", log.summary(self.repeat_threshold))
+                    headers.append("Server-Timing", f'db;dur={log.total_time * 1000:.1f};desc="{len(log)} queries"')
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_summary)
+            finally:
+                self._log(scope, log)
+
+    def _wanted(self, scope: Scope) -> bool:
+        if self.mode == "all":
+            return True
+        return self.mode == "header" and Headers(scope=scope).get(PROFILE_HEADER, "").lower() in ("1", "true", "yes")
+
+    def _log(self, scope: Scope, log: QueryLog) -> None:
+        target = f"{scope['method']} {scope['path']}"
+        repeated = log.repeated(self.repeat_threshold)
+        if repeated:
+            for shape, count, sites in repeated:
+                logger.warning("N+1 candidate in %s: %dx from %s: %s", target, count, ", ".join(sites), shape[:300])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("SQL profile for %s\n%s", target, log.report(self.repeat_threshold))
+
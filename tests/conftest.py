@@ -0,0 +1,63 @@
+"""
+Shared fixtures. The app runs against a scratch SQLite database (created by the
+migrations in its lifespan) and a scratch blob store; settings are read when
+``config`` is first imported, so the environment is set up before that.
+"""
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+_DIRECTORY = tempfile.mkdtemp(prefix="diploma-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_DIRECTORY}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["BLOB_STORE_PATH"] = os.path.join(_DIRECTORY, "blobs")
+os.environ["ANALYSIS_SESSION_PURGE_INTERVAL"] = "0"
+os.environ["MEMORY_RECYCLE_RSS_MB"] = "0"
+os.environ["SQL_PROFILING"] = "off"
+# bcrypt's minimum work factor; the hashing itself is not under test
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+try:
+    import analyzer.tui  # noqa: F401
+except ImportError:
+    # The landmark model (torch, weights) is not under test; a fixed result, as in benchmarks/loadtest.py
+    def _analyze_face_landmarks(image_bytes, weights_path=None, draw_points=False, return_image_base64=False, **kwargs):
+        return {"points": [[0.25, 0.25], [0.75, 0.75]], "annotated_image_base64": None, "error": None}
+
+    _stub = types.ModuleType("analyzer.tui")
+    _stub.analyze_face_landmarks = _analyze_face_landmarks
+    sys.modules["analyzer.tui"] = _stub
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient with the app's lifespan running (migrations, face index, write queue)."""
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db(client):
+    """Synchronous session for setting up rows; commits are visible to the app."""
+    from database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def max_queries():
+    """``with max_queries(n) as log:`` fails the test with the query report when more than n statements run."""
+    from sql_profiler import assert_max_queries
+
+    return assert_max_queries
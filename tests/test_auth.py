@@ -0,0 +1,60 @@
+"""Registration and login around the password hashing process pool."""
+import itertools
+from concurrent.futures.process import BrokenProcessPool
+
+import passwords
+from models.user import User
+
+_serial = itertools.count()
+
+
+def _new_user() -> dict:
+    n = next(_serial)
+    return {"email": f"user{n}@example.com", "username": f"user{n}", "password": "secret-password"}
+
+
+def test_register_and_login(client):
+    data = _new_user()
+    assert client.post("/api/auth/register", json=data).status_code == 200
+    response = client.post("/api/auth/login", json={"username": data["username"], "password": data["password"]})
+    assert response.status_code == 200
+    assert response.json()["access_token"]
+
+
+def test_register_conflict_while_hashing_is_400(client, db, monkeypatch):
+    """A registration committed between the duplicate check and the insert is reported, not a 500."""
+    data = _new_user()
+    real_hash = passwords.hash_password
+
+    async def hash_and_race(password):
+        hashed = await real_hash(password)
+        db.add(User(email=data["email"], username=data["username"], hashed_password=hashed))
+        db.commit()
+        return hashed
+
+    monkeypatch.setattr("routers.auth.hash_password", hash_and_race)
+    response = client.post("/api/auth/register", json=data)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already registered"
+
+
+class _BrokenPool:
+    def submit(self, fn, *args, **kwargs):
+        raise BrokenProcessPool("a worker died")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_broken_hash_pool_is_503_and_replaced(client, monkeypatch):
+    data = _new_user()
+    assert client.post("/api/auth/register", json=data).status_code == 200
+    monkeypatch.setattr(passwords, "_pool", _BrokenPool())
+
+    response = client.post("/api/auth/login", json={"username": data["username"], "password": data["password"]})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    # The next call starts a fresh pool
+    assert passwords._pool is None
+    response = client.post("/api/auth/login", json={"username": data["username"], "password": data["password"]})
+    assert response.status_code == 200
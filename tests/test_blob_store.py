@@ -0,0 +1,104 @@
+"""Blob reference counting, removal after the last release, and the orphan sweep."""
+import base64
+import os
+
+from sqlalchemy import select
+
+import blob_store
+from blob_store import release_blob, remove_unreferenced, store_blob, sweep_orphans
+from models.blob import Blob
+from models.region import Region
+
+
+def _drain() -> None:
+    """Wait for the removals scheduled on commit/rollback (a single FIFO worker)."""
+    blob_store._removal_executor.submit(lambda: None).result()
+
+
+def _refcount(db, digest: str) -> int | None:
+    db.expire_all()
+    return db.scalar(select(Blob.refcount).where(Blob.sha256 == digest))
+
+
+def _exists(digest: str) -> bool:
+    return blob_store.blob_store.path_for(digest).exists()
+
+
+def test_identical_data_is_stored_once_and_removed_with_last_reference(db):
+    data = os.urandom(1024)
+    first = store_blob(db, data)
+    second = store_blob(db, data)
+    db.commit()
+    assert first == second
+    assert _refcount(db, first) == 2
+    assert blob_store.blob_store.read(first) == data
+
+    assert release_blob(db, first) == 0  # still referenced
+    db.commit()
+    _drain()
+    assert _exists(first)
+
+    assert release_blob(db, first) == len(data)
+    db.commit()
+    _drain()
+    assert _refcount(db, first) is None
+    assert not _exists(first)
+
+
+def test_rolled_back_reference_removes_staged_file(db):
+    data = os.urandom(512)
+    digest = blob_store.blob_store.write(data)  # staged outside the transaction, as the routers do
+    store_blob(db, data, digest)
+    db.rollback()
+    _drain()
+    assert _refcount(db, digest) is None
+    assert not _exists(digest)
+
+
+def test_reference_taken_before_removal_keeps_file(db, monkeypatch):
+    data = os.urandom(256)
+    digest = store_blob(db, data)
+    db.commit()
+    scheduled = []
+    monkeypatch.setattr(blob_store, "_schedule_removal", scheduled.append)
+    release_blob(db, digest)
+    db.commit()
+    assert scheduled == [{digest}]
+
+    # Another transaction references the digest again before the removal runs
+    store_blob(db, data)
+    db.commit()
+    assert remove_unreferenced(scheduled[0]) == 0
+    assert _refcount(db, digest) == 1
+    assert _exists(digest)
+
+
+def test_sweep_removes_only_old_unreferenced_files(db):
+    orphan = blob_store.blob_store.write(os.urandom(128))
+    kept = store_blob(db, os.urandom(128))
+    db.commit()
+
+    assert sweep_orphans(min_age=3600) == 0  # too young: may belong to an open transaction
+    assert _exists(orphan)
+    sweep_orphans(min_age=0)
+    assert not _exists(orphan)
+    assert _exists(kept)
+    assert _refcount(db, kept) == 1
+
+
+def test_profile_delete_releases_images(client, db):
+    region = Region(view_name="Blob region", name="blob-region")
+    db.add(region)
+    db.commit()
+    image = os.urandom(2048)
+    created = client.post("/api/user-profiles/", json={
+        "region_id": region.id, "original_image_base64": base64.b64encode(image).decode(),
+    })
+    assert created.status_code == 200
+    digest = blob_store.blob_store.digest(image)
+    assert _refcount(db, digest) == 1
+
+    assert client.delete(f"/api/user-profiles/{created.json()['id']}").status_code == 204
+    _drain()
+    assert _refcount(db, digest) is None
+    assert not _exists(digest)
@@ -0,0 +1,73 @@
+"""Bulk create / upsert of catalog rows, matched on ``name``."""
+import itertools
+
+import orjson
+from sqlalchemy import func, select
+
+from models.phenotype import Phenotype
+
+_serial = itertools.count()
+
+
+def _name() -> str:
+    return f"bulk-{next(_serial)}"
+
+
+def _count(db, name: str) -> int:
+    db.expire_all()
+    return db.scalar(select(func.count()).select_from(Phenotype).where(Phenotype.name == name))
+
+
+def test_create_reports_each_row(client):
+    name = _name()
+    response = client.post("/api/phenotypes/bulk", json=[
+        {"view_name": "One", "name": name},
+        {"view_name": "Missing name"},
+    ])
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["created"], result["invalid"]) == (1, 1)
+    assert [row["status"] for row in result["rows"]] == ["created", "invalid"]
+    assert result["rows"][0]["id"] is not None
+
+
+def test_upsert_updates_by_name_and_last_duplicate_wins(client, db):
+    existing, new = _name(), _name()
+    first = client.post("/api/phenotypes/bulk", json=[{"view_name": "Old", "name": existing}]).json()
+    existing_id = first["rows"][0]["id"]
+
+    response = client.post("/api/phenotypes/bulk?upsert=true", json=[
+        {"view_name": "Ignored", "name": existing},
+        {"view_name": "New", "name": new},
+        {"view_name": "Updated", "name": existing},
+    ])
+    result = response.json()
+    assert [row["status"] for row in result["rows"]] == ["skipped", "created", "updated"]
+    assert result["rows"][2]["id"] == existing_id
+    assert _count(db, existing) == 1
+    assert db.get(Phenotype, existing_id).view_name == "Updated"
+
+    # Visible through the cached catalog as well
+    listed = {item["id"]: item["view_name"] for item in client.get("/api/phenotypes/?limit=100000").json()}
+    assert listed[existing_id] == "Updated"
+
+
+def test_without_upsert_names_are_inserted_again(client, db):
+    name = _name()
+    for _ in range(2):
+        client.post("/api/phenotypes/bulk", json=[{"view_name": "Twice", "name": name}])
+    assert _count(db, name) == 2
+
+
+def test_ndjson_body(client):
+    names = [_name(), _name()]
+    body = b"\n".join(orjson.dumps({"view_name": n.upper(), "name": n}) for n in names) + b"\n"
+    response = client.post("/api/phenotypes/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["created"] == 2
+
+
+def test_too_many_rows_is_413(client, monkeypatch):
+    monkeypatch.setattr("bulk.settings.BULK_MAX_ROWS", 2)
+    rows = [{"view_name": "x", "name": _name()} for _ in range(3)]
+    assert client.post("/api/phenotypes/bulk", json=rows).status_code == 413
@@ -0,0 +1,102 @@
+"""Face index: incremental sync from the database and standardized search."""
+import pytest
+from sqlalchemy import update
+
+from database import SessionLocal
+from face_index import FaceIndex
+from measurements import DIMENSIONS
+from models.region import Region
+from models.user_profile import UserProfile, unix_timestamp
+from models.user_profile_deletion import UserProfileDeletion
+
+
+@pytest.fixture
+def index(db, monkeypatch):
+    monkeypatch.setattr("face_index.settings.FACE_INDEX_SYNC_INTERVAL", 0)
+    index = FaceIndex()
+    index.load(db)
+    return index
+
+
+@pytest.fixture
+def region_id(db):
+    region = Region(view_name="Face index region", name="face-index-region")
+    db.add(region)
+    db.commit()
+    return region.id
+
+
+def _profile(region_id: int, value: float, **kwargs) -> UserProfile:
+    return UserProfile(region_id=region_id, measurement_vector=[value] * DIMENSIONS, **kwargs)
+
+
+def _ids(index: FaceIndex, region_id: int) -> set[int]:
+    return {profile_id for profile_id, _, _ in index.search([0.0] * DIMENSIONS, k=100, region_id=region_id)}
+
+
+def test_sync_applies_inserts_updates_and_deletes(db, index, region_id):
+    kept, removed = _profile(region_id, 1.0), _profile(region_id, 2.0)
+    db.add_all([kept, removed])
+    db.commit()
+    index.sync(db)
+    assert _ids(index, region_id) == {kept.id, removed.id}
+
+    db.delete(removed)
+    kept.measurement_vector = None
+    db.commit()
+    assert db.get(UserProfileDeletion, removed.id) is not None
+    index.sync(db)
+    assert _ids(index, region_id) == set()
+
+
+def test_write_committed_after_sync_is_picked_up(db, index, region_id):
+    """A transaction flushed before a sync but committed after it has a timestamp behind the watermark."""
+    early = _profile(region_id, 4.0)
+    db.add(early)
+    db.commit()
+    now = unix_timestamp()
+    late = SessionLocal()
+    try:
+        # Flushed a minute ago (update_time is set at flush), still open while another worker syncs
+        profile = _profile(region_id, 3.0, create_time=now - 60, update_time=now - 60)
+        late.add(profile)
+        late.flush()
+        late_id = profile.id
+        index.sync(db)
+        assert _ids(index, region_id) == {early.id}
+        late.commit()
+    finally:
+        late.close()
+    index.sync(db)
+    assert _ids(index, region_id) == {early.id, late_id}
+
+
+def test_deletion_committed_after_sync_is_picked_up(db, index, region_id):
+    doomed, other = _profile(region_id, 5.0), _profile(region_id, 6.0)
+    db.add_all([doomed, other])
+    db.commit()
+    index.sync(db)
+
+    late = SessionLocal()
+    try:
+        late.delete(late.get(UserProfile, doomed.id))
+        late.flush()
+        late.execute(update(UserProfileDeletion).values(deleted_at=unix_timestamp() - 60))
+        index.sync(db)  # the deletion is not committed yet
+        assert doomed.id in _ids(index, region_id)
+        late.commit()
+    finally:
+        late.close()
+    index.sync(db)
+    assert _ids(index, region_id) == {other.id}
+
+
+def test_distances_are_standardized(db, index):
+    index.upsert(1, 1, [0.0] * DIMENSIONS)
+    index.upsert(2, 1, [10.0] + [1.0] * (DIMENSIONS - 1))
+    index.upsert(3, 1, [1.0] + [0.0] * (DIMENSIONS - 1))
+    index._update_weights()
+    # 10 units along a wide dimension are closer than 1 unit along narrow ones
+    nearest = [profile_id for profile_id, _, _ in index.search([0.0] * DIMENSIONS, k=3, region_id=1)]
+    assert nearest[0] == 1
+    assert nearest.index(3) < nearest.index(2)
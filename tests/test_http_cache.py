@@ -0,0 +1,79 @@
+"""ETag / Last-Modified validation and the table versions behind it."""
+import itertools
+import warnings
+
+from sqlalchemy import select
+
+from models.region import Region
+from models.table_version import TableVersion
+
+_serial = itertools.count()
+
+
+def _region_version(db) -> int:
+    db.expire_all()
+    return db.scalar(select(TableVersion.version).where(TableVersion.table_name == "regions")) or 0
+
+
+def _new_region(client) -> int:
+    n = next(_serial)
+    response = client.post("/api/regions/", json={"view_name": f"Cached {n}", "name": f"cached-{n}"})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_catalog_etag_changes_with_version(client, db):
+    _new_region(client)
+    first = client.get("/api/regions/")
+    etag = first.headers["ETag"]
+    assert client.get("/api/regions/", headers={"If-None-Match": etag}).status_code == 304
+
+    version = _region_version(db)
+    _new_region(client)
+    assert _region_version(db) == version + 1
+    changed = client.get("/api/regions/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_rolled_back_write_does_not_bump_version(db):
+    version = _region_version(db)
+    db.add(Region(view_name="Rolled back", name="rolled-back"))
+    db.flush()
+    db.rollback()
+    assert _region_version(db) == version
+
+
+def test_profile_validators(client):
+    region_id = _new_region(client)
+    profile_id = client.post("/api/user-profiles/", json={"region_id": region_id}).json()["id"]
+    url = f"/api/user-profiles/{profile_id}"
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", DeprecationWarning)
+        first = client.get(url)
+    assert first.status_code == 200
+    etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+
+    # Unrelated writes leave the profile's validator alone
+    client.post("/api/user-profiles/", json={"region_id": region_id})
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    client.patch(url, json={"phenotype_analyze": {"phenotype": "changed"}})
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["phenotype_analyze"] == {"phenotype": "changed"}
+
+
+def test_usage_etag_follows_links(client):
+    region_id = _new_region(client)
+    n = next(_serial)
+    feature_id = client.post("/api/face-features/", json={"view_name": f"Usage {n}", "name": f"usage-{n}"}).json()["id"]
+    etag = client.get("/api/face-features/usage").headers["ETag"]
+    assert client.get("/api/face-features/usage", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/api/user-profiles/", json={"region_id": region_id, "face_feature_ids": [feature_id]})
+    changed = client.get("/api/face-features/usage", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert {row["id"]: row["profile_count"] for row in changed.json()}[feature_id] == 1
@@ -0,0 +1,115 @@
+"""Analysis job queue: claims, leases, retry backoff, and the worker surviving database errors."""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, update
+from sqlalchemy.exc import OperationalError
+
+import jobs
+import worker
+from config import settings
+from models.analysis_job import AnalysisJob
+
+
+@pytest.fixture
+def job(db):
+    """One queued landmarks job; the queue is emptied first so claims only see it."""
+    db.execute(delete(AnalysisJob))
+    job_id = jobs.enqueue_job(db, "landmarks", {"quality": "full"}, b"image bytes")
+    db.commit()
+    return job_id
+
+
+def _row(db, job_id: str) -> AnalysisJob:
+    db.expire_all()
+    return db.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).one()
+
+
+def _expire_lease(db, job_id: str) -> None:
+    db.execute(
+        update(AnalysisJob).where(AnalysisJob.job_id == job_id)
+        .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+    )
+    db.commit()
+
+
+def test_claim_is_exclusive_and_filtered_by_kind(db, job):
+    assert jobs.claim_jobs("worker-p", ("phenotype",)) == []
+    claimed = jobs.claim_jobs("worker-a")
+    assert [row.job_id for row in claimed] == [job]
+    assert claimed[0].attempts == 1
+    assert jobs.claim_jobs("worker-b") == []
+    assert _row(db, job).status == "running"
+
+
+def test_lost_lease_cannot_overwrite_new_owner(db, job):
+    first = jobs.claim_jobs("worker-a")[0]
+    _expire_lease(db, job)
+    second = jobs.claim_jobs("worker-b")[0]
+    assert second.attempts == 2
+
+    assert jobs.extend_lease(first.id, "worker-a") is False
+    assert jobs.complete_job(first.id, "worker-a", {"points": []}) is False
+    assert jobs.fail_job(first, "worker-a", "late", retry=True) is None
+    assert jobs.complete_job(second.id, "worker-b", {"points": [[1, 2]]}) is True
+    row = _row(db, job)
+    assert (row.status, row.worker_id, row.result) == ("done", "worker-b", {"points": [[1, 2]]})
+
+
+def test_retry_backoff_then_failure(db, job):
+    delays = []
+    for attempt in range(1, settings.ANALYSIS_JOB_MAX_ATTEMPTS + 1):
+        claimed = jobs.claim_jobs("worker-a")
+        assert [row.attempts for row in claimed] == [attempt]
+        before = datetime.utcnow()
+        status = jobs.fail_job(claimed[0], "worker-a", "RuntimeError: boom", retry=True)
+        row = _row(db, job)
+        if attempt < settings.ANALYSIS_JOB_MAX_ATTEMPTS:
+            assert status == "queued"
+            delays.append((row.available_at - before).total_seconds())
+            # Not due yet
+            assert jobs.claim_jobs("worker-a") == []
+            db.execute(update(AnalysisJob).where(AnalysisJob.job_id == job).values(available_at=datetime.utcnow()))
+            db.commit()
+        else:
+            assert status == "failed"
+            assert row.error == "RuntimeError: boom"
+    base = settings.ANALYSIS_JOB_RETRY_DELAY
+    assert delays == pytest.approx([base * 2 ** i for i in range(len(delays))], abs=1)
+
+
+def test_job_failed_is_not_retried(db, job):
+    claimed = jobs.claim_jobs("worker-a")[0]
+    assert jobs.fail_job(claimed, "worker-a", "Face not detected", retry=False) == "failed"
+
+
+def test_expired_last_attempt_is_failed_by_maintenance(db, job):
+    db.execute(update(AnalysisJob).where(AnalysisJob.job_id == job).values(max_attempts=1))
+    db.commit()
+    jobs.claim_jobs("worker-a")
+    _expire_lease(db, job)
+    assert jobs.claim_jobs("worker-b") == []
+    assert jobs.fail_abandoned_jobs() == 1
+    assert _row(db, job).status == "failed"
+
+
+def test_worker_completes_job(db, job, monkeypatch):
+    monkeypatch.setattr(worker, "run_job", lambda row, quality: ({"points": [[0, 0]], "quality": quality}, None))
+    analysis_worker = worker.AnalysisWorker(("landmarks",), poll_interval=0)
+    analysis_worker.process(jobs.claim_jobs(analysis_worker.worker_id)[0])
+    row = _row(db, job)
+    assert (row.status, row.result) == ("done", {"points": [[0, 0]], "quality": "full"})
+
+
+def test_worker_survives_failing_outcome_write(db, job, monkeypatch):
+    def locked(*args, **kwargs):
+        raise OperationalError("UPDATE analysis_jobs", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(worker, "run_job", lambda row, quality: ({"points": []}, None))
+    monkeypatch.setattr(worker, "complete_job", locked)
+    analysis_worker = worker.AnalysisWorker(("landmarks",), poll_interval=0)
+    analysis_worker.process(jobs.claim_jobs(analysis_worker.worker_id)[0])
+    # Left running; claimable again once the lease expires
+    assert _row(db, job).status == "running"
+    _expire_lease(db, job)
+    assert [row.job_id for row in jobs.claim_jobs("worker-b")] == [job]
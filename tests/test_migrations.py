@@ -0,0 +1,66 @@
+"""upgrade_database on databases the app did not create through migrations."""
+from pathlib import Path
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, text
+
+import database
+
+ROOT = Path(database.__file__).resolve().parent
+
+
+@pytest.fixture
+def scratch_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path}/scratch.db")
+    monkeypatch.setattr(database, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def _config(connection) -> Config:
+    config = Config(str(ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(ROOT / "migrations"))
+    config.attributes["connection"] = connection
+    return config
+
+
+def _version(engine) -> str:
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def _head() -> str:
+    return ScriptDirectory.from_config(_config(None)).get_current_head()
+
+
+def test_new_database_is_migrated_to_head(scratch_engine):
+    database.upgrade_database()
+    assert _version(scratch_engine) == _head()
+    database.upgrade_database()  # already at head: a no-op
+    assert _version(scratch_engine) == _head()
+
+
+def test_pre_migration_database_is_stamped_and_upgraded(scratch_engine):
+    """The baseline schema made by create_all, before alembic_version existed."""
+    with scratch_engine.begin() as connection:
+        command.upgrade(_config(connection), "0001")
+        connection.execute(text("DROP TABLE alembic_version"))
+        connection.execute(text(
+            "INSERT INTO regions (view_name, name, created_at, updated_at) VALUES ('R', 'r', '2024-01-01', '2024-01-01')"
+        ))
+        connection.execute(text("INSERT INTO user_profiles (region_id, create_time, update_time) VALUES (1, 1, 1)"))
+
+    database.upgrade_database()
+    assert _version(scratch_engine) == _head()
+    with scratch_engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM user_profiles")).scalar() == 1
+
+
+def test_unknown_unversioned_schema_is_refused(scratch_engine):
+    with scratch_engine.begin() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY)"))
+    with pytest.raises(RuntimeError, match="alembic_version"):
+        database.upgrade_database()
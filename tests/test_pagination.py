@@ -0,0 +1,84 @@
+"""Keyset pagination: cursors, the Link header, and stability under concurrent inserts."""
+import itertools
+from urllib.parse import urlsplit
+
+from models.region import Region
+from models.user_profile import UserProfile
+
+_serial = itertools.count()
+
+
+def _add_regions(db, count: int) -> None:
+    n = next(_serial)
+    db.add_all(Region(view_name=f"Page {n}.{i}", name=f"page-{n}-{i}") for i in range(count))
+    db.commit()
+
+
+def _next_url(response) -> str | None:
+    link = response.headers.get("Link")
+    if link is None:
+        return None
+    url, rel = link.split(";")
+    assert rel.strip() == 'rel="next"'
+    parts = urlsplit(url.strip("<> "))
+    return f"{parts.path}?{parts.query}"
+
+
+def _walk(client, url: str, between_pages=None) -> list[int]:
+    ids = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200, response.text
+        ids += [item["id"] for item in response.json()]
+        url = _next_url(response)
+        if url is not None:
+            assert response.headers["X-Next-Cursor"] in url
+        if between_pages is not None:
+            between_pages()
+    return ids
+
+
+def test_cursor_pages_cover_the_list_once(client, db):
+    _add_regions(db, 7)
+    everything = [item["id"] for item in client.get("/api/regions/?limit=1000").json()]
+    assert _walk(client, "/api/regions/?limit=3") == everything
+
+
+def test_inserts_between_pages_do_not_shift_pages(client, db):
+    region = Region(view_name="Paged profiles", name="paged-profiles")
+    db.add(region)
+    db.commit()
+    db.add_all(UserProfile(region_id=region.id) for _ in range(5))
+    db.commit()
+    before = [item["id"] for item in client.get("/api/user-profiles/?limit=1000&fields=id").json()]
+
+    added = []
+
+    def insert_one():
+        profile = UserProfile(region_id=region.id)
+        db.add(profile)
+        db.commit()
+        added.append(profile.id)
+
+    walked = _walk(client, "/api/user-profiles/?limit=2&fields=id", between_pages=insert_one)
+    # Every row is seen exactly once: nothing skipped or repeated as new rows arrive
+    assert len(walked) == len(set(walked))
+    assert set(before) <= set(walked) <= set(before) | set(added)
+
+
+def test_skip_still_works(client, db):
+    _add_regions(db, 3)
+    everything = [item["id"] for item in client.get("/api/regions/?limit=1000").json()]
+    page = client.get("/api/regions/?skip=1&limit=2").json()
+    assert [item["id"] for item in page] == everything[1:3]
+
+
+def test_last_page_has_no_link(client):
+    response = client.get("/api/regions/?limit=100000")
+    assert "Link" not in response.headers
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_invalid_cursor_is_400(client):
+    assert client.get("/api/regions/?cursor=not-a-cursor").status_code == 400
+    assert client.get("/api/user-profiles/?cursor=eyJpZCI6ICJ4In0").status_code == 400
@@ -0,0 +1,96 @@
+"""region_phenotype_stats stays equal to a full recount through every kind of profile write."""
+import itertools
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+
+from models.region import Region
+from models.region_phenotype_stat import RegionPhenotypeStat
+from models.user_profile import UserProfile
+from phenotype_stats import PROFILES, rebuild
+
+_serial = itertools.count()
+
+
+@pytest.fixture
+def regions(db):
+    n = next(_serial)
+    created = [Region(view_name=f"Stats region {n}.{i}", name=f"stats-region-{n}-{i}") for i in range(2)]
+    db.add_all(created)
+    db.commit()
+    return [region.id for region in created]
+
+
+def _stats(db, region_id: int) -> dict[tuple[str, str], int]:
+    db.expire_all()
+    rows = db.scalars(select(RegionPhenotypeStat).where(RegionPhenotypeStat.region_id == region_id))
+    return {(row.dimension, row.value): row.count for row in rows}
+
+
+def _assert_matches_recount(db) -> None:
+    db.expire_all()
+    incremental = {(r.region_id, r.dimension, r.value): r.count for r in db.scalars(select(RegionPhenotypeStat))}
+    rebuild(db)
+    recounted = {(r.region_id, r.dimension, r.value): r.count for r in db.scalars(select(RegionPhenotypeStat))}
+    db.rollback()
+    assert incremental == recounted
+
+
+def test_api_create_update_delete(client, db, regions):
+    first, second = regions
+    created = client.post("/api/user-profiles/", json={
+        "region_id": first, "phenotype_analyze": {"phenotype": "nordic", "face_type": "oval"},
+    })
+    assert created.status_code == 200
+    profile_id = created.json()["id"]
+    assert _stats(db, first) == {(PROFILES, ""): 1, ("phenotype", "nordic"): 1, ("face_type", "oval"): 1}
+
+    patched = client.patch(f"/api/user-profiles/{profile_id}", json={"phenotype_analyze": {"phenotype": "alpine"}})
+    assert patched.status_code == 200
+    assert _stats(db, first) == {(PROFILES, ""): 1, ("phenotype", "alpine"): 1}
+
+    assert client.patch(f"/api/user-profiles/{profile_id}", json={"region_id": second}).status_code == 200
+    assert _stats(db, first) == {}
+    assert _stats(db, second) == {(PROFILES, ""): 1, ("phenotype", "alpine"): 1}
+
+    assert client.delete(f"/api/user-profiles/{profile_id}").status_code == 204
+    assert _stats(db, second) == {}
+    _assert_matches_recount(db)
+
+
+def test_delete_without_loaded_columns(db, regions):
+    """A profile loaded with load_only (or expired) still has its counters decremented on delete."""
+    region_id = regions[0]
+    db.add_all(UserProfile(region_id=region_id, phenotype_analyze={"phenotype": "pontic"}) for _ in range(2))
+    db.commit()
+    db.expunge_all()
+
+    doomed = db.scalars(
+        select(UserProfile).options(load_only(UserProfile.id)).where(UserProfile.region_id == region_id).limit(1)
+    ).one()
+    db.delete(doomed)
+    db.commit()
+    assert _stats(db, region_id) == {(PROFILES, ""): 1, ("phenotype", "pontic"): 1}
+
+    survivor = db.scalars(select(UserProfile).where(UserProfile.region_id == region_id)).one()
+    db.expire(survivor)
+    db.delete(survivor)
+    db.commit()
+    assert _stats(db, region_id) == {}
+    _assert_matches_recount(db)
+
+
+def test_update_without_loaded_columns(db, regions):
+    first, second = regions
+    profile = UserProfile(region_id=first, phenotype_analyze={"phenotype": "dinaric", "nose_type": "straight"})
+    db.add(profile)
+    db.commit()
+    db.expire(profile)
+
+    # Only the region is set; the analysis is neither loaded nor changed
+    profile.region_id = second
+    db.commit()
+    assert _stats(db, first) == {}
+    assert _stats(db, second) == {(PROFILES, ""): 1, ("phenotype", "dinaric"): 1, ("nose_type", "straight"): 1}
+    _assert_matches_recount(db)
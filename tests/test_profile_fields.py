@@ -0,0 +1,59 @@
+"""Field projection of the profile list; images are only read when asked for."""
+import base64
+import os
+
+import pytest
+
+from models.region import Region
+from sql_profiler import count_queries
+
+
+@pytest.fixture
+def profile_with_images(client, db):
+    region = Region(view_name="Fields region", name="fields-region")
+    db.add(region)
+    db.commit()
+    image = os.urandom(300)
+    response = client.post("/api/user-profiles/", json={
+        "region_id": region.id,
+        "phenotype_analyze": {"phenotype": "baltic"},
+        "original_image_base64": base64.b64encode(image).decode(),
+    })
+    assert response.status_code == 200
+    return response.json()["id"], image
+
+
+def _listed(client, profile_id: int, query: str = "") -> dict:
+    response = client.get(f"/api/user-profiles/?limit=1000{query}")
+    assert response.status_code == 200, response.text
+    return next(item for item in response.json() if item["id"] == profile_id)
+
+
+def test_default_list_has_no_images(client, profile_with_images):
+    profile_id, _ = profile_with_images
+    with count_queries() as log:
+        item = _listed(client, profile_id)
+    assert "original_image_base64" not in item and "analyzed_image_base64" not in item
+    assert item["phenotype_analyze"] == {"phenotype": "baltic"}
+    assert not any("original_image_hash" in query.statement for query in log.queries)
+
+
+def test_requested_fields_only(client, profile_with_images):
+    profile_id, image = profile_with_images
+    item = _listed(client, profile_id, "&fields=id,original_image_base64")
+    assert set(item) == {"id", "original_image_base64"}
+    assert base64.b64decode(item["original_image_base64"]) == image
+
+
+def test_unknown_field_is_400(client):
+    response = client.get("/api/user-profiles/?fields=id,password")
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"]
+
+
+def test_image_served_separately(client, profile_with_images):
+    profile_id, image = profile_with_images
+    response = client.get(f"/api/user-profiles/{profile_id}/image/original")
+    assert response.status_code == 200
+    assert response.content == image
+    assert client.get(f"/api/user-profiles/{profile_id}/image/analyzed").status_code == 404
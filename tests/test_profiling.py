@@ -0,0 +1,44 @@
+"""Per-request cProfile capture includes the model call made in the threadpool."""
+import io
+
+from PIL import Image
+
+from auth import create_access_token
+from models.user import User
+from profiling import get_captured_profile
+
+
+def _png() -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (32, 32)).save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_profiled_request_includes_model_thread(client, db):
+    admin = db.query(User).filter(User.username == "profiling-admin").one_or_none()
+    if admin is None:
+        admin = User(email="profiling-admin@example.com", username="profiling-admin", hashed_password="-", role="admin")
+        db.add(admin)
+        db.commit()
+    response = client.post(
+        "/api/analyze/landmarks/bytes",
+        content=_png(),
+        headers={
+            "Content-Type": "image/png",
+            "Authorization": f"Bearer {create_access_token(data={'sub': admin.username})}",
+            "X-Profile": "cprofile",
+        },
+    )
+    assert response.status_code == 200, response.text
+    captured = get_captured_profile(int(response.headers["X-Profile-Id"]))
+    assert captured is not None
+    report = captured.text(limit=500)
+    # run in the threadpool through analysis_gate
+    assert "analyze_landmarks" in report
+    assert "_analyze_face_landmarks" in report
+
+
+def test_unprofiled_request_has_no_profile_id(client):
+    response = client.post("/api/analyze/landmarks/bytes", content=_png(), headers={"Content-Type": "image/png"})
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
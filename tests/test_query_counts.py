@@ -0,0 +1,74 @@
+"""
+Statement counts of list endpoints. Each must stay constant in the number of
+rows returned: a regression to per-row loading (N+1) fails with the full
+query report from ``assert_max_queries``.
+"""
+import itertools
+
+import pytest
+
+from models.face_feature import FaceFeature
+from models.region import Region
+from models.user_profile import UserProfile
+
+
+@pytest.fixture
+def profiles(db):
+    """Adds ``count`` profiles, each linked to two new face features, in a new region; returns the feature ids."""
+    serial = itertools.count()
+
+    def add(count: int) -> list[int]:
+        n = next(serial)
+        region = Region(view_name=f"Test region {n}", name=f"test-region-{n}")
+        features = [FaceFeature(view_name=f"Feature {n}.{i}", name=f"feature-{n}-{i}") for i in range(2)]
+        db.add_all([region, *features])
+        db.flush()
+        db.add_all(UserProfile(region_id=region.id, face_features=features) for _ in range(count))
+        db.commit()
+        return [f.id for f in features]
+
+    return add
+
+
+def _count(client, url: str) -> int:
+    from sql_profiler import count_queries
+
+    with count_queries() as log:
+        response = client.get(url)
+    assert response.status_code == 200, response.text
+    return len(log)
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "/api/user-profiles/",
+        "/api/user-profiles/?fields=id,region_id,face_features",
+        "/api/face-features/usage",
+    ],
+)
+def test_query_count_does_not_grow_with_rows(client, profiles, url):
+    profiles(3)
+    few = _count(client, url)
+    profiles(30)
+    assert _count(client, url) == few
+
+
+def test_list_user_profiles_queries(client, profiles, max_queries):
+    profiles(20)
+    # The page, plus one selectinload for the linked features of the whole page
+    with max_queries(2):
+        assert client.get("/api/user-profiles/").status_code == 200
+    # Without face_features only the page
+    with max_queries(1):
+        assert client.get("/api/user-profiles/?fields=id,region_id,create_time").status_code == 200
+
+
+def test_face_feature_usage_queries(client, profiles, max_queries):
+    feature_ids = profiles(20)
+    # Counted by one grouped query, not per feature
+    with max_queries(1):
+        response = client.get("/api/face-features/usage")
+    assert response.status_code == 200
+    counts = {row["id"]: row["profile_count"] for row in response.json()}
+    assert [counts[i] for i in feature_ids] == [20, 20]
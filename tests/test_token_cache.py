@@ -0,0 +1,79 @@
+"""Verified-token cache: hits skip the database, user changes invalidate, inactive users are rejected."""
+import itertools
+import time
+
+import pytest
+
+from auth import AuthenticatedUser, TokenCache, create_access_token, token_cache
+from models.user import User
+from sql_profiler import count_queries
+
+_serial = itertools.count()
+
+
+@pytest.fixture
+def user(db):
+    n = next(_serial)
+    user = User(email=f"cached{n}@example.com", username=f"cached{n}", hashed_password="-", name="Before")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _snapshot(user_id: int) -> AuthenticatedUser:
+    return AuthenticatedUser(user_id, "a@example.com", "a", None, "user", True, None)
+
+
+def test_cache_hit_skips_database(client, user):
+    token = create_access_token(data={"sub": user.username})
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    with count_queries() as log:
+        assert client.get("/api/auth/me", headers=headers).json()["username"] == user.username
+    assert len(log) == 0
+
+
+def test_user_change_invalidates(client, db, user):
+    token = create_access_token(data={"sub": user.username})
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/auth/me", headers=headers).json()["name"] == "Before"
+    user.name = "After"
+    db.commit()
+    assert token_cache.get(token) is None
+    assert client.get("/api/auth/me", headers=headers).json()["name"] == "After"
+
+
+def test_deactivated_user_is_rejected(client, db, user):
+    token = create_access_token(data={"sub": user.username})
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    user.is_active = False
+    db.commit()
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
+
+
+def test_rolled_back_change_keeps_entries(client, db, user):
+    token = create_access_token(data={"sub": user.username})
+    assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    user.name = "Never committed"
+    db.flush()
+    db.rollback()
+    assert token_cache.get(token) is not None
+
+
+def test_lookup_racing_an_invalidation_is_not_cached():
+    cache = TokenCache(ttl=60, max_entries=10)
+    generation = cache.generation  # lookup starts
+    cache.invalidate_users([1])  # the user changes meanwhile
+    cache.put("token", _snapshot(1), None, generation)
+    assert cache.get("token") is None
+
+
+def test_entries_expire_with_the_token_and_are_bounded():
+    cache = TokenCache(ttl=60, max_entries=2)
+    cache.put("expired", _snapshot(1), time.time() - 1, cache.generation)
+    assert cache.get("expired") is None
+    for token in ("a", "b", "c"):
+        cache.put(token, _snapshot(2), None, cache.generation)
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
@@ -0,0 +1,84 @@
+"""SQLite write coalescing: jobs share a commit but are isolated by savepoints."""
+import asyncio
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, create_engine, event, insert, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database import engine
+from write_queue import WriteQueue, create_writer_engine
+
+metadata = MetaData()
+notes = Table("notes", metadata, Column("id", Integer, primary_key=True), Column("text", String, unique=True))
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    url = f"sqlite:///{tmp_path}/queue.db"
+    setup = create_engine(url)
+    metadata.create_all(setup)
+    setup.dispose()
+    return url
+
+
+def _texts(url: str) -> list[str]:
+    reader = create_engine(url)
+    try:
+        with reader.connect() as connection:
+            return sorted(connection.execute(select(notes.c.text)).scalars())
+    finally:
+        reader.dispose()
+
+
+def _add(db, value: str) -> str:
+    db.execute(insert(notes).values(text=value))
+    return value
+
+
+def _add_then_fail(db, value: str) -> None:
+    db.execute(insert(notes).values(text=value))
+    raise ValueError("job failed after writing")
+
+
+async def _run_batch(url: str, jobs: list, commits: list | None = None) -> list:
+    writer = create_writer_engine(url)
+    if commits is not None:
+        event.listen(writer.sync_engine, "commit", lambda conn: commits.append(1))
+    queue = WriteQueue(async_sessionmaker(writer, autoflush=False, expire_on_commit=False), batch_size=64)
+    try:
+        return await asyncio.gather(*(queue.submit(fn, *args) for fn, *args in jobs), return_exceptions=True)
+    finally:
+        await queue.stop()
+        await writer.dispose()
+
+
+def test_failing_job_does_not_affect_its_batch(database_url):
+    commits = []
+    results = asyncio.run(_run_batch(database_url, [
+        (_add, "a"),
+        (_add_then_fail, "rolled back"),
+        (_add, "b"),
+        (_add, "a"),  # unique violation, only this job fails
+        (_add, "c"),
+    ], commits))
+    assert results[0] == "a" and results[2] == "b" and results[4] == "c"
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[3], Exception)
+    assert _texts(database_url) == ["a", "b", "c"]
+    # Submitted together, committed together
+    assert len(commits) == 1
+
+
+def test_failed_commit_fails_every_job(database_url, monkeypatch):
+    async def failing_commit(self):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr("sqlalchemy.ext.asyncio.AsyncSession.commit", failing_commit)
+    results = asyncio.run(_run_batch(database_url, [(_add, "x"), (_add, "y")]))
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert _texts(database_url) == []
+
+
+def test_app_connections_use_wal():
+    with engine.connect() as connection:
+        assert connection.execute(text("PRAGMA journal_mode")).scalar() == "wal"
@@ -0,0 +1,54 @@
+"""WebP thumbnail/preview derivatives of blob store images.
+
+Derivatives are generated once per image digest (normally in a background task
+right after the image is written) and stored next to the original as
+``<digest>.<size>.webp``, so gallery views never decode full-size photos.
+"""
+import io
+import logging
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from blob_store import blob_store
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = (128, 512)  # longest side, px
+WEBP_QUALITY = 80
+
+
+def _suffix(size: int) -> str:
+    return f"{size}.webp"
+
+
+def generate_thumbnails(digest: str | None) -> None:
+    """Create every missing derivative for a stored image. Safe to call repeatedly."""
+    if not digest:
+        return
+    missing = [s for s in THUMBNAIL_SIZES if not blob_store.derivative_path(digest, _suffix(s)).exists()]
+    if not missing:
+        return
+    source = blob_store.path_for(digest)
+    try:
+        with Image.open(source) as img:
+            # Let JPEG decode at a reduced scale when possible; we never need more than the largest size
+            img.draft("RGB", (max(missing), max(missing)))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            for size in sorted(missing, reverse=True):
+                img.thumbnail((size, size), Image.Resampling.LANCZOS)
+                buf = io.BytesIO()
+                img.save(buf, format="WEBP", quality=WEBP_QUALITY)
+                blob_store.write_derivative(digest, _suffix(size), buf.getvalue())
+    except FileNotFoundError:
+        logger.warning("Cannot create thumbnails: blob %s is missing", digest)
+    except (OSError, ValueError) as e:
+        logger.warning("Cannot create thumbnails for blob %s: %s", digest, e)
+
+
+def get_thumbnail(digest: str, size: int) -> Path | None:
+    """Path to the derivative of the given size, generating it on a miss."""
+    path = blob_store.derivative_path(digest, _suffix(size))
+    if not path.exists():
+        generate_thumbnails(digest)
+    return path if path.exists() else None
@@ -0,0 +1,206 @@
+"""
+Standalone analyzer worker: runs queued analysis jobs (see jobs.py) outside the API.
+
+    python worker.py                          # one process, every job kind
+    python worker.py --processes 4            # weights loaded once, 4 forked workers
+    python worker.py --kinds landmarks        # a node without the YOLO weights
+
+Point it at the API's DATABASE_URL and BLOB_STORE_PATH. The blob store must be
+shared storage when the worker runs on another host. Workers on any number of
+hosts pull from the same table, so inference scales independently of the API
+nodes. Each process takes one job at a time and extends the job's lease from
+a heartbeat thread while the model runs. On SIGTERM it finishes the current
+job and exits. When idle, it also fails jobs whose workers kept dying and
+purges finished jobs older than ANALYSIS_JOB_RETENTION_HOURS.
+
+With ``--processes`` the models are preloaded before forking, as in serve.py,
+so the processes share one copy of the weights.
+"""
+import argparse
+import base64
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from typing import Iterator
+
+from sqlalchemy import Row
+
+from analysis_quality import analyze_landmarks, choose_quality
+from blob_store import load_blob
+from config import settings
+from jobs import (
+    JOB_KINDS, JobFailed, claim_jobs, complete_job, extend_lease, fail_abandoned_jobs, fail_job, purge_finished_jobs,
+    queued_job_count,
+)
+
+logger = logging.getLogger("worker")
+
+# Seconds between clean-up passes (abandoned and expired jobs) while idle
+MAINTENANCE_INTERVAL = 60.0
+
+
+def job_quality(job: Row, kinds: tuple[str, ...] = JOB_KINDS) -> str:
+    """The tier for a job: as requested, or ``fast`` for ``auto`` while the queue is ANALYSIS_JOB_FAST_QUEUE_DEPTH deep."""
+    requested = (job.params or {}).get("quality", "full")
+    threshold = settings.ANALYSIS_JOB_FAST_QUEUE_DEPTH
+    # Only count the backlog when it can change the answer
+    depth = queued_job_count(kinds) if requested == "auto" and threshold > 0 else 0
+    return choose_quality(requested, depth, threshold)
+
+
+def run_job(job: Row, quality: str = "full") -> tuple[dict, bytes | None]:
+    """Run one analysis; returns the result and the annotated image, if one was asked for."""
+    image = load_blob(job.image_hash)
+    if image is None:
+        raise JobFailed("Image is no longer in the blob store")
+    params = job.params or {}
+    if job.kind == "landmarks":
+        result = analyze_landmarks(image, quality, annotate=bool(params.get("annotate")))
+        if result["error"]:
+            raise JobFailed(result["error"])
+        annotated = result["annotated_image_base64"]
+        return {"points": result["points"], "quality": quality}, base64.b64decode(annotated) if annotated else None
+    if job.kind == "phenotype":
+        # Imported here: a landmarks-only node (--kinds landmarks) needs neither YOLO nor OpenCV
+        from analyzer.phenotype import analyze_phenotype_full
+
+        result = analyze_phenotype_full(
+            image, settings.PHENOTYPE_WEIGHTS_PATH,
+            quality=quality, fast_max_dimension=settings.ANALYZER_FAST_MAX_DIMENSION,
+        )
+        return {**result, "quality": quality}, None
+    raise JobFailed(f"Unknown job kind {job.kind!r}")
+
+
+@contextmanager
+def _heartbeat(job: Row, worker_id: str) -> Iterator[None]:
+    done = threading.Event()
+
+    def beat() -> None:
+        while not done.wait(settings.ANALYSIS_JOB_HEARTBEAT_INTERVAL):
+            try:
+                if not extend_lease(job.id, worker_id):
+                    logger.warning("Lease on job %s was taken over; its result will be discarded", job.job_id)
+                    return
+            except Exception:
+                # The lease is still valid for a while; try again on the next beat
+                logger.exception("Heartbeat for job %s failed", job.job_id)
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job.job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+
+
+class AnalysisWorker:
+    def __init__(self, kinds: tuple[str, ...], poll_interval: float):
+        self.kinds = kinds
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stopping.set())
+        logger.info("Worker %s waiting for %s jobs", self.worker_id, ", ".join(self.kinds))
+        next_maintenance = 0.0
+        while not self.stopping.is_set():
+            try:
+                jobs = claim_jobs(self.worker_id, self.kinds)
+            except Exception:
+                logger.exception("Claiming jobs failed")
+                jobs = []
+            if jobs:
+                self.process(jobs[0])
+                continue
+            if time.monotonic() >= next_maintenance:
+                self.maintenance()
+                next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+            # Jittered so idle workers do not poll in lockstep
+            self.stopping.wait(self.poll_interval * random.uniform(0.5, 1.5))
+        logger.info("Worker %s stopped", self.worker_id)
+
+    def process(self, job: Row) -> None:
+        started = time.perf_counter()
+        quality = "?"
+        with _heartbeat(job, self.worker_id):
+            try:
+                quality = job_quality(job, self.kinds)
+                result, image = run_job(job, quality)
+            except JobFailed as e:
+                record = partial(fail_job, job, self.worker_id, str(e), retry=False)
+            except Exception as e:
+                logger.exception("Job %s (%s) failed on attempt %d", job.job_id, job.kind, job.attempts)
+                record = partial(fail_job, job, self.worker_id, f"{type(e).__name__}: {e}", retry=True)
+            else:
+                record = partial(complete_job, job.id, self.worker_id, result, image)
+            try:
+                outcome = record()
+            except Exception:
+                # The job stays running until its lease expires, then another worker (or this one) retries it
+                logger.exception("Recording the outcome of job %s failed", job.job_id)
+                return
+        status = "done" if outcome is True else outcome or None
+        if status is None:
+            logger.warning("Job %s was taken over by another worker; outcome discarded", job.job_id)
+        else:
+            logger.info(
+                "Job %s (%s, %s) %s in %.2f s", job.job_id, job.kind, quality, status, time.perf_counter() - started,
+            )
+
+    def maintenance(self) -> None:
+        try:
+            failed = fail_abandoned_jobs()
+            purged = purge_finished_jobs()
+        except Exception:
+            logger.exception("Job queue maintenance failed")
+            return
+        if failed or purged:
+            logger.info("Failed %d abandoned jobs, purged %d finished jobs", failed, purged)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--kinds", default=",".join(JOB_KINDS), help="comma-separated job kinds to take")
+    parser.add_argument("--poll-interval", type=float, default=settings.ANALYSIS_JOB_POLL_INTERVAL)
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(process)d %(levelname)s %(name)s: %(message)s")
+
+    kinds = tuple(kind.strip() for kind in args.kinds.split(",") if kind.strip())
+    unknown = set(kinds) - set(JOB_KINDS)
+    if unknown:
+        parser.error(f"unknown job kinds: {', '.join(sorted(unknown))}")
+
+    def run() -> None:
+        AnalysisWorker(kinds, args.poll_interval).run()
+
+    if args.processes <= 1:
+        run()
+        return
+
+    from database import engine
+    from serve import preload_models, supervise
+
+    gc.disable()
+    preload_models(share=True)
+    engine.dispose()
+    gc.collect()
+    gc.freeze()
+    gc.enable()
+    supervise(run, args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Single-writer queue that coalesces small SQLite write transactions.
+
+SQLite allows one writer at a time. Many small concurrent transactions spend
+their time waiting for the file lock (busy_timeout) or fail with "database is
+locked" when a read transaction cannot be upgraded to a write. With
+SQLITE_WRITE_COALESCING, jobs submitted through ``run_write`` go to one
+background task that owns the only writing connection. It takes every job
+waiting in the queue (up to SQLITE_WRITE_BATCH_SIZE), runs each in its own
+SAVEPOINT so a failing job does not affect the others, and commits the batch
+together: one lock acquisition and one WAL sync for the whole batch.
+
+A job is a plain function ``fn(db: Session, *args)`` that writes through the
+session and returns a result; it must not commit. On other databases
+``run_write`` runs the job in its own transaction.
+"""
+import asyncio
+from typing import Any, Callable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import AsyncSessionLocal, _async_database_url, apply_sqlite_pragmas, is_sqlite_file
+from pool_metrics import InstrumentedAsyncQueuePool, instrument_engine
+from sql_profiler import profile_engine
+
+
+def create_writer_engine(url: str) -> AsyncEngine:
+    """One aiosqlite connection whose transactions start with BEGIN IMMEDIATE (write lock up front)."""
+    writer_engine = create_async_engine(
+        _async_database_url(url), poolclass=InstrumentedAsyncQueuePool, pool_size=1, max_overflow=0
+    )
+    apply_sqlite_pragmas(writer_engine.sync_engine)
+
+    @event.listens_for(writer_engine.sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        # The sqlite3 driver's own BEGIN handling breaks SAVEPOINT; emit BEGIN ourselves
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(writer_engine.sync_engine, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return writer_engine
+
+
+class WriteQueue:
+    def __init__(self, session_factory: async_sessionmaker, batch_size: int = 64):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    async def submit(self, fn: Callable[..., Any], *args) -> Any:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((fn, args, future))
+        return await future
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            await self._commit_batch(batch)
+
+    @staticmethod
+    def _apply(db: Session, batch: list) -> list:
+        outcomes = []
+        for fn, args, future in batch:
+            try:
+                with db.begin_nested():
+                    outcomes.append((future, fn(db, *args), None))
+            except Exception as exc:
+                outcomes.append((future, None, exc))
+        return outcomes
+
+    async def _commit_batch(self, batch: list) -> None:
+        try:
+            async with self.session_factory() as db:
+                # One run_sync for the whole batch rather than a round trip per job
+                outcomes = await db.run_sync(self._apply, batch)
+                await db.commit()
+        except Exception as exc:
+            # The commit (or BEGIN) itself failed: nothing in the batch was written
+            outcomes = [(future, None, exc) for _, _, future in batch]
+        for future, result, exc in outcomes:
+            if future.done():
+                continue
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+
+_write_queue: WriteQueue | None = None
+if settings.SQLITE_WRITE_COALESCING and is_sqlite_file(settings.DATABASE_URL):
+    _writer_engine = create_writer_engine(settings.DATABASE_URL)
+    instrument_engine(_writer_engine.sync_engine, "sqlite_writer")
+    profile_engine(_writer_engine.sync_engine)
+    _write_queue = WriteQueue(
+        async_sessionmaker(_writer_engine, autoflush=False, expire_on_commit=False),
+        batch_size=settings.SQLITE_WRITE_BATCH_SIZE,
+    )
+
+
+async def run_write(fn: Callable[..., Any], *args) -> Any:
+    """Run ``fn(db, *args)`` in a committed write transaction (coalesced on SQLite)."""
+    if _write_queue is not None:
+        return await _write_queue.submit(fn, *args)
+    async with AsyncSessionLocal() as db:
+        result = await db.run_sync(fn, *args)
+        await db.commit()
+        return result
+
+
+async def stop_write_queue() -> None:
+    if _write_queue is not None:
+        await _write_queue.stop()